@@ -1,7 +1,8 @@
-from flask import Flask, render_template_string, request, jsonify, send_file, session, redirect, url_for, make_response, Response
+from flask import Flask, render_template_string, request, jsonify, send_file, session, redirect, url_for, make_response, Response, g, has_request_context, stream_with_context
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 import pandas as pd
+import numpy as np
 
 # .env 파일 로드 (python-dotenv)
 try:
@@ -9,18 +10,30 @@ try:
     load_dotenv()
 except ImportError:
     pass
+import base64
+import bisect
+import hashlib
 import html
 import io
 import json
 import os
+import pathlib
 import re
 import shutil
 import sqlite3
-from collections import defaultdict
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone, date
 import calendar
-from functools import wraps
-from urllib.parse import quote, urlencode
+from functools import lru_cache, wraps
+from itertools import islice
+from operator import itemgetter
+from urllib.parse import quote, unquote, urlencode, urlsplit
 
 # 한국시간(KST, UTC+9) 설정
 KST = timezone(timedelta(hours=9))
@@ -36,74 +49,715 @@ def get_ledger_db_path():
     return os.path.abspath(p) if not os.path.isabs(p) else p
 
 
-def connect_ledger(timeout=60.0):
-    """ledger.db 연결. busy_timeout·긴 대기 시간으로 database is locked(동시 쓰기) 오류 완화."""
-    conn = sqlite3.connect(get_ledger_db_path(), timeout=timeout)
+# ledger.db 연결 설정 (연결을 열 때 한 번 적용)
+# - WAL: 읽기와 쓰기가 서로 막지 않음(다중 워커). 백업·다운로드는 파일 복사 대신 _ledger_snapshot()(SQLite backup API)
+# - busy_timeout: database is locked(동시 쓰기) 오류 완화
+LEDGER_PRAGMAS = (
+    ('busy_timeout', '60000'),
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', '-16000'),     # 16MB
+    ('mmap_size', '67108864'),    # 64MB
+    ('temp_store', 'MEMORY'),
+)
+# 요청 처리 중 connect_ledger()는 스레드별 유휴 연결을 재사용 — close()는 반납, 요청 종료 시 미반납 연결도 회수
+LEDGER_POOL_MAX_IDLE = 4
+_ledger_pool_local = threading.local()
+
+
+class _LedgerConnection(sqlite3.Connection):
+    """connect_ledger()가 돌려주는 연결. 풀 연결이면 close()가 실제로 닫지 않고 스레드 풀에 반납한다
+    (미커밋 변경은 롤백, row_factory 초기화 — 새로 연 연결과 같은 상태)."""
+    _pooled = False
+    _pool_key = None
+    _checked_out = False
+
+    def close(self):
+        if self._pooled:
+            _ledger_pool_release(self)
+        else:
+            super().close()
+
+
+# 요청 성능 계측 (옵트인: 환경변수 LEDGER_PERF=1, 꺼져 있으면 연결·함수 모두 기존 그대로)
+# - 장부 연결의 커서가 SQL 문장별 실행·fetch 시간과 행 수를, trace 콜백이 SQLite가 실제 실행한 문장 수(트리거 포함)를 기록
+# - 요청 시간은 단계(query/filter/aggregate/render/serialize, 나머지 view)로 나눔 — 한 시점에 한 단계만 진행(중첩 시 안쪽 단계로 계산)
+# - 응답에 Server-Timing 헤더, 경로별 누적 통계는 워커(프로세스)별 메모리 → 관리자 /api/perf
+#   (스트리밍 응답의 Server-Timing은 헤더를 보내기까지의 시간, 경로별 통계는 본문 전송이 끝난 뒤 전체 시간으로 기록)
+LEDGER_PERF = os.environ.get('LEDGER_PERF', '').strip().lower() in ('1', 'true', 'on', 'yes')
+PERF_HIST_BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+PERF_RECENT_MAX = 500            # 경로별 백분위 계산에 쓰는 최근 요청 수
+PERF_SQL_MAX_STATEMENTS = 300    # 문장별 누적 통계에 보관할 SQL 종류 수 (넘으면 새 문장은 버린 수만 셈)
+_PERF_SQL_PARAMS_RE = re.compile(r'\?(\s*,\s*\?)+')
+_PERF_SQL_SPACE_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def _perf_sql_text(sql):
+    """문장별 통계 키 — 공백 정리, 길이가 바뀌는 IN (?, ?, …) 목록은 하나로"""
+    text = _PERF_SQL_SPACE_RE.sub(' ', str(sql)).strip()
+    return _PERF_SQL_PARAMS_RE.sub('?, …', text)[:300]
+
+
+class _PerfRecord:
+    """요청 1건의 계측 — 단계별 시간(초), SQL 문장별 [호출 수, 시간(초), 행 수], SQLite 실행 문장 수"""
+    __slots__ = ('start', 'phase', 'since', 'phases', 'sql', 'sql_exec')
+
+    def __init__(self):
+        self.start = self.since = time.perf_counter()
+        self.phase = 'view'
+        self.phases = defaultdict(float)
+        self.sql = {}
+        self.sql_exec = 0
+
+    def switch(self, phase):
+        now = time.perf_counter()
+        self.phases[self.phase] += now - self.since
+        self.phase, self.since = phase, now
+
+    def add_sql(self, sql, sec, rows=0, calls=0):
+        st = self.sql.get(sql)
+        if st is None:
+            st = self.sql[sql] = [0, 0.0, 0]
+        st[0] += calls
+        st[1] += sec
+        st[2] += rows
+
+
+def _perf_record():
+    """현재 요청의 계측 기록 (계측 꺼짐·요청 밖이면 None)"""
+    if not LEDGER_PERF or not has_request_context():
+        return None
+    return g.get('_perf')
+
+
+def _perf_mark(phase):
+    """현재 요청의 진행 단계를 phase로 전환 — 이후 시간은 다음 전환까지 phase에 더해짐"""
+    rec = _perf_record()
+    if rec is not None:
+        rec.switch(phase)
+
+
+def _perf_phase(phase):
+    """함수 실행 시간을 phase 단계로 기록하는 데코레이터 (끝나면 이전 단계로 복귀). 계측이 꺼져 있으면 함수를 그대로 반환"""
+    def decorator(f):
+        if not LEDGER_PERF:
+            return f
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            rec = _perf_record()
+            if rec is None:
+                return f(*args, **kwargs)
+            prev = rec.phase
+            rec.switch(phase)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                rec.switch(prev)
+        return wrapper
+    return decorator
+
+
+def _perf_sql_add(cur, sec, rows=0, calls=0):
+    rec = _perf_record()
+    if rec is not None and cur._perf_sql is not None:
+        rec.add_sql(cur._perf_sql, sec, rows, calls)
+
+
+def _perf_trace(_sql):
+    rec = _perf_record()
+    if rec is not None:
+        rec.sql_exec += 1
+
+
+class _PerfCursor(sqlite3.Cursor):
+    """LEDGER_PERF일 때 장부 연결의 커서 — 실행·fetch 시간과 행 수(SELECT는 읽은 행, 그 외는 변경 행)를 문장별로 기록"""
+    _perf_sql = None
+
+    def execute(self, sql, parameters=()):
+        self._perf_sql = _perf_sql_text(sql)
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _perf_sql_add(self, time.perf_counter() - t0, max(self.rowcount, 0), 1)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._perf_sql = _perf_sql_text(sql)
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _perf_sql_add(self, time.perf_counter() - t0, max(self.rowcount, 0), 1)
+
+    def executescript(self, sql_script):
+        self._perf_sql = _perf_sql_text(sql_script)
+        t0 = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _perf_sql_add(self, time.perf_counter() - t0, 0, 1)
+
+    def fetchone(self):
+        t0 = time.perf_counter()
+        row = super().fetchone()
+        _perf_sql_add(self, time.perf_counter() - t0, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        t0 = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _perf_sql_add(self, time.perf_counter() - t0, len(rows))
+        return rows
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        rows = super().fetchall()
+        _perf_sql_add(self, time.perf_counter() - t0, len(rows))
+        return rows
+
+    def __next__(self):
+        t0 = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            _perf_sql_add(self, time.perf_counter() - t0)
+            raise
+        _perf_sql_add(self, time.perf_counter() - t0, 1)
+        return row
+
+
+class _PerfLedgerConnection(_LedgerConnection):
+    """LEDGER_PERF일 때 장부 연결 — 연결의 execute 계열도 _PerfCursor로 실행"""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or _PerfCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+# 화면 렌더링·JSON 직렬화는 전 경로 공통으로 단계 기록
+render_template_string = _perf_phase('render')(render_template_string)
+jsonify = _perf_phase('serialize')(jsonify)
+
+
+def _open_ledger_conn(path, timeout):
+    conn = sqlite3.connect(path, timeout=timeout, factory=_PerfLedgerConnection if LEDGER_PERF else _LedgerConnection)
+    if LEDGER_PERF:
+        conn.set_trace_callback(_perf_trace)
+    for name, value in LEDGER_PRAGMAS:
+        try:
+            conn.execute(f'PRAGMA {name} = {value}')
+        except sqlite3.Error:
+            pass
+    return conn
+
+
+def _ledger_pool_key(path):
+    """풀 연결 재사용 조건: 같은 프로세스·같은 DB 파일(교체·삭제 후 재생성이면 inode가 바뀜)"""
+    try:
+        st = os.stat(path)
+        return (path, os.getpid(), st.st_dev, st.st_ino)
+    except OSError:
+        return (path, os.getpid(), None, None)
+
+
+def _ledger_pool_release(conn):
+    if not conn._checked_out:
+        return
+    conn._checked_out = False
     try:
-        conn.execute('PRAGMA busy_timeout = 60000')
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
     except sqlite3.Error:
-        pass
+        sqlite3.Connection.close(conn)
+        return
+    idle = getattr(_ledger_pool_local, 'idle', None)
+    if idle is None:
+        idle = _ledger_pool_local.idle = []
+    if len(idle) < LEDGER_POOL_MAX_IDLE:
+        idle.append(conn)
+    else:
+        sqlite3.Connection.close(conn)
+
+
+def connect_ledger(timeout=60.0):
+    """ledger.db 연결 (LEDGER_PRAGMAS 적용). 요청 처리 중에는 스레드별 풀에서 재사용, 그 외(시작 시·백그라운드)는 새 연결."""
+    path = get_ledger_db_path()
+    if not has_request_context():
+        return _open_ledger_conn(path, timeout)
+    key = _ledger_pool_key(path)
+    idle = getattr(_ledger_pool_local, 'idle', None) or []
+    conn = None
+    while idle:
+        c = idle.pop()
+        if c._pool_key == key:
+            conn = c
+            break
+        sqlite3.Connection.close(c)
+    if conn is None:
+        conn = _open_ledger_conn(path, timeout)
+        conn._pooled = True
+        conn._pool_key = _ledger_pool_key(path)
+    conn._checked_out = True
+    g.setdefault('_ledger_conns', []).append(conn)
     return conn
 
 
+def _ledger_snapshot(dest_path):
+    """사용 중인 ledger.db를 한 시점 기준으로 dest_path에 복사 (SQLite backup API — WAL 미반영분 포함, 쓰기를 막지 않음).
+    결과는 -wal 없이 단독으로 열리는 파일(journal_mode=DELETE). 임시 이름에 쓴 뒤 교체하므로 중간 상태 파일이 남지 않음.
+    반환: 스냅샷 기준 (ledger_gen, dir_gen)"""
+    tmp_path = dest_path + '.part'
+    try:
+        src = _open_ledger_conn(get_ledger_db_path(), 60.0)
+        try:
+            dst = sqlite3.connect(tmp_path)
+            try:
+                src.backup(dst)
+                dst.execute('PRAGMA journal_mode = DELETE')
+                gens = (_ledger_gen(dst), _dir_gen(dst))
+            finally:
+                dst.close()
+        finally:
+            src.close()
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return gens
+
+
 # 백업 기본 경로 (Windows: C:\logi\backup, 그 외: ./backup)
 if os.name == 'nt':
     BACKUP_BASE_DIR = r"C:\logi\backup"
 else:
     BACKUP_BASE_DIR = os.path.join(os.getcwd(), "backup")
 
-def backup_all(reason: str = "auto") -> None:
-    """
-    ledger.db + 통합장부 전체 엑셀을 백업 폴더에 저장.
-    - 백업 경로: BACKUP_BASE_DIR/YYYYMMDD_HHMMSS_reason/
-    """
-    try:
-        ts = now_kst().strftime('%Y%m%d_%H%M%S')
-        base_dir = BACKUP_BASE_DIR
-        os.makedirs(base_dir, exist_ok=True)
-        folder_name = f"{ts}_{reason}"
-        target_dir = os.path.join(base_dir, folder_name)
-        os.makedirs(target_dir, exist_ok=True)
+# 스트리밍 xlsx 작성: 행을 읽는 즉시 sheet XML(인라인 문자열)로 만들어 zip 스트림에 기록 → 메모리 일정, 첫 바이트 바로 전송.
+# (openpyxl/pandas는 통합문서 전체를 메모리·임시파일에 만든 뒤 한 번에 저장)
+_XLSX_ILLEGAL_CHARS_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_XLSX_STATIC_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+     '</Relationships>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+     '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+     '</Relationships>'),
+    # 스타일 1 = 헤더(굵게·가운데·얇은 테두리, pandas to_excel 헤더와 동일)
+    ('xl/styles.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+     '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+     '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+     '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+     '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border></borders>'
+     '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+     '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+     '<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" applyFont="1" applyBorder="1" applyAlignment="1">'
+     '<alignment horizontal="center" vertical="top"/></xf></cellXfs>'
+     '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+     '</styleSheet>'),
+)
+
+
+class _XlsxChunkSink:
+    """zipfile 출력 대상(쓰기 전용·탐색 불가) — 기록된 바이트를 모아 두었다가 take()로 꺼냄"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
 
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
 
-        # DB 백업 (LEDGER_DB_PATH와 동일 파일)
-        db_src = get_ledger_db_path()
-        if os.path.isfile(db_src):
-            shutil.copy2(db_src, os.path.join(target_dir, f"ledger_{ts}.db"))
 
-        # 통합장부 전체 엑셀 백업 (기존 /api/ledger_excel 로직과 동일한 데이터)
-        conn = connect_ledger()
-        conn.row_factory = sqlite3.Row
-        try:
-            all_rows = conn.execute("SELECT * FROM ledger ORDER BY CASE WHEN dispatch_dt IS NULL OR dispatch_dt = '' THEN 1 ELSE 0 END, dispatch_dt DESC, id DESC").fetchall()
-        finally:
-            conn.close()
+def _xlsx_col_letter(idx):
+    letters = ''
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
 
-        col_keys = [c['k'] for c in FULL_COLUMNS]
-        headers = ['id'] + [c['n'] for c in FULL_COLUMNS]
-        rows = []
-        for r in all_rows:
-            d = dict(r)
-            calc_vat_auto(d)
-            driver_fixed = get_driver_fixed_type(drivers_db, d.get('d_name'), d.get('c_num'))
-            if driver_fixed is not None:
-                d['log_move'] = driver_fixed
+
+def _xlsx_cell_xml(ref, v, style=''):
+    if v is None or v == '':
+        return ''
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        if v != v or v in (float('inf'), float('-inf')):
+            return ''
+        return f'<c r="{ref}"{style}><v>{v}</v></c>'
+    text = html.escape(_XLSX_ILLEGAL_CHARS_RE.sub('', str(v)), quote=False)
+    return f'<c r="{ref}"{style} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_stream(sheet_name, headers, rows, chunk_rows=500):
+    """헤더 + 행(iterable of list) → xlsx 파일 바이트 조각 generator. 행은 chunk_rows개마다 내보냄."""
+    sink = _XlsxChunkSink()
+    letters = [_xlsx_col_letter(i) for i in range(len(headers))]
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in _XLSX_STATIC_PARTS:
+            zf.writestr(name, xml)
+        zf.writestr('xl/workbook.xml',
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+                    f'<sheets><sheet name="{html.escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as ws:
+            ws.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                      '<row r="1">' + ''.join(_xlsx_cell_xml(f'{letters[i]}1', h, ' s="1"') for i, h in enumerate(headers))
+                      + '</row>').encode('utf-8'))
+            buf = []
+            n = 1
+            for n, row in enumerate(rows, start=2):
+                cells = ''.join(_xlsx_cell_xml(f'{letters[i]}{n}', v) for i, v in enumerate(row[:len(letters)]))
+                buf.append(f'<row r="{n}">{cells}</row>')
+                if len(buf) >= chunk_rows:
+                    ws.write(''.join(buf).encode('utf-8'))
+                    buf = []
+                    _export_job_progress(written=n - 1)
+                    yield sink.take()
+            ws.write((''.join(buf) + '</sheetData></worksheet>').encode('utf-8'))
+            _export_job_progress(written=n - 1, force=True)
+    yield sink.take()
+
+
+def _xlsx_stream_response(chunks, fname):
+    """_xlsx_stream 결과를 다운로드 응답으로 (요청 컨텍스트 유지한 채 조각 단위 전송)"""
+    resp = Response(stream_with_context(chunks), mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    ascii_name = fname.encode('ascii', 'ignore').decode('ascii') or 'export.xlsx'
+    resp.headers['Content-Disposition'] = f"attachment; filename={ascii_name}; filename*=UTF-8''{quote(fname)}"
+    return resp
+
+
+def _ledger_export_row_iter(conn, query, params, driver_memo=False):
+    """장부 엑셀 내보내기 행 iterator: 커서를 순회하며 계산 보정·기사관리 연동한 행 dict.
+    driver_memo=True면 콜명(memo2)을 기사관리 메모로 표시(백업 엑셀 기존 동작)."""
+    cur = conn.execute(query, params)
+    names = [c[0] for c in cur.description]
+    for r in cur:
+        d = dict(zip(names, r))
+        calc_vat_auto(d)
+        driver_fixed = mem_dir.driver_fixed_type(d.get('d_name'), d.get('c_num'))
+        if driver_fixed is not None:
+            d['log_move'] = driver_fixed
+        if driver_memo:
             d_name = (d.get('d_name') or '').strip()
             c_num = (d.get('c_num') or '').strip()
             if d_name or c_num:
-                driver_row = next((dr for dr in drivers_db if (dr.get('기사명') or '').strip() == d_name and (dr.get('차량번호') or '').strip() == c_num), None)
+                driver_row = mem_dir.driver(d_name, c_num)
                 if driver_row is not None:
                     d['memo2'] = driver_row.get('메모') or d.get('memo2') or ''
-            row = [d.get('id', '')] + [d.get(k, '') or '' for k in col_keys]
-            rows.append(row)
+        yield d
+
+
+# 자동 백업(로그인·로그아웃·500 오류): 요청은 백그라운드 작업에 넘기고 바로 반환
+# - BACKUP_MIN_INTERVAL_SEC 안에 들어온 요청은 한 번으로 합침 (간격은 app_meta.backup_at으로 워커 간에도 공유)
+# - 마지막 백업 이후 장부·기사·업체 세대번호(ledger_gen·dir_gen)가 그대로면 건너뜀
+BACKUP_MIN_INTERVAL_SEC = 60
+
+
+def _backup_all_now(reason):
+    """ledger.db 스냅샷 + 스냅샷 기준 통합장부 전체 엑셀을 BACKUP_BASE_DIR/YYYYMMDD_HHMMSS_reason/ 에 저장.
+    반환: 'done' | 'unchanged'(변경 없음) | 'busy'(다른 워커가 간격 안에 백업함 — 간격 후 다시 시도)"""
+    db_src = get_ledger_db_path()
+    if not os.path.isfile(db_src):
+        return 'unchanged'
+    conn = _open_ledger_conn(db_src, 60.0)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM app_meta WHERE key IN ('backup_ledger_gen', 'backup_dir_gen')").fetchall())
+        if (meta.get('backup_ledger_gen'), meta.get('backup_dir_gen')) == (_ledger_gen(conn), _dir_gen(conn)):
+            return 'unchanged'
+        now = int(time.time())
+        conn.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('backup_at', 0)")
+        claimed = conn.execute("UPDATE app_meta SET value = ? WHERE key = 'backup_at' AND value <= ?",
+                               (now, now - BACKUP_MIN_INTERVAL_SEC)).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    if not claimed:
+        return 'busy'
+
+    ts = now_kst().strftime('%Y%m%d_%H%M%S')
+    target_dir = os.path.join(BACKUP_BASE_DIR, f"{ts}_{reason}")
+    os.makedirs(target_dir, exist_ok=True)
+    snapshot = os.path.join(target_dir, f"ledger_{ts}.db")
+    ledger_gen, dir_gen = _ledger_snapshot(snapshot)
+
+    # 통합장부 전체 엑셀 (기존 /api/ledger_excel 로직과 동일한 데이터) — 스냅샷을 읽기 전용으로 열어 커서 순회하며 파일로 바로 기록
+    col_keys = [c['k'] for c in FULL_COLUMNS]
+    headers = ['id'] + [c['n'] for c in FULL_COLUMNS]
+    backup_xlsx = os.path.join(target_dir, f"통합장부_{ts}.xlsx")
+    snap = sqlite3.connect(f"{pathlib.Path(snapshot).as_uri()}?mode=ro", uri=True)
+    try:
+        rows = ([d.get('id', '')] + [d.get(k, '') or '' for k in col_keys]
+                for d in _ledger_export_row_iter(snap, "SELECT * FROM ledger" + LedgerQuery.ORDER_BY, [], driver_memo=True))
+        with open(backup_xlsx + '.part', 'wb') as f:
+            for chunk in _xlsx_stream('통합장부', headers, rows):
+                f.write(chunk)
+        os.replace(backup_xlsx + '.part', backup_xlsx)
+    finally:
+        snap.close()
+
+    conn = _open_ledger_conn(db_src, 60.0)
+    try:
+        conn.executemany("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)",
+                         [('backup_ledger_gen', ledger_gen), ('backup_dir_gen', dir_gen)])
+        conn.commit()
+    finally:
+        conn.close()
+    return 'done'
+
+
+class LedgerBackupWorker:
+    """자동 백업 전용 스레드 (워커 프로세스마다 1개, --preload로 fork된 뒤 처음 요청될 때 시작).
+    대기 중인 요청은 사유만 모아 두었다가 간격이 지나면 한 번에 실행 — 백업 폴더 이름의 사유는 '+'로 연결."""
+
+    def __init__(self, interval=BACKUP_MIN_INTERVAL_SEC):
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._reasons = []
+        self._next_at = 0.0
+        self._pid = None
+        self.runs = 0
+
+    def request(self, reason):
+        with self._cond:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._reasons = []
+                threading.Thread(target=self._loop, name='ledger-backup', daemon=True).start()
+            if reason not in self._reasons:
+                self._reasons.append(reason)
+            self._cond.notify()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._reasons or time.monotonic() < self._next_at:
+                    self._cond.wait(None if not self._reasons else self._next_at - time.monotonic())
+                reasons, self._reasons = self._reasons, []
+                self._next_at = time.monotonic() + self.interval
+            try:
+                result = _backup_all_now('+'.join(reasons))
+                self.runs += result == 'done'
+            except Exception as e:
+                # 백업 실패는 서비스 동작을 막지 않도록 로그만 출력
+                print(f"[backup_all error] {e}")
+                result = None
+            if result == 'busy':
+                with self._cond:
+                    self._reasons = reasons + [r for r in self._reasons if r not in reasons]
 
-        df = pd.DataFrame(rows if rows else [[]], columns=headers)
-        backup_xlsx = os.path.join(target_dir, f"통합장부_{ts}.xlsx")
-        with pd.ExcelWriter(backup_xlsx, engine='openpyxl') as w:
-            df.to_excel(w, index=False, sheet_name='통합장부')
-    except Exception as e:
-        # 백업 실패는 서비스 동작을 막지 않도록 로그만 출력
-        print(f"[backup_all error] {e}")
+
+ledger_backup_worker = LedgerBackupWorker()
+
+
+def backup_all(reason: str = "auto") -> None:
+    """ledger.db 스냅샷 + 통합장부 전체 엑셀 백업 요청 (백그라운드 실행, 바로 반환) — 백업 경로: BACKUP_BASE_DIR/YYYYMMDD_HHMMSS_reason/"""
+    ledger_backup_worker.request(reason)
+
+
+# 백업 폴더 보존(GFS): 최근 BACKUP_KEEP_RECENT_HOURS 시간은 모두, 그 이전은 백업이 있는 최근 N일·N주·N개월마다 가장 최신 1개씩.
+# 기간 수는 백업이 있는 기간만 셈 — 변경이 없어 백업이 오래 없어도 마지막 백업은 남음
+BACKUP_KEEP_RECENT_HOURS = int(os.environ.get('BACKUP_KEEP_RECENT_HOURS', '24') or 24)
+BACKUP_KEEP_DAILY = int(os.environ.get('BACKUP_KEEP_DAILY', '7') or 7)
+BACKUP_KEEP_WEEKLY = int(os.environ.get('BACKUP_KEEP_WEEKLY', '4') or 4)
+BACKUP_KEEP_MONTHLY = int(os.environ.get('BACKUP_KEEP_MONTHLY', '12') or 12)
+_BACKUP_FOLDER_RE = re.compile(r'^(\d{8})_(\d{6})_')
+
+
+def _backup_prune(now=None):
+    """BACKUP_BASE_DIR의 YYYYMMDD_HHMMSS_reason 폴더 중 보존 규칙에 안 드는 것 삭제. 반환: 삭제한 폴더 수"""
+    if not os.path.isdir(BACKUP_BASE_DIR):
+        return 0
+    now = now or now_kst()
+    entries = []
+    for name in os.listdir(BACKUP_BASE_DIR):
+        m = _BACKUP_FOLDER_RE.match(name)
+        if not m or not os.path.isdir(os.path.join(BACKUP_BASE_DIR, name)):
+            continue
+        try:
+            ts = datetime.strptime(m.group(1) + m.group(2), '%Y%m%d%H%M%S').replace(tzinfo=KST)
+        except ValueError:
+            continue
+        entries.append((ts, name))
+    entries.sort(reverse=True)
+    recent_cutoff = now - timedelta(hours=BACKUP_KEEP_RECENT_HOURS)
+    keep = {name for ts, name in entries if ts >= recent_cutoff}
+    for count, bucket in ((BACKUP_KEEP_DAILY, lambda ts: ts.date()),
+                          (BACKUP_KEEP_WEEKLY, lambda ts: tuple(ts.isocalendar())[:2]),
+                          (BACKUP_KEEP_MONTHLY, lambda ts: (ts.year, ts.month))):
+        seen = set()
+        for ts, name in entries:
+            b = bucket(ts)
+            if b in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.add(b)
+            keep.add(name)
+    removed = 0
+    for ts, name in entries:
+        if name in keep:
+            continue
+        try:
+            shutil.rmtree(os.path.join(BACKUP_BASE_DIR, name))
+            removed += 1
+        except OSError as e:
+            print(f"[backup_prune error] {name}: {e}")
+    return removed
+
+
+# 예약 작업 (APScheduler, 워커 프로세스마다 첫 요청 때 시작 — --preload로 fork된 뒤). 끄기: LEDGER_SCHEDULER=0
+# - 시각은 한국시간 'HH:MM' (쉼표로 여러 개). 같은 작업을 워커 여러 개가 동시에 맞아도 _scheduler_claim으로 한 워커만 실행
+# - 백업(+보존 정리), WAL 체크포인트(PASSIVE — 쓰기·읽기를 막지 않음), PRAGMA optimize, 자정 이후 수금·지급 상태 재계산
+LEDGER_SCHEDULER = os.environ.get('LEDGER_SCHEDULER', '1').strip().lower() not in ('0', 'false', 'off', 'no')
+BACKUP_SCHEDULE = os.environ.get('BACKUP_SCHEDULE', '03:30')
+OPTIMIZE_SCHEDULE = os.environ.get('OPTIMIZE_SCHEDULE', '04:30')
+STATUS_SCHEDULE = os.environ.get('STATUS_SCHEDULE', '00:01')
+CHECKPOINT_INTERVAL_MIN = max(1, int(os.environ.get('CHECKPOINT_INTERVAL_MIN', '30') or 30))
+SCHEDULER_CRON_SLOT_SEC = 600   # 시각 지정 작업의 중복 실행 방지 구간 (같은 작업 시각은 10분 이상 간격으로 설정)
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+def _scheduler_claim(job, slot_sec):
+    """이번 slot_sec 구간의 job 실행권 — app_meta 'job:<job>'에 구간 번호를 먼저 기록한 워커만 True"""
+    slot = int(time.time() // slot_sec)
+    key = f'job:{job}'
+    conn = _open_ledger_conn(get_ledger_db_path(), 60.0)
+    try:
+        conn.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES (?, 0)", (key,))
+        claimed = conn.execute("UPDATE app_meta SET value = ? WHERE key = ? AND value < ?", (slot, key, slot)).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return bool(claimed)
+
+
+def _scheduled(job, slot_sec):
+    """예약 작업 함수 래퍼 — 실행권을 얻은 워커만 실행, 오류는 로그만"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper():
+            try:
+                if _scheduler_claim(job, slot_sec):
+                    f()
+            except Exception as e:
+                print(f"[scheduler error] {job}: {e}")
+        return wrapper
+    return decorator
+
+
+@_scheduled('backup', SCHEDULER_CRON_SLOT_SEC)
+def _job_backup():
+    result = _backup_all_now('scheduled')
+    removed = _backup_prune()
+    print(f"[scheduler] backup: {result}, 보존 정리 {removed}개")
+
+
+@_scheduled('checkpoint', CHECKPOINT_INTERVAL_MIN * 60)
+def _job_checkpoint():
+    conn = _open_ledger_conn(get_ledger_db_path(), 60.0)
+    try:
+        conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+    finally:
+        conn.close()
+
+
+@_scheduled('optimize', SCHEDULER_CRON_SLOT_SEC)
+def _job_optimize():
+    conn = _open_ledger_conn(get_ledger_db_path(), 60.0)
+    try:
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+
+
+@_scheduled('status', SCHEDULER_CRON_SLOT_SEC)
+def _job_status():
+    _ledger_status_sweep()
+
+
+def _schedule_times(spec):
+    """'HH:MM,HH:MM' → [(시, 분)] (형식이 틀린 항목은 로그 후 제외)"""
+    times = []
+    for tok in str(spec or '').split(','):
+        tok = tok.strip()
+        if not tok:
+            continue
+        try:
+            h, m = (int(x) for x in tok.split(':'))
+            if not (0 <= h < 24 and 0 <= m < 60):
+                raise ValueError
+        except ValueError:
+            print(f"[scheduler error] 시각 형식 오류: {tok!r} (HH:MM)")
+            continue
+        times.append((h, m))
+    return times
+
+
+def _scheduler_start():
+    """이 워커 프로세스의 예약 작업 스케줄러 시작 (이미 시작했거나 LEDGER_SCHEDULER=0이면 아무 것도 안 함)"""
+    global _scheduler, _scheduler_pid
+    if not LEDGER_SCHEDULER or _scheduler_pid == os.getpid():
+        return
+    with _scheduler_lock:
+        if _scheduler_pid == os.getpid():
+            return
+        _scheduler_pid = os.getpid()
+        try:
+            from apscheduler.schedulers.background import BackgroundScheduler
+            from apscheduler.triggers.cron import CronTrigger
+            from apscheduler.triggers.interval import IntervalTrigger
+        except ImportError:
+            print("[scheduler] APScheduler가 설치되어 있지 않아 예약 작업을 사용하지 않습니다.")
+            return
+        sched = BackgroundScheduler(timezone=KST, daemon=True,
+                                    job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 60})
+        for name, func, spec in (('backup', _job_backup, BACKUP_SCHEDULE), ('optimize', _job_optimize, OPTIMIZE_SCHEDULE),
+                                 ('status', _job_status, STATUS_SCHEDULE)):
+            for h, m in _schedule_times(spec):
+                sched.add_job(func, CronTrigger(hour=h, minute=m, timezone=KST), id=f'{name}_{h:02d}{m:02d}')
+        sched.add_job(_job_checkpoint, IntervalTrigger(minutes=CHECKPOINT_INTERVAL_MIN, timezone=KST), id='checkpoint')
+        sched.start()
+        _scheduler = sched
 
 def calc_supply_value(r):
     """공급가액 = 수수료 + 선착불 + 업체운임"""
@@ -127,6 +781,56 @@ def calc_totals_with_vat(r):
     total2 = fee_out + vat2
     return supply_val, vat1, total1, fee_out, vat2, total2
 
+LEDGER_TOTALS_COLS = ('supply', 'pre_post', 'vat1', 'total1', 'fee_out', 'vat2', 'total2')
+
+def _ledger_float_column(values):
+    """float(v or 0)과 같은 값의 float64 배열. 고유값마다 float()를 한 번씩만 호출(변환 규칙·오류가 행별 계산과 동일)."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+    conv = np.array([float(u or 0) for u in uniques] + [0.0], dtype=np.float64)
+    return conv[codes]  # 결측(None)은 -1 → 마지막 0.0
+
+def _ledger_text_mask(values, pred):
+    """str(v or '').strip()에 pred를 적용한 bool 배열 (고유값마다 한 번씩 판정)."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+    conv = np.array([bool(pred(str(u or '').strip())) for u in uniques] + [bool(pred(''))], dtype=bool)
+    return conv[codes]
+
+@_perf_phase('aggregate')
+def _ledger_totals_columns(rows):
+    """행 목록의 금액 컬럼을 배열로 한 번에 계산 — DataFrame(int64, LEDGER_TOTALS_COLS), 행 순서 동일.
+    calc_totals_with_vat(+ 선착불 int(float()))와 비트 단위로 같은 결과: float()·int() 절사·round()의 짝수 반올림(np.rint)을 그대로 따름.
+    float로 정확히 표현되지 않거나(2**53 이상) 합계가 int64를 넘을 수 있는 값·NaN/무한대가 있으면 행별 계산으로 처리."""
+    n = len(rows)
+    if not n:
+        return pd.DataFrame({c: np.zeros(0, dtype=np.int64) for c in LEDGER_TOTALS_COLS})
+
+    def _col(k):
+        return [r.get(k) for r in rows]
+
+    fee = _ledger_float_column(_col('fee'))
+    comm = _ledger_float_column(_col('comm'))
+    pre = _ledger_float_column(_col('pre_post'))
+    fo = _ledger_float_column(_col('fee_out'))
+    supply_f = fee + comm + pre
+    limit = min(2 ** 53, (2 ** 62) // (n + 1))
+    if not all(np.isfinite(a).all() and (np.abs(a) < limit).all() for a in (supply_f, pre, fo)):
+        out = []
+        for r in rows:
+            supply_val, vat1, total1, fee_out, vat2, total2 = calc_totals_with_vat(r)
+            out.append((supply_val, int(float(r.get('pre_post') or 0)), vat1, total1, fee_out, vat2, total2))
+        return pd.DataFrame(out, columns=list(LEDGER_TOTALS_COLS)).astype(object)
+    supply = np.trunc(supply_f).astype(np.int64)
+    fee_out = np.trunc(fo).astype(np.int64)
+    cash_client = _ledger_text_mask(_col('pay_method_client'), lambda s: s == '현금')
+    cash_driver = _ledger_text_mask(_col('pay_method_driver'), lambda s: s == '현금')
+    cash_confirm = _ledger_text_mask(_col('tax_biz'), lambda s: '현금' in s)
+    vat1 = np.where(cash_client, 0, np.rint(supply.astype(np.float64) * 0.1)).astype(np.int64)
+    vat2 = np.where(cash_driver | cash_confirm, 0, np.rint(fee_out.astype(np.float64) * 0.1)).astype(np.int64)
+    return pd.DataFrame({
+        'supply': supply, 'pre_post': np.trunc(pre).astype(np.int64), 'vat1': vat1, 'total1': supply + vat1,
+        'fee_out': fee_out, 'vat2': vat2, 'total2': fee_out + vat2,
+    })
+
 def calc_vat_auto(data):
     """부가세·합계 자동계산. 공급가액=수수료+선착불+업체운임, 부가세=공급가액*0.1, 합계=공급가액+부가세. 현금건이면 부가세=0"""
     def _f(k): return float(data.get(k) or 0)
@@ -184,30 +888,40 @@ def get_chosung(s):
     return "".join(res)
 
 
-def _row_matches_q(row, q_search):
-    """장부 한 행이 검색어 q(일반 문자열 또는 초성)에 매칭되는지 여부"""
-    row = dict(row) if hasattr(row, 'keys') else row
+# 장부 검색어(q) 대상 필드 — _row_matches_q와 FTS 검색 인덱스(ledger_search) 공통
+LEDGER_SEARCH_FIELDS = ('client_name', 'tax_biz_name', 'd_name', 'c_num', 'route', 'memo1', 'memo2')
+
+
+def _ledger_q_id(q_search):
+    """검색어가 오더고유번호(n01) 또는 숫자면 해당 id, 아니면 None (_row_matches_q와 동일 규칙)."""
     q = (q_search or '').strip()
-    if not q:
-        return True
-    # 오더고유번호: n01 또는 숫자
     if q.lower().startswith('n'):
         num_str = q[1:].lstrip('0') or '0'
         if num_str.isdigit():
             try:
-                if row.get('id') == int(num_str):
-                    return True
+                return int(num_str)
             except (ValueError, TypeError):
                 pass
     if q.isdigit():
         try:
-            if row.get('id') == int(q):
-                return True
+            return int(q)
         except (ValueError, TypeError):
             pass
+    return None
+
+
+def _row_matches_q(row, q_search):
+    """장부 한 행이 검색어 q(일반 문자열 또는 초성)에 매칭되는지 여부"""
+    row = dict(row) if hasattr(row, 'keys') else row
+    q = (q_search or '').strip()
+    if not q:
+        return True
+    # 오더고유번호: n01 또는 숫자
+    q_id = _ledger_q_id(q)
+    if q_id is not None and row.get('id') == q_id:
+        return True
     # 업체명, 기사명, 차량번호, 노선, 매입처명, 메모 등: 포함 또는 초성 포함
-    fields = ['client_name', 'tax_biz_name', 'd_name', 'c_num', 'route', 'memo1', 'memo2', 'req_add']
-    for f in fields:
+    for f in LEDGER_SEARCH_FIELDS:
         val = (row.get(f) or '').strip()
         if not val:
             continue
@@ -661,7 +1375,7 @@ def _pay_status_rules_from_row(r):
                 next_first = date(order_dt.year, order_dt.month + 1, 1)
             _, last_day = calendar.monthrange(next_first.year, next_first.month)
             next_month_last = date(next_first.year, next_first.month, last_day)
-            if date.today() >= next_month_last:
+            if now_kst().date() >= next_month_last:
                 if should_be_miju:
                     return "미지급"
                 tax_paths = (r.get('tax_img') or '').split(',')
@@ -690,6 +1404,102 @@ def _pay_status_from_row(r):
         return "미지급"
     return _pay_status_rules_from_row(r)
 
+
+# 수금상태·지급상태 저장 컬럼(ledger.misu_status / pay_status)
+# 정산관리 상태 필터(미수·조건부미수·미지급·조건부미지급)를 Python 전체 순회 대신 인덱스 WHERE로 처리하기 위해 저장.
+# 모든 장부 쓰기 경로에서 _refresh_ledger_status_cols로 갱신하고, 시간 경과 규칙(배차 30일·결제예정일·익월 말일)은
+# _ledger_status_sweep이 한국시간 하루 1회(워커 공통, app_meta 'status_sweep_day') 미완료 행만 다시 계산.
+MISU_STATUS_COLOR = {"수금완료": "bg-green", "미수": "bg-red", "조건부미수금": "bg-blue"}
+PAY_STATUS_COLOR = {"지급완료": "bg-green", "미지급": "bg-red", "조건부미지급": "bg-blue"}
+_ledger_status_sweep_day = None  # 이 워커가 확인한 마지막 재계산 일자(YYYYMMDD, 한국시간)
+
+
+def _ledger_status_values(r, today_naive=None):
+    """저장용 (수금상태, 지급상태) — 정산관리 표시(_misu_status_for_settlement_row·_pay_status_from_row)와 동일 규칙."""
+    if today_naive is None:
+        today_naive = now_kst().replace(tzinfo=None)
+    misu_status, _ = _misu_status_for_settlement_row(r, today_naive)
+    return misu_status, _pay_status_from_row(r)
+
+
+def _refresh_ledger_status_cols(conn, ids=None, only_open=False):
+    """ledger.misu_status·pay_status 재계산 후 값이 바뀐 행만 UPDATE (commit은 호출하는 쪽에서).
+
+    ids: 대상 장부 id 목록 (None이면 전체). only_open: 수금완료·지급완료가 모두 끝난 행은 제외(시간 경과로 바뀌지 않음).
+    반환: 변경된 행 수."""
+    id_chunks = [None]
+    if ids is not None:
+        id_list = []
+        for i in ids:
+            try:
+                id_list.append(int(i))
+            except (ValueError, TypeError):
+                continue
+        if not id_list:
+            return 0
+        # SQLite 바인딩 변수 개수 제한 대비 500개씩 나눠 조회
+        id_chunks = [id_list[i:i + 500] for i in range(0, len(id_list), 500)]
+    today_naive = now_kst().replace(tzinfo=None)
+    prev_factory = conn.row_factory
+    conn.row_factory = sqlite3.Row
+    changes = []
+    try:
+        for chunk in id_chunks:
+            conditions = []
+            params = []
+            if chunk is not None:
+                conditions.append(f"id IN ({', '.join(['?'] * len(chunk))})")
+                params.extend(chunk)
+            if only_open:
+                conditions.append("(COALESCE(misu_status,'') != '수금완료' OR COALESCE(pay_status,'') != '지급완료')")
+            query = "SELECT * FROM ledger"
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            for row in conn.execute(query, params):
+                r = dict(row)
+                misu_status, pay_status = _ledger_status_values(r, today_naive)
+                if (r.get('misu_status') or '') != misu_status or (r.get('pay_status') or '') != pay_status:
+                    changes.append((misu_status, pay_status, r['id']))
+    finally:
+        conn.row_factory = prev_factory
+    if changes:
+        conn.executemany("UPDATE ledger SET misu_status = ?, pay_status = ? WHERE id = ?", changes)
+    # 장부 쓰기 경로 공통 마무리 — 같은 트랜잭션에서 검색 초성·롤업 대기 목록 처리
+    _ledger_derived_drain(conn)
+    return len(changes)
+
+
+def _ledger_status_sweep():
+    """시간 경과로 바뀌는 수금·지급 상태 일괄 재계산 (한국시간 하루 1회, 미완료 행만).
+
+    재계산한 날짜는 app_meta 'status_sweep_day'에 기록 — 예약 작업(STATUS_SCHEDULE)이든 첫 조회든 한 워커가 한 번 하면
+    다른 워커는 조회 1회로 건너뜀. 같은 날 이미 확인했으면 조회도 없음."""
+    global _ledger_status_sweep_day
+    day = int(now_kst().strftime('%Y%m%d'))
+    if _ledger_status_sweep_day == day:
+        return 0
+    try:
+        conn = connect_ledger()
+        try:
+            row = conn.execute("SELECT value FROM app_meta WHERE key = 'status_sweep_day'").fetchone()
+            if row and int(row[0]) >= day:
+                _ledger_status_sweep_day = day
+                return 0
+            # 쓰기 잠금을 잡은 뒤 다시 확인 — 동시에 들어온 다른 워커는 기다렸다가 기록을 보고 건너뜀
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('status_sweep_day', 0)")
+            claimed = conn.execute("UPDATE app_meta SET value = ? WHERE key = 'status_sweep_day' AND value < ?",
+                                   (day, day)).rowcount
+            changed = _refresh_ledger_status_cols(conn, only_open=True) if claimed else 0
+            conn.commit()
+        finally:
+            conn.close()
+        _ledger_status_sweep_day = day
+        return changed
+    except Exception as e:
+        print(f"[ledger_status_sweep error] {e}")
+        return 0
+
 app = Flask(__name__)
 
 # [배포 보안] 세션·관리자 정보는 환경변수 사용 (미설정 시 기본값은 로컬 전용)
@@ -703,6 +1513,123 @@ if not os.environ.get('FLASK_DEBUG'):
     if os.environ.get('HTTPS', '').lower() in ('1', 'true', 'on'):
         app.config['SESSION_COOKIE_SECURE'] = True
 
+
+class RequestPerfStats:
+    """경로(endpoint)별 응답시간 통계 (LEDGER_PERF) — 구간별 건수 히스토그램(누적), 최근 PERF_RECENT_MAX건 백분위,
+    단계·SQL 시간 합계, SQL 문장별 호출 수·시간·행 수. 워커(프로세스)별 메모리."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.since = now_kst().strftime('%Y-%m-%d %H:%M:%S')
+            self._endpoints = {}
+            self._sql = {}
+            self.sql_dropped = 0
+
+    def record(self, endpoint, status, rec, total):
+        with self._lock:
+            ep = self._endpoints.get(endpoint)
+            if ep is None:
+                ep = self._endpoints[endpoint] = {
+                    'count': 0, 'errors': 0, 'sum': 0.0, 'max': 0.0, 'hist': [0] * (len(PERF_HIST_BOUNDS_MS) + 1),
+                    'recent': deque(maxlen=PERF_RECENT_MAX), 'phases': defaultdict(float),
+                    'sql_sec': 0.0, 'sql_calls': 0, 'sql_rows': 0, 'sql_exec': 0,
+                }
+            ms = total * 1000
+            ep['count'] += 1
+            ep['errors'] += status >= 500
+            ep['sum'] += total
+            ep['max'] = max(ep['max'], total)
+            ep['hist'][bisect.bisect_left(PERF_HIST_BOUNDS_MS, ms)] += 1
+            ep['recent'].append(total)
+            for phase, sec in rec.phases.items():
+                ep['phases'][phase] += sec
+            ep['sql_exec'] += rec.sql_exec
+            for sql, (calls, sec, rows) in rec.sql.items():
+                ep['sql_sec'] += sec
+                ep['sql_calls'] += calls
+                ep['sql_rows'] += rows
+                st = self._sql.get(sql)
+                if st is None:
+                    if len(self._sql) >= PERF_SQL_MAX_STATEMENTS:
+                        self.sql_dropped += 1
+                        continue
+                    st = self._sql[sql] = {'calls': 0, 'sec': 0.0, 'max': 0.0, 'rows': 0}
+                st['calls'] += calls
+                st['sec'] += sec
+                st['max'] = max(st['max'], sec)
+                st['rows'] += rows
+
+    def snapshot(self, top=20):
+        """JSON 응답용 — 경로는 총 시간 순, SQL 문장은 총 시간 상위 top개"""
+        def _ms(sec):
+            return round(sec * 1000, 2)
+
+        with self._lock:
+            endpoints = []
+            for name, ep in sorted(self._endpoints.items(), key=lambda kv: -kv[1]['sum']):
+                recent = sorted(ep['recent'])
+                pct = {f'p{p}_ms': _ms(recent[min(len(recent) - 1, len(recent) * p // 100)]) for p in (50, 90, 99)}
+                n = ep['count']
+                endpoints.append(dict(
+                    endpoint=name, count=n, errors=ep['errors'], mean_ms=_ms(ep['sum'] / n), max_ms=_ms(ep['max']), **pct,
+                    histogram=[{'le_ms': b, 'count': c} for b, c in zip(list(PERF_HIST_BOUNDS_MS) + ['inf'], ep['hist'])],
+                    phases_mean_ms={k: _ms(v / n) for k, v in sorted(ep['phases'].items(), key=lambda kv: -kv[1])},
+                    sql_mean_ms=_ms(ep['sql_sec'] / n), sql_calls_mean=round(ep['sql_calls'] / n, 1),
+                    sql_rows_mean=round(ep['sql_rows'] / n, 1), sql_exec_mean=round(ep['sql_exec'] / n, 1),
+                ))
+            statements = [
+                {'sql': sql, 'calls': st['calls'], 'total_ms': _ms(st['sec']), 'max_ms': _ms(st['max']), 'rows': st['rows']}
+                for sql, st in sorted(self._sql.items(), key=lambda kv: -kv[1]['sec'])[:top]
+            ]
+            return {'since': self.since, 'endpoints': endpoints, 'statements': statements, 'statements_dropped': self.sql_dropped}
+
+
+request_perf_stats = RequestPerfStats()
+
+
+@app.before_request
+def _perf_before_request():
+    if LEDGER_PERF:
+        g._perf = _PerfRecord()
+
+
+def _perf_server_timing(rec, total):
+    sql_sec = sum(st[1] for st in rec.sql.values())
+    timings = [f'total;dur={total * 1000:.1f}', f'sql;dur={sql_sec * 1000:.1f};desc="{rec.sql_exec} stmts"']
+    timings += [f'{phase};dur={sec * 1000:.1f}' for phase, sec in rec.phases.items() if phase and sec >= 0.0001]
+    return ', '.join(timings)
+
+
+@app.after_request
+def _perf_after_request(response):
+    if response.is_streamed:
+        # 스트리밍: 본문은 이 뒤에 생성 — 기록은 g에 남겨 생성 중 SQL도 쌓이게 하고, 응답을 닫을 때(전송 완료) 통계에 기록
+        rec = g.get('_perf')
+        if rec is None:
+            return response
+        rec.switch('serialize')
+        response.headers['Server-Timing'] = _perf_server_timing(rec, time.perf_counter() - rec.start)
+        endpoint, status = request.endpoint or '(unmatched)', response.status_code
+
+        def _finish():
+            rec.switch(None)
+            request_perf_stats.record(endpoint, status, rec, time.perf_counter() - rec.start)
+        response.call_on_close(_finish)
+        return response
+    rec = g.pop('_perf', None)
+    if rec is None:
+        return response
+    rec.switch(None)
+    total = time.perf_counter() - rec.start
+    response.headers['Server-Timing'] = _perf_server_timing(rec, total)
+    request_perf_stats.record(request.endpoint or '(unmatched)', response.status_code, rec, total)
+    return response
+
+
 # Render 등 PaaS 헬스 체크: 포트 감지용 (로그인 불필요)
 @app.route('/health')
 def health():
@@ -766,15 +1693,29 @@ def _enforce_session_and_readonly():
     # DB 전체 백업 다운로드는 보기 권한에서 제한
     if request.method == 'GET' and p in ('/api/download-db', '/download-db', '/download-all'):
         return _viewer_forbidden_response()
+    # 엑셀 내보내기 작업 등록은 조회(다운로드)와 같으므로 보기 권한에서도 허용
+    if request.method == 'POST' and p == '/api/export_jobs':
+        return
     if request.method in ('POST', 'PUT', 'DELETE', 'PATCH'):
         return _viewer_forbidden_response()
 
 
+@app.teardown_request
+def _ledger_pool_teardown(exc):
+    # 요청 중 connect_ledger()로 받은 연결 중 close()되지 않은 것 회수 (오류로 중간 종료된 경우 등)
+    for conn in g.pop('_ledger_conns', []):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
 @app.context_processor
 def _inject_permissions():
     return dict(
         session_role=session.get('role', 'edit'),
         session_is_admin=bool(session.get('is_admin')),
+        export_job_paths=sorted(EXPORT_JOB_PATHS),
     )
 
 
@@ -916,6 +1857,7 @@ def _build_full_columns():
     return ordered
 
 FULL_COLUMNS = _build_full_columns()
+FULL_COLUMN_TYPES = {c['k']: c.get('t', 'text') for c in FULL_COLUMNS}  # 키 → 입력 타입 (값 정제용)
 
 # 통합장부 수정 모달: 품명(라벨) 변경 {키 → 바꿀명}, 없으면 FULL_COLUMNS의 n 사용
 EDIT_MODAL_LABELS = {
@@ -1010,46 +1952,198 @@ def ledger_input_attrs(c):
         return f"type='checkbox' {base}"
     return f"type='text' {base}"
 
-def init_db():
-    conn = connect_ledger()
-    cursor = conn.cursor()
+# 날짜 정규화 컬럼(YYYY-MM-DD): 배차일·오더일·수금일·지급일 범위 조회를 substr() 전체 스캔 대신 인덱스 범위 스캔으로 처리.
+# 값은 트리거(trg_ledger_days_*)가 원본 컬럼 변경 시 자동 갱신. {p}는 트리거 안에서 'NEW.' 접두어.
+# order_day는 오더일 원문 비교(order_dt <= end)의 상위집합이 되도록 빈값을 ''로 유지.
+LEDGER_DAY_COLUMN_EXPRS = {
+    'dispatch_day': "CASE WHEN COALESCE({p}dispatch_dt,'') = '' THEN NULL ELSE substr({p}dispatch_dt,1,10) END",
+    'order_day': "substr(COALESCE({p}order_dt,''),1,10)",
+    'in_day': "CASE WHEN TRIM(COALESCE({p}in_dt,'')) = '' THEN NULL ELSE substr({p}in_dt,1,10) END",
+    'out_day': "CASE WHEN TRIM(COALESCE({p}out_dt,'')) = '' THEN NULL ELSE substr({p}out_dt,1,10) END",
+}
+# 조회용 파생 컬럼(날짜 정규화·수금/지급 상태) — 장부 행 JSON 응답에서는 뺌
+LEDGER_DERIVED_COLS = frozenset([*LEDGER_DAY_COLUMN_EXPRS, 'misu_status', 'pay_status'])
+
+# ledger 보조 인덱스 — 첫 번째는 장부·정산 공통 정렬(배차일 없음 뒤로, 배차일↓, id↓)과 동일한 식 인덱스
+LEDGER_INDEXES = [
+    ("idx_ledger_dispatch_sort", "(CASE WHEN dispatch_dt IS NULL OR dispatch_dt = '' THEN 1 ELSE 0 END), dispatch_dt DESC, id DESC"),
+    ("idx_ledger_dispatch_day", "dispatch_day, dispatch_dt, id"),
+    ("idx_ledger_order_day", "order_day"),
+    ("idx_ledger_in_day", "in_day"),
+    ("idx_ledger_out_day", "out_day"),
+    ("idx_ledger_client_name", "client_name"),
+    ("idx_ledger_driver", "d_name, c_num"),
+    ("idx_ledger_c_num", "c_num"),
+]
+
+
+# 장부 검색어(q) FTS5 인덱스: trigram 토크나이저로 부분일치(LIKE)도 인덱스 조회.
+# body = LEDGER_SEARCH_FIELDS를 줄바꿈으로 연결(검색어는 한 줄이므로 필드 경계를 넘는 일치 없음), cho = body의 초성.
+# rowid = ledger.id. 트리거(trg_ledger_search_*, 순수 SQL)가 ledger 변경 시 body를 갱신하고 id를 ledger_search_pending에 기록,
+# 초성(cho)은 Python(get_chosung)으로 _ledger_derived_drain이 채움 — 외부 SQLite 도구로 ledger를 수정해도 트리거가 실패하지 않음.
+_ledger_fts_ok = False
+_ledger_pending_ok = False  # 대기 목록 테이블(9단계) 존재 여부 — 그 전 마이그레이션 단계에서는 대기 목록 처리 생략
+
+
+def _ledger_search_body_sql(prefix=''):
+    """검색 인덱스 body 식 (prefix='NEW.'이면 트리거용)."""
+    return " || char(10) || ".join(f"COALESCE({prefix}{f},'')" for f in LEDGER_SEARCH_FIELDS)
+
+
+def _append_ledger_q_search_sql(conditions, params, q_search, leading=""):
+    """ledger SQL WHERE: 장부 검색어(q) — 검색 인덱스로 부분일치·초성 일치 id 조회 + 오더고유번호(n01·숫자) 일치.
+    검색 인덱스를 만들 수 없는 환경이면 False 반환(호출측에서 _row_matches_q로 필터)."""
+    q = (q_search or '').strip()
+    if not q:
+        return True
+    if not _ledger_fts_ok:
+        return False
+    _ledger_derived_sync()
+    pat = f"%{q}%"
+    cond = "id IN (SELECT rowid FROM ledger_search WHERE body LIKE ? OR cho LIKE ?)"
+    params.extend([pat, pat])
+    q_id = _ledger_q_id(q)
+    if q_id is not None:
+        cond = f"({cond} OR id = ?)"
+        params.append(q_id)
+    conditions.append(f"{leading}{cond}")
+    return True
+
+
+def _ledger_day_set_sql(prefix=''):
+    """UPDATE ledger SET 절: 날짜 정규화 컬럼 전체 (prefix='NEW.'이면 트리거용)."""
+    return ", ".join(f"{col} = {expr.format(p=prefix)}" for col, expr in LEDGER_DAY_COLUMN_EXPRS.items())
+
+
+# 통계 롤업(ledger_rollup): 배차일·매출처·매입처·차량번호·상태 플래그별 건수·금액 합계.
+# 키·금액은 통계 화면과 같은 Python 규칙(calc_totals_with_vat, strip 기준)으로 계산해야 하므로 트리거(trg_ledger_rollup_*, 순수 SQL)는
+# 바뀐 행의 이전·새 배차일만 ledger_rollup_pending에 기록하고, _ledger_derived_drain이 그 배차일 롤업을 Python으로 다시 계산.
+# in_flag/out_flag: 0=값 없음, 1=공백만, 2=날짜 있음 (상태 필터는 값 유무, 일별 미수·미지급은 공백 제외 기준이라 구분)
+LEDGER_ROLLUP_SRC_COLS = ('dispatch_dt', 'client_name', 'tax_biz_name', 'c_num', 'month_end_client', 'month_end_driver',
+                          'pay_method_client', 'pay_method_driver', 'in_dt', 'out_dt', 'misu_status', 'pay_status',
+                          'fee', 'pre_post', 'fee_out', 'tax_biz')
+LEDGER_ROLLUP_KEYS = ('day_norm', 'day', 'client_name', 'vendor', 'c_num', 'me_client', 'me_driver',
+                      'cash_client', 'cash_driver', 'in_flag', 'out_flag', 'misu_status', 'pay_status')
+LEDGER_ROLLUP_SUMS = ('supply', 'pre_post', 'vat1', 'total1', 'fee_out', 'vat2', 'total2')
+
+
+def _ledger_rollup_row(vals):
+    """ledger 1행(LEDGER_ROLLUP_SRC_COLS 순서) → 롤업 키 + 금액 목록(LEDGER_ROLLUP_KEYS + LEDGER_ROLLUP_SUMS 순서).
+    장부 저장 트랜잭션 안에서도 쓰이므로 금액 변환 오류는 0으로 처리(장부 저장이 실패하지 않도록)."""
+    r = dict(zip(LEDGER_ROLLUP_SRC_COLS, vals))
+
+    def _flag(v):
+        return 0 if not v else (1 if not str(v).strip() else 2)
+
+    def _yes(v):
+        return 1 if str(v or '').strip() in ('1', 'Y') else 0
+
+    def _cash(v):
+        return 1 if str(v or '').strip() == '현금' else 0
+
+    day = str(r['dispatch_dt'])[:10] if r['dispatch_dt'] else ''
+    keys = [day.strip(), day, str(r['client_name'] or ''), str(r['tax_biz_name'] or ''), str(r['c_num'] or '').strip(),
+            _yes(r['month_end_client']), _yes(r['month_end_driver']),
+            _cash(r['pay_method_client']), _cash(r['pay_method_driver']),
+            _flag(r['in_dt']), _flag(r['out_dt']), str(r['misu_status'] or ''), str(r['pay_status'] or '')]
     try:
-        cursor.execute("PRAGMA journal_mode=WAL")
-    except Exception:
-        pass
+        supply_val, vat1, total1, fee_out, vat2, total2 = calc_totals_with_vat(r)
+        sums = [supply_val, int(float(r['pre_post'] or 0)), vat1, total1, fee_out, vat2, total2]
+    except (TypeError, ValueError, OverflowError):
+        sums = [0] * len(LEDGER_ROLLUP_SUMS)
+    return keys + sums
 
+
+def _ledger_rollup_insert(conn, rows):
+    """ledger 행(LEDGER_ROLLUP_SRC_COLS 순서) 묶음을 롤업 키별로 합산해 ledger_rollup에 INSERT"""
+    n_keys = len(LEDGER_ROLLUP_KEYS)
+    groups = {}
+    for row in rows:
+        vals = _ledger_rollup_row(row)
+        g = groups.setdefault(tuple(vals[:n_keys]), [0] * (1 + len(LEDGER_ROLLUP_SUMS)))
+        g[0] += 1
+        for i, v in enumerate(vals[n_keys:], 1):
+            g[i] += v
+    cols = LEDGER_ROLLUP_KEYS + ('cnt',) + LEDGER_ROLLUP_SUMS
+    conn.executemany(f"INSERT INTO ledger_rollup ({', '.join(cols)}) VALUES ({', '.join(['?'] * len(cols))})",
+                     [k + tuple(g) for k, g in groups.items()])
+
+
+def _ledger_rollup_rebuild(conn):
+    """ledger 전체로 롤업 다시 계산 (처음 만들 때·불일치 복구용, commit은 호출하는 쪽에서)."""
+    conn.execute("DELETE FROM ledger_rollup")
+    _ledger_rollup_insert(conn, conn.execute(f"SELECT {', '.join(LEDGER_ROLLUP_SRC_COLS)} FROM ledger"))
+
+
+def _ledger_rollup_refresh_days(conn, days):
+    """배차일(롤업 day 키 = dispatch_dt 앞 10자, 없으면 '') 목록의 롤업만 다시 계산 — dispatch_day 인덱스로 해당 일자 행만 조회."""
+    days = sorted(set(days))
+    src_cols = ', '.join(LEDGER_ROLLUP_SRC_COLS)
+    if '' in days:
+        conn.execute("DELETE FROM ledger_rollup WHERE day = ''")
+        _ledger_rollup_insert(conn, conn.execute(f"SELECT {src_cols} FROM ledger WHERE dispatch_day IS NULL"))
+    days = [d for d in days if d]
+    for i in range(0, len(days), 500):
+        chunk = days[i:i + 500]
+        marks = ', '.join(['?'] * len(chunk))
+        conn.execute(f"DELETE FROM ledger_rollup WHERE day IN ({marks})", chunk)
+        _ledger_rollup_insert(conn, conn.execute(f"SELECT {src_cols} FROM ledger WHERE dispatch_day IN ({marks})", chunk))
+
+
+def _ledger_search_rebuild(conn):
+    """ledger 전체로 검색 인덱스(body·초성) 다시 채움 (처음 만들 때·불일치 복구용, commit은 호출하는 쪽에서)."""
+    conn.execute("DELETE FROM ledger_search")
+    rows = conn.execute(f"SELECT id, {_ledger_search_body_sql()} FROM ledger").fetchall()
+    conn.executemany("INSERT INTO ledger_search (rowid, body, cho) VALUES (?, ?, ?)",
+                     [(row_id, body, get_chosung(body)) for row_id, body in rows])
+
+
+def _ledger_derived_drain(conn):
+    """트리거가 남긴 대기 목록 처리: 검색 인덱스 초성(cho) 채우기 + 바뀐 배차일 롤업 다시 계산 (commit은 호출하는 쪽에서).
+    반환: 처리한 (검색 행 수, 배차일 수)."""
+    if not _ledger_pending_ok:
+        return 0, 0
+    n_search = 0
+    if _ledger_fts_ok:
+        rows = conn.execute("SELECT s.rowid, s.body FROM ledger_search_pending p "
+                            "JOIN ledger_search s ON s.rowid = p.id").fetchall()
+        conn.executemany("UPDATE ledger_search SET cho = ? WHERE rowid = ?",
+                         [(get_chosung(body or ''), row_id) for row_id, body in rows])
+        conn.execute("DELETE FROM ledger_search_pending")
+        n_search = len(rows)
+    days = [d for (d,) in conn.execute("SELECT day FROM ledger_rollup_pending").fetchall()]
+    if days:
+        _ledger_rollup_refresh_days(conn, days)
+        conn.execute("DELETE FROM ledger_rollup_pending")
+    return n_search, len(days)
+
+
+def _ledger_derived_sync():
+    """조회 전 호출: 대기 목록이 있으면(외부 SQLite 도구 수정·상태 재계산 등) 쓰기 트랜잭션으로 처리. 없으면 조회 1회."""
+    if not _ledger_pending_ok:
+        return
+    try:
+        conn = connect_ledger()
+        try:
+            pending = conn.execute("SELECT EXISTS (SELECT 1 FROM ledger_rollup_pending) OR "
+                                   "EXISTS (SELECT 1 FROM ledger_search_pending)").fetchone()[0]
+            if pending:
+                conn.execute("BEGIN IMMEDIATE")
+                _ledger_derived_drain(conn)
+                conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[ledger_derived_sync error] {e}")
+
+
+def _migrate_base_tables(conn):
+    """기본 테이블: ledger(FULL_COLUMNS), drivers, clients, activity_logs, arrival_status, app_users(+최초 관리자)"""
+    cursor = conn.cursor()
     keys = [c['k'] for c in FULL_COLUMNS]
     cols_sql = ", ".join([f"'{k}' TEXT" for k in keys])
     cursor.execute(f"CREATE TABLE IF NOT EXISTS ledger (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols_sql})")
-
-    cursor.execute("PRAGMA table_info(ledger)")
-    existing_ledger_cols = [info[1] for info in cursor.fetchall()]
-    for k in keys:
-        if k not in existing_ledger_cols:
-            try:
-                cursor.execute(f"ALTER TABLE ledger ADD COLUMN '{k}' TEXT")
-            except Exception:
-                pass
-    if 'memo1_bg' not in existing_ledger_cols:
-        try:
-            cursor.execute("ALTER TABLE ledger ADD COLUMN memo1_bg TEXT")
-        except Exception:
-            pass
-    if 'is_mail_done' not in existing_ledger_cols:
-        try:
-            cursor.execute("ALTER TABLE ledger ADD COLUMN is_mail_done TEXT")
-        except Exception:
-            pass
-    if 'pay_click_miju' not in existing_ledger_cols:
-        try:
-            cursor.execute("ALTER TABLE ledger ADD COLUMN pay_click_miju TEXT")
-        except Exception:
-            pass
-    if 'in_click_misu' not in existing_ledger_cols:
-        try:
-            cursor.execute("ALTER TABLE ledger ADD COLUMN in_click_misu TEXT")
-        except Exception:
-            pass
+    _sync_table_columns(conn)
 
     # 기사 테이블 컬럼 보강
     cursor.execute("""
@@ -1060,6 +2154,70 @@ def init_db():
             '은행명' TEXT, '예금주' TEXT
         )
     """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS activity_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        action TEXT,          -- 등록, 수정 등 행위
+        target_id INTEGER,    -- 대상 장부 ID
+        details TEXT          -- 변경 내용 요약
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS arrival_status (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        target_time TEXT,
+        content TEXT,
+        content_important TEXT,
+        content_color TEXT,
+        content_font TEXT,
+        content_font_size TEXT,
+        order_idx INTEGER DEFAULT 0
+    )
+    """)
+    cursor.execute("PRAGMA table_info(arrival_status)")
+    existing = [r[1] for r in cursor.fetchall()]
+    for col, col_type in (('content_important', 'TEXT'), ('content_color', 'TEXT'), ('content_font', 'TEXT'),
+                          ('content_font_size', 'TEXT'), ('page_idx', 'INTEGER DEFAULT 1'), ('status', "TEXT DEFAULT ''")):
+        if col not in existing:
+            try:
+                cursor.execute(f"ALTER TABLE arrival_status ADD COLUMN {col} {col_type}")
+            except Exception:
+                pass
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS app_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'edit' CHECK (role IN ('view', 'edit')),
+            is_admin INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("SELECT COUNT(*) FROM app_users")
+    if cursor.fetchone()[0] == 0:
+        h = generate_password_hash(str(ADMIN_PW))
+        cursor.execute(
+            "INSERT INTO app_users (username, password_hash, role, is_admin) VALUES (?,?,?,?)",
+            (str(ADMIN_ID).strip(), h, 'edit', 1),
+        )
+
+
+def _sync_table_columns(conn):
+    """코드 정의 컬럼(ledger: FULL_COLUMNS 등, clients: CLIENT_COLS) 중 DB에 없는 것 추가.
+    컬럼 목록은 코드에서 바뀌므로 마이그레이션 번호와 별개로 기동 시마다 확인(PRAGMA 2회)."""
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(ledger)")
+    existing_ledger_cols = [info[1] for info in cursor.fetchall()]
+    if existing_ledger_cols:
+        extra = ['memo1_bg', 'is_mail_done', 'pay_click_miju', 'in_click_misu']
+        for k in [c['k'] for c in FULL_COLUMNS] + extra:
+            if k not in existing_ledger_cols:
+                try:
+                    cursor.execute(f"ALTER TABLE ledger ADD COLUMN '{k}' TEXT")
+                    existing_ledger_cols.append(k)
+                except Exception:
+                    pass
     # 업체(clients) 테이블: 없으면 CLIENT_COLS로 생성, 있으면 누락 컬럼 추가
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='clients'")
     if cursor.fetchone():
@@ -1075,95 +2233,556 @@ def init_db():
         cols_clients = ", ".join([f"[{c}] TEXT" for c in CLIENT_COLS])
         cursor.execute(f"CREATE TABLE clients ({cols_clients})")
 
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS activity_logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        action TEXT,          -- 등록, 수정 등 행위
-        target_id INTEGER,    -- 대상 장부 ID
-        details TEXT          -- 변경 내용 요약
-    )
-    """)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS arrival_status (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        target_time TEXT,
-        content TEXT,
-        content_important TEXT,
-        content_color TEXT,
-        content_font TEXT,
-        content_font_size TEXT,
-        order_idx INTEGER DEFAULT 0
-    )
-    """)
-    for col in ['content_important', 'content_color', 'content_font', 'content_font_size']:
-        try:
-            cursor.execute("PRAGMA table_info(arrival_status)")
-            existing = [r[1] for r in cursor.fetchall()]
-            if col not in existing:
-                cursor.execute(f"ALTER TABLE arrival_status ADD COLUMN {col} TEXT")
-        except Exception:
-            pass
-    try:
-        cursor.execute("PRAGMA table_info(arrival_status)")
-        existing = [r[1] for r in cursor.fetchall()]
-        if 'page_idx' not in existing:
-            cursor.execute("ALTER TABLE arrival_status ADD COLUMN page_idx INTEGER DEFAULT 1")
-    except Exception:
-        pass
-    try:
-        cursor.execute("PRAGMA table_info(arrival_status)")
-        existing = [r[1] for r in cursor.fetchall()]
-        if 'status' not in existing:
-            cursor.execute("ALTER TABLE arrival_status ADD COLUMN status TEXT DEFAULT ''")
-    except Exception:
-        pass
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS app_users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL UNIQUE,
-            password_hash TEXT NOT NULL,
-            role TEXT NOT NULL DEFAULT 'edit' CHECK (role IN ('view', 'edit')),
-            is_admin INTEGER NOT NULL DEFAULT 0
-        )
-    """)
-    cursor.execute("SELECT COUNT(*) FROM app_users")
-    if cursor.fetchone()[0] == 0:
-        h = generate_password_hash(str(ADMIN_PW))
-        cursor.execute(
-            "INSERT INTO app_users (username, password_hash, role, is_admin) VALUES (?,?,?,?)",
-            (str(ADMIN_ID).strip(), h, 'edit', 1),
-        )
+def _ledger_cols(conn):
+    return [info[1] for info in conn.execute("PRAGMA table_info(ledger)").fetchall()]
+
+
+def _migrate_status_cols(conn):
+    """수금상태·지급상태 저장 컬럼 (정산관리 상태 필터를 SQL로 처리). 새로 추가된 경우 기존 행 전체 계산"""
+    cursor = conn.cursor()
+    existing_ledger_cols = _ledger_cols(conn)
+    status_cols_added = False
+    for col in ('misu_status', 'pay_status'):
+        if col not in existing_ledger_cols:
+            try:
+                cursor.execute(f"ALTER TABLE ledger ADD COLUMN {col} TEXT")
+                status_cols_added = True
+            except Exception:
+                pass
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ledger_misu_status ON ledger (misu_status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ledger_pay_status ON ledger (pay_status)")
+    if status_cols_added:
+        _refresh_ledger_status_cols(conn)
+
+
+def _migrate_day_cols(conn):
+    """날짜 정규화 컬럼(dispatch_day 등) + 유지 트리거 + 조회/정렬 인덱스. 새로 추가된 경우 기존 행 채움"""
+    cursor = conn.cursor()
+    existing_ledger_cols = _ledger_cols(conn)
+    day_cols_added = False
+    for col in LEDGER_DAY_COLUMN_EXPRS:
+        if col not in existing_ledger_cols:
+            try:
+                cursor.execute(f"ALTER TABLE ledger ADD COLUMN {col} TEXT")
+                day_cols_added = True
+            except Exception:
+                pass
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_ledger_days_ins AFTER INSERT ON ledger
+        BEGIN UPDATE ledger SET {_ledger_day_set_sql('NEW.')} WHERE id = NEW.id; END""")
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_ledger_days_upd AFTER UPDATE OF dispatch_dt, order_dt, in_dt, out_dt ON ledger
+        BEGIN UPDATE ledger SET {_ledger_day_set_sql('NEW.')} WHERE id = NEW.id; END""")
+    if day_cols_added:
+        cursor.execute(f"UPDATE ledger SET {_ledger_day_set_sql()}")
+    for idx_name, idx_cols in LEDGER_INDEXES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {idx_name} ON ledger ({idx_cols})")
+
+
+def _migrate_search_index(conn):
+    """장부 검색어 FTS5 인덱스(ledger_search). 새로 만든 경우 기존 행 전체 색인 (동기화 트리거는 9단계 _migrate_derived_triggers).
+    FTS5가 없는 SQLite면 만들지 않고 넘어감(검색은 Python 필터로 동작)."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='ledger_search'")
+        fts_created = cursor.fetchone() is None
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS ledger_search USING fts5(body, cho, tokenize='trigram')")
+        if fts_created:
+            _ledger_search_rebuild(conn)
+    except Exception as e:
+        print(f"[init_db search index error] {e}")
+        # 색인이 반쯤 만들어진 채 남지 않도록 정리
+        try:
+            conn.rollback()
+            for trg in ('trg_ledger_search_ins', 'trg_ledger_search_upd', 'trg_ledger_search_del'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trg}")
+            cursor.execute("DROP TABLE IF EXISTS ledger_search")
+        except Exception:
+            pass
+
+
+def _migrate_app_meta(conn):
+    """앱 메타 값(key/value): dir_gen = 기사·업체(drivers/clients) 변경 세대번호 — 메모리 디렉터리 갱신 판단용"""
+    conn.execute("CREATE TABLE IF NOT EXISTS app_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)")
+    conn.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('dir_gen', 0)")
+
+
+def _migrate_export_jobs(conn):
+    """엑셀 내보내기 백그라운드 작업(export_jobs) — 워커 간 공유되는 상태·진행률·결과 파일 경로"""
+    conn.execute("""CREATE TABLE IF NOT EXISTS export_jobs (
+        id TEXT PRIMARY KEY,
+        user_id TEXT,
+        url TEXT,
+        state TEXT NOT NULL DEFAULT 'queued',   -- queued / running / done / error
+        rows_scanned INTEGER DEFAULT 0,
+        rows_written INTEGER DEFAULT 0,
+        bytes_written INTEGER DEFAULT 0,
+        filename TEXT,
+        mimetype TEXT,
+        file_path TEXT,
+        error TEXT,
+        created_at REAL,
+        finished_at REAL
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_export_jobs_created ON export_jobs (created_at)")
+
+
+def _migrate_ledger_rollup(conn):
+    """통계 롤업(ledger_rollup). 유지 트리거가 아직 없으면(새로 만들거나 트리거를 뗀 경우) 기존 행 전체 집계
+    (트리거는 9단계 _migrate_derived_triggers)"""
+    cursor = conn.cursor()
+    flag_cols = ('me_client', 'me_driver', 'cash_client', 'cash_driver', 'in_flag', 'out_flag')
+    key_defs = ", ".join(f"{c} {'INTEGER' if c in flag_cols else 'TEXT'} NOT NULL" for c in LEDGER_ROLLUP_KEYS)
+    sum_defs = ", ".join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in LEDGER_ROLLUP_SUMS)
+    cursor.execute(f"""CREATE TABLE IF NOT EXISTS ledger_rollup ({key_defs}, cnt INTEGER NOT NULL DEFAULT 0, {sum_defs},
+        PRIMARY KEY ({', '.join(LEDGER_ROLLUP_KEYS)})) WITHOUT ROWID""")
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='trg_ledger_rollup_ins'")
+    if cursor.fetchone() is None:
+        _ledger_rollup_rebuild(conn)
+
+
+def _migrate_ledger_gen(conn):
+    """장부 변경 세대번호(app_meta.ledger_gen) + 갱신 트리거 — 정산·통계 조회 결과 캐시 무효화용"""
+    conn.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('ledger_gen', 0)")
+    bump = "UPDATE app_meta SET value = value + 1 WHERE key = 'ledger_gen';"
+    for trg, event in (('ins', 'INSERT'), ('upd', 'UPDATE'), ('del', 'DELETE')):
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_ledger_gen_{trg} AFTER {event} ON ledger BEGIN {bump} END")
+
+
+def _migrate_derived_triggers(conn):
+    """검색 인덱스·통계 롤업 유지 트리거를 순수 SQL로 (재)생성 — 이전 버전의 앱 등록 함수(ledger_chosung·ledger_rollup_vals)
+    트리거를 대체해 외부 SQLite 도구(sqlite3 CLI·DB Browser)에서도 ledger 수정이 가능하도록.
+    트리거는 대기 목록(ledger_search_pending·ledger_rollup_pending)만 기록하고 계산은 _ledger_derived_drain이 수행."""
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE IF NOT EXISTS ledger_search_pending (id INTEGER PRIMARY KEY)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS ledger_rollup_pending (day TEXT PRIMARY KEY) WITHOUT ROWID")
+    for trg in ('search_ins', 'search_upd', 'search_del', 'rollup_ins', 'rollup_upd', 'rollup_del'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_ledger_{trg}")
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='ledger_search'")
+    if cursor.fetchone() is not None:
+        body_new = _ledger_search_body_sql('NEW.')
+        mark = "INSERT OR IGNORE INTO ledger_search_pending (id) VALUES (NEW.id);"
+        cursor.execute(f"""CREATE TRIGGER trg_ledger_search_ins AFTER INSERT ON ledger
+            BEGIN INSERT INTO ledger_search (rowid, body, cho) VALUES (NEW.id, {body_new}, ''); {mark} END""")
+        cursor.execute(f"""CREATE TRIGGER trg_ledger_search_upd AFTER UPDATE OF {', '.join(LEDGER_SEARCH_FIELDS)} ON ledger
+            BEGIN DELETE FROM ledger_search WHERE rowid = OLD.id;
+            INSERT INTO ledger_search (rowid, body, cho) VALUES (NEW.id, {body_new}, ''); {mark} END""")
+        cursor.execute("""CREATE TRIGGER trg_ledger_search_del AFTER DELETE ON ledger
+            BEGIN DELETE FROM ledger_search WHERE rowid = OLD.id; DELETE FROM ledger_search_pending WHERE id = OLD.id; END""")
+    day = "INSERT OR IGNORE INTO ledger_rollup_pending (day) VALUES (substr(COALESCE({p}.dispatch_dt,''),1,10));"
+    cursor.execute(f"""CREATE TRIGGER trg_ledger_rollup_ins AFTER INSERT ON ledger
+        BEGIN {day.format(p='NEW')} END""")
+    cursor.execute(f"""CREATE TRIGGER trg_ledger_rollup_upd AFTER UPDATE OF {', '.join(LEDGER_ROLLUP_SRC_COLS)} ON ledger
+        BEGIN {day.format(p='OLD')} {day.format(p='NEW')} END""")
+    cursor.execute(f"""CREATE TRIGGER trg_ledger_rollup_del AFTER DELETE ON ledger
+        BEGIN {day.format(p='OLD')} END""")
+
+
+def _migrate_export_jobs_owner(conn):
+    """export_jobs 실행 워커(worker)·생존 신호(heartbeat_at) — 중단된 워커가 남긴 queued/running 작업 판별용"""
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(export_jobs)").fetchall()}
+    for col, col_type in (('worker', 'TEXT'), ('heartbeat_at', 'REAL')):
+        if col not in existing:
+            conn.execute(f"ALTER TABLE export_jobs ADD COLUMN {col} {col_type}")
+
+
+# 스키마 마이그레이션: (버전, 설명, 함수) — 순서대로 한 번씩 실행하고 schema_version에 기록.
+# 새 스키마 변경은 목록 끝에 다음 번호로 추가 (기존 항목 번호·순서 변경 금지).
+# 각 단계는 재실행해도 안전하게 작성 (schema_version이 없는 기존 DB는 1번부터 다시 실행됨).
+SCHEMA_MIGRATIONS = [
+    (1, '기본 테이블(ledger·drivers·clients·activity_logs·arrival_status·app_users)', _migrate_base_tables),
+    (2, '수금·지급 상태 컬럼', _migrate_status_cols),
+    (3, '날짜 정규화 컬럼·보조 인덱스', _migrate_day_cols),
+    (4, '장부 검색 인덱스(FTS5)', _migrate_search_index),
+    (5, 'app_meta(dir_gen)', _migrate_app_meta),
+    (6, '엑셀 내보내기 작업(export_jobs)', _migrate_export_jobs),
+    (7, '통계 롤업(ledger_rollup)', _migrate_ledger_rollup),
+    (8, '장부 변경 세대번호(ledger_gen)', _migrate_ledger_gen),
+    (9, '검색 인덱스·통계 롤업 트리거(순수 SQL + 대기 목록)', _migrate_derived_triggers),
+    (10, '엑셀 내보내기 작업 실행 워커·생존 신호', _migrate_export_jobs_owner),
+]
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+_schema_checked_path = None  # 이 프로세스에서 최신 스키마 확인을 마친 DB (경로, inode)
+
+
+def _schema_version(conn):
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+        return int(row[0] or 0)
+    except sqlite3.Error:
+        return 0
+
+
+def _ledger_fts_detect(conn):
+    global _ledger_fts_ok, _ledger_pending_ok
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN "
+                                         "('ledger_search', 'ledger_search_pending', 'ledger_rollup_pending')")}
+    _ledger_fts_ok = 'ledger_search' in tables
+    _ledger_pending_ok = {'ledger_search_pending', 'ledger_rollup_pending'} <= tables
+
+
+def migrate_db():
+    """미적용 스키마 마이그레이션 실행 + 코드 정의 컬럼 동기화 (기동 시 init_db 또는 `flask --app app migrate-db`)."""
+    conn = connect_ledger()
+    try:
+        conn.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""")
+        current = _schema_version(conn)
+        for version, desc, step in SCHEMA_MIGRATIONS:
+            if version <= current:
+                continue
+            try:
+                step(conn)
+                conn.execute("INSERT OR REPLACE INTO schema_version (version, description) VALUES (?, ?)", (version, desc))
+                conn.commit()
+            except Exception as e:
+                # 실패한 단계부터는 기록하지 않음 — 다음 init_db() 호출 때 다시 시도
+                conn.rollback()
+                print(f"[migrate_db error] {version}: {e}")
+                break
+            print(f"[migrate_db] {version}: {desc}")
+        if current >= 1:
+            _sync_table_columns(conn)
+        _ledger_fts_detect(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def init_db():
+    """스키마 최신 여부 확인. 이 프로세스에서 같은 DB 파일을 이미 확인했으면 schema_version 조회 1회,
+    그 외(기동 직후·DB 파일 교체·삭제 후 재생성)에는 migrate_db() 실행."""
+    global _schema_checked_path
+    path = get_ledger_db_path()
+    key = _ledger_pool_key(path)
+    if _schema_checked_path == key:
+        conn = connect_ledger()
+        try:
+            if _schema_version(conn) >= SCHEMA_VERSION:
+                return
+        finally:
+            conn.close()
+    migrate_db()
+    _schema_checked_path = _ledger_pool_key(path)
+
+
+@app.cli.command('rebuild-derived')
+def rebuild_derived_command():
+    """검색 인덱스·통계 롤업 전체 다시 계산 (백업 복원·외부 도구 수정 후 불일치 복구): flask --app app rebuild-derived"""
+    init_db()
+    conn = connect_ledger()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if _ledger_fts_ok:
+            _ledger_search_rebuild(conn)
+        _ledger_rollup_rebuild(conn)
+        conn.execute("DELETE FROM ledger_search_pending")
+        conn.execute("DELETE FROM ledger_rollup_pending")
+        conn.commit()
+        print(f"ledger_search = {'rebuilt' if _ledger_fts_ok else 'n/a (FTS5 없음)'}, "
+              f"ledger_rollup = {conn.execute('SELECT COUNT(*) FROM ledger_rollup').fetchone()[0]} keys")
+    finally:
+        conn.close()
+
+
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """스키마 마이그레이션 실행: flask --app app migrate-db"""
+    migrate_db()
+    conn = connect_ledger()
+    try:
+        print(f"schema_version = {_schema_version(conn)}")
+    finally:
+        conn.close()
+
+
+init_db()
+class MemDirectory:
+    """기사관리·업체관리 메모리 목록 + 조회용 해시 인덱스.
+    load_db_to_mem()이 전체를 읽어 새로 만들고, 이후 개별 변경은 put_driver/drop_driver/put_clients로 행 단위 반영.
+    목록은 rowid 순(기사 id = rowid, 업체 rowid는 client_rowids에 별도 보관 — 화면 JSON에는 넣지 않음).
+    같은 키가 여러 건이면 rowid 순 첫 건 기준 (기존 순차 검색과 동일).
+    version = 반영된 기사·업체 변경 세대번호(app_meta.dir_gen)."""
+
+    def __init__(self, drivers=None, clients=None, version=0, client_rowids=None):
+        self.drivers = drivers or []
+        self.clients = clients or []
+        self.client_rowids = list(client_rowids) if client_rowids is not None else list(range(1, len(self.clients) + 1))
+        self.version = version
+        self._driver_by_id = {}
+        self._drivers_by_key = {}
+        self._drivers_by_c_num = {}
+        self._c_nums_by_type = {}
+        self._clients_by_name = {}
+        for d in self.drivers:
+            self._index_driver(d)
+        c_nums_by_type = {}
+        for c_num, lst in self._drivers_by_c_num.items():
+            for d in lst:
+                c_nums_by_type.setdefault(str(d.get('개인/고정', '')).strip(), set()).add(c_num)
+        self._c_nums_by_type = {t: frozenset(v) for t, v in c_nums_by_type.items()}
+        for c in self.clients:
+            name = self._client_key(c)
+            if name:
+                self._clients_by_name.setdefault(name, []).append(c)
+
+    @staticmethod
+    def _driver_id(d):
+        try:
+            return int(d.get('id') or 0)
+        except (ValueError, TypeError):
+            return 0
+
+    @staticmethod
+    def _driver_key(d):
+        return (str(d.get('기사명', '')).strip(), str(d.get('차량번호', '')).strip())
+
+    @staticmethod
+    def _client_key(c):
+        return str(c.get('업체명') or '').strip()
+
+    def _index_driver(self, d):
+        self._driver_by_id[self._driver_id(d)] = d
+        key = self._driver_key(d)
+        bisect.insort(self._drivers_by_key.setdefault(key, []), d, key=self._driver_id)
+        if key[1]:
+            bisect.insort(self._drivers_by_c_num.setdefault(key[1], []), d, key=self._driver_id)
+
+    def _unindex_driver(self, d):
+        self._driver_by_id.pop(self._driver_id(d), None)
+        key = self._driver_key(d)
+        for index, k in ((self._drivers_by_key, key), (self._drivers_by_c_num, key[1])):
+            lst = [x for x in index.get(k, []) if x is not d]
+            if lst:
+                index[k] = lst
+            else:
+                index.pop(k, None)
+
+    def _reindex_c_num(self, c_num):
+        """차량번호 하나의 개인/고정 구분 집합 소속을 다시 계산.
+        구분별 집합은 frozenset이고 바뀐 구분만 새 집합으로 교체(copy-on-write) — 조회·내보내기 스레드가 들고 있는 집합은 그대로."""
+        if not c_num:
+            return
+        types = {str(d.get('개인/고정', '')).strip() for d in self._drivers_by_c_num.get(c_num, [])}
+        for d_type in set(self._c_nums_by_type) | types:
+            c_nums = self._c_nums_by_type.get(d_type, frozenset())
+            if (c_num in c_nums) != (d_type in types):
+                self._c_nums_by_type[d_type] = c_nums | {c_num} if d_type in types else c_nums - {c_num}
+
+    def put_driver(self, row):
+        """기사 행(id = drivers.rowid) 추가 또는 교체"""
+        row_id = self._driver_id(row)
+        old = self._driver_by_id.get(row_id)
+        drivers = list(self.drivers)  # 새 목록으로 교체 — 이미 넘겨준 목록은 그대로
+        pos = bisect.bisect_left(drivers, row_id, key=self._driver_id)
+        if old is not None:
+            self._unindex_driver(old)
+            drivers[pos] = row
+        else:
+            drivers.insert(pos, row)
+        self.drivers = drivers
+        self._index_driver(row)
+        if old is not None:
+            self._reindex_c_num(self._driver_key(old)[1])
+        self._reindex_c_num(self._driver_key(row)[1])
+
+    def drop_driver(self, row_id):
+        """기사 행(id = drivers.rowid) 제거"""
+        old = self._driver_by_id.get(int(row_id))
+        if old is None:
+            return
+        self._unindex_driver(old)
+        self.drivers = [d for d in self.drivers if d is not old]
+        self._reindex_c_num(self._driver_key(old)[1])
+
+    def put_clients(self, name, rows):
+        """업체명이 name인 업체 행들을 rows [(rowid, 행), ...]로 교체 (rowid 순 위치에 배치)"""
+        name = str(name or '').strip()
+        old = self._clients_by_name.pop(name, [])
+        old_ids = {id(c) for c in old}
+        # 새 목록으로 교체 — 이미 넘겨준 목록은 그대로
+        kept = [(rid, c) for rid, c in zip(self.client_rowids, self.clients) if id(c) not in old_ids]
+        client_rowids = [rid for rid, _ in kept]
+        clients = [c for _, c in kept]
+        new_rows = []
+        for rid, row in sorted(rows, key=lambda x: x[0]):
+            if self._client_key(row) != name:
+                continue
+            pos = bisect.bisect_left(client_rowids, rid)
+            client_rowids.insert(pos, rid)
+            clients.insert(pos, row)
+            new_rows.append(row)
+        self.client_rowids, self.clients = client_rowids, clients
+        if new_rows and name:
+            self._clients_by_name[name] = new_rows
+
+    def driver(self, d_name, c_num):
+        """기사명·차량번호가 모두 일치하는 기사 행 (없으면 None)"""
+        lst = self._drivers_by_key.get((str(d_name or '').strip(), str(c_num or '').strip()))
+        return lst[0] if lst else None
+
+    def driver_fixed_type(self, d_name, c_num):
+        """기사명·차량번호에 해당하는 기사의 개인/고정 값을 반환 (기사관리와 연동, 없으면 None)"""
+        d = self.driver(d_name, c_num)
+        return str(d.get('개인/고정', '')).strip() if d is not None else None
+
+    def c_num_type(self, c_num):
+        """차량번호 → 기사관리 개인/고정 값 (없으면 None)"""
+        lst = self._drivers_by_c_num.get(str(c_num or '').strip())
+        return str(lst[0].get('개인/고정', '')).strip() if lst else None
+
+    def client(self, name):
+        """업체명이 일치하는 업체 행 (없으면 None)"""
+        lst = self._clients_by_name.get(str(name or '').strip())
+        return lst[0] if lst else None
+
+    def c_nums_of_type(self, d_type):
+        """개인/고정 값이 d_type인 기사들의 차량번호 frozenset (빈 차량번호 제외, 이후 기사 변경에도 바뀌지 않는 스냅샷)"""
+        return self._c_nums_by_type.get(d_type, frozenset())
+
+    @property
+    def fixed_c_nums(self):
+        return self.c_nums_of_type('고정')
+
+    @property
+    def hyup_c_nums(self):
+        return self.c_nums_of_type('협력사')
+
+    @property
+    def gae_c_nums(self):
+        return self.c_nums_of_type('개별')
+
+
+mem_dir = MemDirectory()
+
+
+def _dir_gen(conn):
+    """기사·업체(drivers/clients) 변경 세대번호 (app_meta.dir_gen)"""
+    row = conn.execute("SELECT value FROM app_meta WHERE key = 'dir_gen'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def _ledger_gen(conn):
+    """장부(ledger) 변경 세대번호 (app_meta.ledger_gen — ledger 쓰기마다 트리거가 +1)"""
+    row = conn.execute("SELECT value FROM app_meta WHERE key = 'ledger_gen'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def _dir_gen_bump(conn):
+    """기사·업체 변경 세대번호 +1 — drivers/clients 쓰기와 같은 트랜잭션에서 호출, 새 세대번호 반환"""
+    conn.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'dir_gen'")
+    return _dir_gen(conn)
+
+
+def _dir_write(cursor, table, where, values, insert_extra=None):
+    """기사·업체 행 조건부 기록: where({컬럼: 값})에 맞는 행 중 values({컬럼: 값})와 다른 행만 UPDATE,
+    맞는 행이 없으면 where·values·insert_extra로 INSERT (insert_extra=None이면 INSERT 안 함).
+    반환: 실제로 추가·변경된 행이 있으면 True — 이때만 dir_gen을 올린다 (같은 값 저장은 다른 워커 재로드 없음)."""
+    where_sql = ' AND '.join(f'[{k}] = ?' for k in where)
+    cursor.execute(f"UPDATE {table} SET {', '.join(f'[{k}] = ?' for k in values)} WHERE {where_sql} "
+                   f"AND ({' OR '.join(f'[{k}] IS NOT ?' for k in values)})",
+                   list(values.values()) + list(where.values()) + list(values.values()))
+    if cursor.rowcount > 0:
+        return True
+    if insert_extra is None:
+        return False
+    cursor.execute(f"SELECT 1 FROM {table} WHERE {where_sql} LIMIT 1", list(where.values()))
+    if cursor.fetchone():
+        return False
+    row = dict(insert_extra, **where, **values)
+    cursor.execute(f"INSERT INTO {table} ({', '.join(f'[{k}]' for k in row)}) VALUES ({', '.join('?' * len(row))})",
+                   list(row.values()))
+    return True
+
+
+def _dir_rows(cursor):
+    """drivers/clients 조회 결과를 메모리 디렉터리 행(dict, NULL → '')으로 변환 (load_db_to_mem과 동일 형태)"""
+    cols = [c[0] for c in cursor.description]
+    return [{k: ('' if v is None else v) for k, v in zip(cols, r)} for r in cursor.fetchall()]
 
-    conn.commit()
-    conn.close()
 
-init_db()
-drivers_db = []; clients_db = []
+def _mem_dir_apply(conn, gen, driver_keys=(), driver_ids=(), client_names=()):
+    """drivers/clients 변경 commit 후 호출: 바뀐 행만 DB에서 다시 읽어 메모리 디렉터리에 반영.
+    driver_keys = (기사명, 차량번호) 목록, driver_ids = drivers.rowid 목록, client_names = 업체명 목록.
+    메모리가 직전 세대(gen - 1)가 아니면 중간 변경을 놓친 것이므로 전체 다시 읽기."""
+    if mem_dir.version != gen - 1:
+        load_db_to_mem()
+        return
+    try:
+        for d_name, c_num in driver_keys:
+            cur = conn.execute("SELECT rowid as id, * FROM drivers WHERE 기사명 = ? AND 차량번호 = ?", (d_name, c_num))
+            for row in _dir_rows(cur):
+                mem_dir.put_driver(row)
+        for row_id in driver_ids:
+            rows = _dir_rows(conn.execute("SELECT rowid as id, * FROM drivers WHERE rowid = ?", (row_id,)))
+            if rows:
+                mem_dir.put_driver(rows[0])
+            else:
+                mem_dir.drop_driver(row_id)
+        for name in client_names:
+            name = str(name or '').strip()
+            if name:
+                rows = _dir_rows(conn.execute("SELECT rowid AS __rowid, * FROM clients WHERE trim(업체명) = ?", (name,)))
+                mem_dir.put_clients(name, [(r.pop('__rowid'), r) for r in rows])
+        mem_dir.version = gen
+    except Exception as e:
+        print(f"[mem_dir apply error] {e}")
+        load_db_to_mem()
 
-def load_db_to_mem():
-    global drivers_db, clients_db
-    init_db()  # DB 삭제 후 재생성 시 테이블이 있도록 보장
+
+def load_db_to_mem(ensure_schema=True):
+    """기사·업체 전체를 DB에서 다시 읽어 메모리 디렉터리 교체.
+    ensure_schema=False: 스키마 확인(init_db) 생략 — 다른 워커 변경 반영(_mem_dir_sync)용."""
+    global mem_dir
+    if ensure_schema:
+        init_db()  # DB 삭제 후 재생성 시 테이블이 있도록 보장
     try:
         conn = connect_ledger()
-        drivers_db = pd.read_sql("SELECT rowid as id, * FROM drivers", conn).fillna('').to_dict('records')
-        clients_db = pd.read_sql("SELECT * FROM clients", conn).fillna('').to_dict('records')
+        gen = _dir_gen(conn)
+        drivers = pd.read_sql("SELECT rowid as id, * FROM drivers ORDER BY rowid", conn).fillna('').to_dict('records')
+        clients_df = pd.read_sql("SELECT rowid AS __rowid, * FROM clients ORDER BY rowid", conn)
         conn.close()
+        client_rowids = [int(x) for x in clients_df.pop('__rowid').tolist()]
+        mem_dir = MemDirectory(drivers, clients_df.fillna('').to_dict('records'), gen, client_rowids)
     except Exception:
-        drivers_db = []
-        clients_db = []
+        mem_dir = MemDirectory()
 
-load_db_to_mem()
 
-def get_driver_fixed_type(drivers_list, d_name, c_num):
-    """기사명·차량번호에 해당하는 기사의 개인/고정 값을 반환 (기사관리와 연동)"""
-    d_name_s = str(d_name or '').strip()
-    c_num_s = str(c_num or '').strip()
-    for d in drivers_list:
-        if str(d.get('기사명', '')).strip() == d_name_s and str(d.get('차량번호', '')).strip() == c_num_s:
-            return str(d.get('개인/고정', '')).strip()
-    return None
+def _mem_dir_sync():
+    """메모리 디렉터리가 DB의 최신 세대인지 확인(쿼리 1회)하고 다르면 전체 다시 읽기."""
+    try:
+        conn = connect_ledger()
+        try:
+            gen = _dir_gen(conn)
+        finally:
+            conn.close()
+    except Exception:
+        gen = None  # DB 삭제 후 재생성 등 — 테이블 없으면 전체 다시 읽기(init_db 포함)
+    if gen is None:
+        load_db_to_mem()
+    elif gen != mem_dir.version:
+        load_db_to_mem(ensure_schema=False)
+
+
+# gunicorn 다중 워커: 기사·업체 메모리는 워커(프로세스)마다 따로 있으므로 요청마다 DB 세대번호(app_meta.dir_gen)를 확인해
+# 다른 워커가 바꾼 경우에만 다시 읽는다. 정적 파일·헬스체크는 제외.
+_MEM_DIR_SYNC_SKIP_PREFIXES = ('/static/', '/evidences/', '/health')
+
+
+@app.before_request
+def _mem_dir_sync_before_request():
+    if request.path.startswith(_MEM_DIR_SYNC_SKIP_PREFIXES):
+        return
+    _mem_dir_sync()
+
+
+@app.before_request
+def _scheduler_before_request():
+    _scheduler_start()
+
+load_db_to_mem()
 
 BASE_HTML = """
 <!DOCTYPE html>
@@ -1378,6 +2997,7 @@ BASE_HTML = """
 
   <script>
     window.APP_READ_ONLY = {{ 'true' if session_role == 'view' else 'false' }};
+    window.EXPORT_JOB_PATHS = {{ export_job_paths | tojson }};
     let drivers = {{ drivers_json | safe }};
     let clients = {{ clients_json | safe }};
     let columnKeys = {{ col_keys | safe }};
@@ -1397,6 +3017,72 @@ BASE_HTML = """
             document.getElementById('imgModal').style.display = 'block';
         }
     };
+
+    // 엑셀 내보내기: 서버 백그라운드 작업으로 생성 → 진행률 표시 후 다운로드 (실패 시 기존 직접 다운로드)
+    window.startExportJob = function(url) {
+        var box = document.getElementById('exportJobBox');
+        if (!box) {
+            box = document.createElement('div');
+            box.id = 'exportJobBox';
+            box.style.cssText = 'position:fixed; right:16px; bottom:16px; z-index:9999; background:#1a2a6c; color:#fff; padding:10px 14px; border-radius:6px; box-shadow:0 2px 8px rgba(0,0,0,0.3); font-size:12px;';
+            document.body.appendChild(box);
+        }
+        box.style.display = 'block';
+        box.textContent = '엑셀 생성 요청 중...';
+        function done(msg) { box.textContent = msg; setTimeout(function(){ box.style.display = 'none'; }, 3000); }
+        function fallback() { box.style.display = 'none'; window.location.href = url; }
+        fetch('/api/export_jobs', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ url: url }) })
+            .then(function(r){ return r.json(); })
+            .then(function(res){
+                if (!res || res.status !== 'success') { fallback(); return; }
+                var poll = function() {
+                    fetch('/api/export_jobs/' + res.job_id).then(function(r){ return r.json(); }).then(function(st){
+                        if (!st || st.status !== 'success') { done('엑셀 작업을 찾을 수 없습니다.'); return; }
+                        if (st.state === 'done') { done('엑셀 다운로드 시작'); window.location.href = st.download_url; return; }
+                        if (st.state === 'error') { done('엑셀 생성 실패: ' + (st.error || '')); return; }
+                        var n = st.rows_written || st.rows_scanned || 0;
+                        box.textContent = '엑셀 생성 중...' + (n ? ' ' + n.toLocaleString() + '행' : '');
+                        setTimeout(poll, 1000);
+                    }).catch(function(){ setTimeout(poll, 2000); });
+                };
+                poll();
+            })
+            .catch(fallback);
+    };
+    // 통합장부 엑셀 업로드: 먼저 dry_run으로 변경 내역을 보여주고 확인 시 반영 (바뀐 컬럼만 저장)
+    window.ledgerUploadWithPreview = function(formId, onDone) {
+        var form = document.getElementById(formId);
+        if (!form) return;
+        var fd = new FormData(form);
+        fd.append('dry_run', '1');
+        fetch('/api/ledger_upload', { method: 'POST', body: fd }).then(function(r){ return r.json(); }).then(function(pv){
+            if (!pv || pv.status !== 'success') { alert((pv && pv.message) || '업로드 실패'); return; }
+            if (!pv.insert && !pv.update) { alert('변경 내용이 없습니다. (변경 없음 ' + pv.unchanged + '건)'); return; }
+            var lines = ['신규 ' + pv.insert + '건, 수정 ' + pv.update + '건, 변경 없음 ' + pv.unchanged + '건'];
+            if (pv.columns && pv.columns.length) {
+                lines.push('', '[바뀌는 항목]');
+                pv.columns.slice(0, 15).forEach(function(c){ lines.push(' - ' + c.name + ': ' + c.count + '건'); });
+                if (pv.columns.length > 15) lines.push(' - 외 ' + (pv.columns.length - 15) + '개 항목');
+            }
+            if (pv.samples && pv.samples.length) {
+                lines.push('', '[예시]');
+                pv.samples.slice(0, 10).forEach(function(d){ lines.push(' #' + d.id + ' ' + d.name + ': "' + d.old + '" → "' + d.new + '"'); });
+            }
+            lines.push('', '반영할까요?');
+            if (!confirm(lines.join('\\n'))) return;
+            fetch('/api/ledger_upload', { method: 'POST', body: new FormData(form) }).then(function(r){ return r.json(); }).then(function(res){
+                if (res.status === 'success') { alert(res.message || '반영 완료'); if (onDone) onDone(res); }
+                else alert(res.message || '업로드 실패');
+            }).catch(function(){ alert('업로드 중 오류'); });
+        }).catch(function(){ alert('업로드 중 오류'); });
+    };
+    document.addEventListener('click', function(e) {
+        if (e.defaultPrevented || e.button !== 0 || e.ctrlKey || e.metaKey || e.shiftKey) return;
+        var a = e.target.closest ? e.target.closest('a[href]') : null;
+        if (!a || a.origin !== location.origin || (window.EXPORT_JOB_PATHS || []).indexOf(a.pathname) < 0) return;
+        e.preventDefault();
+        window.startExportJob(a.pathname + a.search);
+    });
     {% endraw %}
 
     function todayKST() { return new Date().toLocaleDateString('sv-SE', { timeZone: 'Asia/Seoul' }); }
@@ -1813,6 +3499,9 @@ function loadLedgerList() {
     const filterTaxDriver = (document.getElementById('filterTaxDriver') && document.getElementById('filterTaxDriver').value) || '';
     var hasFilter = filterPayClient || filterPayDriver || filterTaxClient || filterTaxDriver;
     var pageToUse = hasFilter ? 1 : (urlParams.get('page') || 1);
+    // 이전/다음(‹ ›) 페이지 이동은 cursor로 조회 (서버가 조회 조건이 바뀐 cursor는 무시하고 page 기준으로 조회)
+    var cursor = hasFilter ? '' : (urlParams.get('cursor') || '');
+    var cursorDir = urlParams.get('dir') === 'prev' ? 'prev' : 'next';
     var perPageEl = document.getElementById('ledgerPerPage');
     var perPage = (perPageEl && [20,50,100].indexOf(parseInt(perPageEl.value,10)) >= 0) ? perPageEl.value : '20';
     let url = `/api/get_ledger?page=${pageToUse}&per_page=${perPage}&start=${encodeURIComponent(start)}&end=${encodeURIComponent(end)}`;
@@ -1828,8 +3517,10 @@ function loadLedgerList() {
     if(qClient) url += '&q_client=' + encodeURIComponent(qClient);
     if(qInName) url += '&q_in_name=' + encodeURIComponent(qInName);
     if(qPhone) url += '&q_phone=' + encodeURIComponent(qPhone);
+    if(cursor) url += '&cursor=' + encodeURIComponent(cursor) + '&dir=' + cursorDir + '&count=approx';
     var urlParamsToSet = new URLSearchParams(window.location.search);
     urlParamsToSet.set('page', pageToUse); urlParamsToSet.set('per_page', perPage);
+    if (!cursor) { urlParamsToSet.delete('cursor'); urlParamsToSet.delete('dir'); }
     if (start) urlParamsToSet.set('start', start); else urlParamsToSet.delete('start');
     if (end) urlParamsToSet.set('end', end); else urlParamsToSet.delete('end');
     if (orderStart) urlParamsToSet.set('order_start', orderStart); else urlParamsToSet.delete('order_start');
@@ -1846,7 +3537,7 @@ function loadLedgerList() {
             lastLedgerData = res.data;
             // 통합장부 정렬: 서버에서 배차일(dispatch_dt) 기준 가까운(최신) 날짜가 위로 오는 순서로 반환하므로 그대로 사용
             renderTableRows(lastLedgerData);
-            if (typeof renderPagination === 'function') renderPagination(res.total_pages, res.current_page, 'ledger');
+            if (typeof renderPagination === 'function') renderPagination(res.total_pages, res.current_page, 'ledger', {prev: res.prev_cursor, next: res.next_cursor});
             if (typeof window.updateLedgerScrollBarWidth === 'function') requestAnimationFrame(function() { window.updateLedgerScrollBarWidth(); });
             requestAnimationFrame(function() { if (typeof restoreLedgerScroll === 'function') restoreLedgerScroll(); });
         });
@@ -2045,7 +3736,7 @@ function loadLedgerList() {
     `).join('');
     initDraggable();
 }
-        function renderPagination(totalPages, currentPage, type) {
+        function renderPagination(totalPages, currentPage, type, cursors) {
             const container = document.getElementById(type + 'Pagination');
             if (!container) return;
             const blockSize = 10;
@@ -2069,6 +3760,14 @@ function loadLedgerList() {
                 if (os) urlParams.set('order_start', os); else urlParams.delete('order_start');
                 if (oe) urlParams.set('order_end', oe); else urlParams.delete('order_end');
             }
+            urlParams.delete('cursor'); urlParams.delete('dir');
+            // ‹ › : 서버가 준 cursor로 바로 앞/뒤 페이지 (OFFSET 없이 인덱스 탐색)
+            function cursorLink(cursor, dir, pageNum, label) {
+                var p = new URLSearchParams(urlParams);
+                p.set('page', pageNum); p.set('cursor', cursor); p.set('dir', dir);
+                return `<a href="?${p.toString()}" class="page-btn" title="${dir === 'prev' ? '이전 페이지' : '다음 페이지'}">${label}</a>`;
+            }
+            if (cursors && cursors.prev && currentPage > 1) html += cursorLink(cursors.prev, 'prev', currentPage - 1, '‹');
             if (block > 0) {
                 urlParams.set('page', (block - 1) * blockSize + 1);
                 html += `<a href="?${urlParams.toString()}" class="page-btn">이전</a>`;
@@ -2082,6 +3781,7 @@ function loadLedgerList() {
                 urlParams.set('page', end + 1);
                 html += `<a href="?${urlParams.toString()}" class="page-btn">다음</a>`;
             }
+            if (cursors && cursors.next) html += cursorLink(cursors.next, 'next', currentPage + 1, '›');
             container.innerHTML = html;
         }
 
@@ -2690,12 +4390,12 @@ def index():
         <input type="text" id="ledgerSearchInName" placeholder="입금자명" style="width:90px; padding:8px 10px; border:1px solid #1a2a6c; border-radius:6px; font-size:12px;" onkeyup="filterLedger()" onkeydown="if(event.key==='Enter'){{ event.preventDefault(); loadLedgerList(); }}">
         <input type="text" id="ledgerSearchPhone" placeholder="전화번호" style="width:100px; padding:8px 10px; border:1px solid #1a2a6c; border-radius:6px; font-size:12px;" onkeyup="filterLedger()" onkeydown="if(event.key==='Enter'){{ event.preventDefault(); loadLedgerList(); }}">
         <a href="/settlement" style="color:#1a2a6c; font-weight:600; text-decoration:none; white-space:nowrap;">정산관리 바로가기 →</a>
-        <button type="button" class="btn-edit" onclick="var s=document.getElementById('startDate').value; var e=document.getElementById('endDate').value; var os=document.getElementById('orderStartDate')?document.getElementById('orderStartDate').value:''; var oe=document.getElementById('orderEndDate')?document.getElementById('orderEndDate').value:''; var c=document.getElementById('filterMonthEndClient').checked?'1':''; var d=document.getElementById('filterMonthEndDriver').checked?'1':''; var u='/api/ledger_excel?start='+encodeURIComponent(s)+'&end='+encodeURIComponent(e); if(os&&oe) u+='&order_start='+encodeURIComponent(os)+'&order_end='+encodeURIComponent(oe); u+='&month_end_client='+c+'&month_end_driver='+d; window.location.href=u;">엑셀 다운로드</button>
+        <button type="button" class="btn-edit" onclick="var s=document.getElementById('startDate').value; var e=document.getElementById('endDate').value; var os=document.getElementById('orderStartDate')?document.getElementById('orderStartDate').value:''; var oe=document.getElementById('orderEndDate')?document.getElementById('orderEndDate').value:''; var c=document.getElementById('filterMonthEndClient').checked?'1':''; var d=document.getElementById('filterMonthEndDriver').checked?'1':''; var u='/api/ledger_excel?start='+encodeURIComponent(s)+'&end='+encodeURIComponent(e); if(os&&oe) u+='&order_start='+encodeURIComponent(os)+'&order_end='+encodeURIComponent(oe); u+='&month_end_client='+c+'&month_end_driver='+d; if(window.startExportJob) window.startExportJob(u); else window.location.href=u;">엑셀 다운로드</button>
         <a href="/api/ledger_excel" class="btn-status bg-green" style="text-decoration:none; padding:6px 12px; border-radius:4px;">전체 목록 다운로드</a>
         <a href="/api/ledger_excel_template" class="btn-status" style="text-decoration:none; padding:6px 12px; border-radius:4px; background:#e2e8f0; color:#334155;">엑셀 양식 다운로드</a>
         <form id="ledgerUploadForm" style="display:inline;" enctype="multipart/form-data">
             <input type="file" name="file" accept=".xlsx,.xls" style="font-size:12px;">
-            <button type="button" class="btn-save" onclick="var f=document.getElementById('ledgerUploadForm'); var fd=new FormData(f); fetch('/api/ledger_upload', {{method:'POST', body:fd}}).then(r=>r.json()).then(res=>{{if(res.status==='success'){{alert(res.message||'반영 완료'); loadLedgerList(); if(confirm('통계 페이지에서 확인할까요?')) location.href='/statistics';}}else alert(res.message||'업로드 실패');}}).catch(()=>alert('업로드 중 오류'));">엑셀 업로드</button>
+            <button type="button" class="btn-save" onclick="ledgerUploadWithPreview('ledgerUploadForm', function(){{ loadLedgerList(); if(confirm('통계 페이지에서 확인할까요?')) location.href='/statistics'; }});">엑셀 업로드</button>
         </form>
         <button type="button" class="btn-status" style="background:#c53030; color:white; border:none; padding:6px 12px; border-radius:4px; cursor:pointer; font-weight:600;" onclick="if(confirm('장부 내역을 전체 삭제합니다. 복구할 수 없습니다. 정말 진행할까요?')) fetch('/api/ledger_delete_all', {{method:'POST'}}).then(r=>r.json()).then(res=>{{if(res.status==='success'){{alert(res.message); if(typeof loadLedgerList==='function') loadLedgerList();}}else alert(res.message||'삭제 실패');}}).catch(()=>alert('삭제 중 오류'));" title="ledger 테이블 전체 삭제">엑셀 장부전체삭제</button>
         <a href="/api/download-db" class="btn-status bg-orange" style="text-decoration:none; padding:6px 12px; border-radius:4px;" title="배포 전 서버 DB 백업">📥 서버 DB 백업</a>
@@ -2752,6 +4452,178 @@ def index():
     </div>
     """
     return render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps([]), clients_json=json.dumps([]), col_keys=col_keys_json, col_keys_driver=col_keys_driver_json, col_keys_client=col_keys_client_json, col_keys_hidden=col_keys_hidden_json)
+# 정산관리 총합계 항목 (행별 값·합계 순서). 납부부가세·수익은 합계에서 계산
+SETTLEMENT_SUM_KEYS = ('pre_post', 'sugum', 'supply', 'fee_out', 'vat1', 'vat2', 'total1', 'total2')
+
+
+def _settlement_row_sums(r):
+    """정산 총합계에 더할 1행 값 (SETTLEMENT_SUM_KEYS 순서)"""
+    supply_val = int(calc_supply_value(r))
+    pre_i = int(float(r.get('pre_post') or 0))
+    sugum = supply_val - pre_i  # 수금운임 = 공급가액 − 선착불 (수수료+업체운임)
+    is_cc = (str(r.get('pay_method_client') or '').strip() == '현금')
+    is_cd = (str(r.get('pay_method_driver') or '').strip() == '현금')
+    _tbs = (str(r.get('tax_biz') or '')).strip()
+    is_cash_confirm = '현금' in _tbs
+    v1 = 0 if is_cc else int(round(supply_val * 0.1))
+    t1 = supply_val + v1
+    fo = int(float(r.get('fee_out') or 0))
+    v2 = 0 if (is_cd or is_cash_confirm) else int(round(fo * 0.1))
+    t2 = fo + v2
+    return (pre_i, sugum, supply_val, fo, v1, v2, t1, t2)
+
+
+@_perf_phase('aggregate')
+def _settlement_sums(rows):
+    """정산 총합계(SETTLEMENT_SUM_KEYS 순서) — 행별 _settlement_row_sums 합과 같은 값을 금액 배열(_ledger_totals_columns)로 한 번에 계산"""
+    t = {c: int(v) for c, v in _ledger_totals_columns(rows).sum().items()}
+    return [t['pre_post'], t['supply'] - t['pre_post'], t['supply'], t['fee_out'], t['vat1'], t['vat2'], t['total1'], t['total2']]
+
+
+def _settlement_totals_html(sum_count, sums):
+    """정산관리 '현재 검색 결과 총합계' 블록. data-sums(건수+합계)로 행 단위 갱신 시 가감 기준을 전달"""
+    sum_pre_post, sum_sugum, sum_supply, sum_fee_out, sum_vat1, sum_vat2, sum_total1, sum_total2 = sums
+    sum_vat_profit = sum_vat1 - sum_vat2
+    sum_profit = sum_sugum - sum_fee_out  # 수익 = 수금운임(=공급가-선착불) − 지급운임(지급운임)
+    _st_th = 'padding:10px 12px; text-align:right; font-weight:600; color:#334155; background:#f1f5f9; border:1px solid #cbd5e1; white-space:nowrap; font-variant-numeric:tabular-nums;'
+    _st_td = 'padding:10px 12px; text-align:right; border:1px solid #e2e8f0; color:#475569; font-variant-numeric:tabular-nums;'
+    return f'''<div class="settlement-totals" data-sums="{','.join(str(v) for v in [sum_count] + list(sums))}" style="margin:12px 0; padding:14px 20px; background:#f0f3f7; border:1px solid #d0d7de; border-radius:8px; font-size:13px;">
+        <div style="margin-bottom:10px;"><strong style="color:#1a2a6c;">📊 현재 검색 결과 총합계</strong> <span style="color:#666;">(총 {sum_count:,}건)</span></div>
+        <div style="overflow-x:auto;">
+        <table style="width:100%; min-width:900px; margin:0; font-size:13px; border-collapse:collapse;"><thead><tr>
+            <th style="{_st_th}">선착불</th><th style="{_st_th}">수금운임</th><th style="{_st_th}">공급가액</th><th style="{_st_th}">매출부가세</th><th style="{_st_th}">매출합계</th>
+            <th style="{_st_th}">지급운임</th><th style="{_st_th}">매입 부가세</th><th style="{_st_th}">지출 합계</th><th style="{_st_th}">수익</th><th style="{_st_th}">납부부가세</th>
+        </tr></thead><tbody><tr>
+            <td style="{_st_td} font-weight:bold;">{sum_pre_post:,}</td>
+            <td style="{_st_td} font-weight:bold;">{sum_sugum:,}</td>
+            <td style="{_st_td} font-weight:bold;">{sum_supply:,}</td>
+            <td style="{_st_td} font-weight:bold;">{sum_vat1:,}</td>
+            <td style="{_st_td} font-weight:bold;color:#1a2a6c;">{sum_total1:,}</td>
+            <td style="{_st_td} font-weight:bold;">{sum_fee_out:,}</td>
+            <td style="{_st_td} font-weight:bold;">{sum_vat2:,}</td>
+            <td style="{_st_td} font-weight:bold;color:#b71c1c;">{sum_total2:,}</td>
+            <td style="{_st_td} font-weight:bold;color:#1a2a6c;">{sum_profit:,}</td>
+            <td style="{_st_td} font-weight:bold;">{sum_vat_profit:,}</td>
+        </tr></tbody></table></div>
+    </div>'''
+
+
+def _settlement_row_html(row, today):
+    """정산관리 표 1행(<tr>) HTML. row: _settlement_filtered_rows_from_request 결과 행(m_st·p_st 포함)"""
+    # 계산서·인수증전송: 장부와 동일하게 날짜 유무로 버튼 눌림 상태 판단 (날짜 있음 → 녹색 적용, 없음 → 주황 미적용)
+    tax_dt_val = (row.get('tax_dt') or '').strip()[:10] if row.get('tax_dt') else ''
+    tax_chk_ok = bool(tax_dt_val) or _norm_tax_chk(row.get('tax_chk'))
+    tax_chk_toggle = "''" if tax_chk_ok else "'발행완료'"
+    mail_dt_val = (row.get('mail_dt') or '').strip()[:10] if row.get('mail_dt') else ''
+    mail_ok = bool(mail_dt_val) or _norm_mail_done(row.get('is_mail_done'))
+    # 인수증 확인 토글: mail_dt만 보지 않음(전송일 없이 is_mail_done만 확인완료인 경우 클릭 시 오늘 날짜가 들어가 미확인으로 못 돌아가던 문제 방지)
+    mail_dt_toggle = f"'{today.strftime('%Y-%m-%d')}'" if not mail_ok else "''"
+
+    in_dt_val = (row.get('in_dt') or '')[:10]
+    out_dt_val = (row.get('out_dt') or '')[:10]
+    in_dt_span = f'<span style="font-size:10px; color:#1976d2;">{in_dt_val}</span>' if in_dt_val else ''
+    tax_dt_span = f'<span style="font-size:10px; color:#1976d2;">{tax_dt_val}</span>' if tax_dt_val else ''
+    out_dt_span = f'<span style="font-size:10px; color:#1976d2;">{out_dt_val}</span>' if out_dt_val else ''
+    mail_dt_span = f'<span style="font-size:10px; color:#1976d2;">{mail_dt_val}</span>' if mail_dt_val else ''
+    tax_label = '계산서발급확인' if tax_chk_ok else '미발행'
+    misu_btn = f'<div style="display:flex; flex-direction:column; align-items:center; gap:2px;"><input type="date" value="{in_dt_val}" style="font-size:10px; width:95px; padding:2px;" onchange="changeStatus({row["id"]}, \'in_dt\', this.value)">{in_dt_span}<button type="button" class="btn-status {row["m_cl"]}" onclick="toggleSettlementIn({row["id"]})">{row["m_st"]}</button></div>'
+    tax_issued_btn = f'<button type="button" class="btn-status {"bg-green" if tax_chk_ok else "bg-orange"}" onclick="changeStatus({row["id"]}, \'tax_chk\', {tax_chk_toggle})">{tax_label}</button>'
+    tax_cell = f'<div style="display:flex; flex-direction:column; align-items:center; gap:2px;"><input type="date" value="{tax_dt_val}" style="font-size:10px; width:95px; padding:2px;" onchange="changeStatus({row["id"]}, \'tax_dt\', this.value)">{tax_dt_span}<div>{tax_issued_btn}</div></div>'
+    pay_btn = f'<div style="display:flex; flex-direction:column; align-items:center; gap:2px;"><input type="date" value="{out_dt_val}" style="font-size:10px; width:95px; padding:2px;" onchange="changeStatus({row["id"]}, \'out_dt\', this.value)">{out_dt_span}<button type="button" class="btn-status {row["p_cl"]}" onclick="toggleSettlementPay({row["id"]})">{row["p_st"]}</button></div>'
+    
+    mail_val = '확인완료' if mail_ok else '미확인'
+    mail_color = "bg-green" if mail_ok else "bg-orange"
+    mail_btn = f'<div style="display:flex; flex-direction:column; align-items:center; gap:2px;"><input type="date" value="{mail_dt_val}" style="font-size:10px; width:95px; padding:2px;" onchange="changeStatus({row["id"]}, \'mail_dt\', this.value)">{mail_dt_span}<button class="btn-status {mail_color}" onclick="changeStatus({row["id"]}, \'mail_dt\', {mail_dt_toggle})">{mail_val}</button></div>'
+
+    issue_dt_val = (row.get('issue_dt') or '').strip()[:10]
+    issue_dt_toggle = f"'{today.strftime('%Y-%m-%d')}'" if not issue_dt_val else "''"
+    issue_dt_span = f'<span style="font-size:10px; color:#1976d2;">{issue_dt_val}</span>' if issue_dt_val else ''
+    tax_biz2_val = (row.get('tax_biz2') or '').strip()
+    issue_confirmed = bool(issue_dt_val)
+    issue_btn = f'<div style="display:flex; flex-direction:column; align-items:center; gap:2px;"><input type="date" value="{issue_dt_val}" style="font-size:10px; width:95px; padding:2px;" onchange="changeStatus({row["id"]}, \'issue_dt\', this.value)">{issue_dt_span}<button class="btn-status {"bg-green" if issue_confirmed else "bg-orange"}" onclick="changeStatus({row["id"]}, \'issue_dt\', {issue_dt_toggle})">{"확인완료" if issue_confirmed else "미확인"}</button></div>'
+
+    me_c = (str(row.get('month_end_client') or '').strip() in ('1', 'Y'))
+    me_d = (str(row.get('month_end_driver') or '').strip() in ('1', 'Y'))
+    rid = row['id']
+    tax_biz2_cell = _settlement_tax_biz2_cell_html(rid, row.get('tax_biz2'))
+    pay_to_cell = _settlement_pay_to_cell_html(rid, row.get('pay_to'))
+    is_cash_c = (str(row.get('pay_method_client') or '').strip() == '현금')
+    is_cash_d = (str(row.get('pay_method_driver') or '').strip() == '현금')
+    # 매입처현금 탭 (기사): 표기 발행/현금확인, 백엔드 값은 이체/현금 유지. 기본=발행, 클릭 시 현금확인
+    pay_driver_tabs = f'<span class="settle-pay-tabs" style="display:inline-flex; margin-left:4px; border:1px solid #dee2e6; border-radius:4px; overflow:hidden; font-size:10px;"><span style="padding:2px 6px; cursor:pointer; { "background:#e67e22; color:white;" if is_cash_d else "background:#fff; color:#666;" }" onclick="changeStatus({rid}, \'pay_method_driver\', \'현금\')" title="클릭 시 현금확인">현금확인</span><span style="padding:2px 6px; cursor:pointer; { "background:#b71c1c; color:white;" if not is_cash_d else "background:#fff; color:#666;" }" onclick="changeStatus({rid}, \'pay_method_driver\', \'이체\')" title="기본 발행">발행</span></span>'
+    # 매출처현금 탭 (업체): 표기 현금확인/발행, 백엔드 값은 이체/현금 유지. 기본=발행, 클릭 시 현금확인
+    pay_client_tabs = f'<span class="settle-pay-tabs" style="display:inline-flex; margin-left:4px; border:1px solid #dee2e6; border-radius:4px; overflow:hidden; font-size:10px;"><span style="padding:2px 6px; cursor:pointer; { "background:#e67e22; color:white;" if is_cash_c else "background:#fff; color:#666;" }" onclick="changeStatus({rid}, \'pay_method_client\', \'현금\')" title="클릭 시 현금확인">현금확인</span><span style="padding:2px 6px; cursor:pointer; { "background:#1a2a6c; color:white;" if not is_cash_c else "background:#fff; color:#666;" }" onclick="changeStatus({rid}, \'pay_method_client\', \'이체\')" title="기본 발행">발행</span></span>'
+    month_end_client_cell = f'<input type="checkbox" {"checked" if me_c else ""} onchange="fetch(\'/api/update_status\', {{method:\'POST\', headers:{{\'Content-Type\':\'application/json\'}}, body: JSON.stringify({{id:{rid}, key:\'month_end_client\', value: this.checked ? \'1\' : \'\'}})}}).then(r=>r.json()).then(res=>{{if(res.status===\'success\') {{ if (typeof window.refreshSettlementTable===\'function\') window.refreshSettlementTable([{rid}]); }} else alert(res.message||\'반영 실패\');}});">'
+    month_end_driver_cell = f'<input type="checkbox" {"checked" if me_d else ""} onchange="fetch(\'/api/update_status\', {{method:\'POST\', headers:{{\'Content-Type\':\'application/json\'}}, body: JSON.stringify({{id:{rid}, key:\'month_end_driver\', value: this.checked ? \'1\' : \'\'}})}}).then(r=>r.json()).then(res=>{{if(res.status===\'success\') {{ if (typeof window.refreshSettlementTable===\'function\') window.refreshSettlementTable([{rid}]); }} else alert(res.message||\'반영 실패\');}});">'
+
+    def make_direct_links(ledger_id, img_type, raw_paths):
+        paths = [p.strip() for p in (raw_paths or "").split(',')] if raw_paths else []
+        # 미리보기: 업로드된 이미지 썸네일 (클릭 시 모달로 확대)
+        preview_html = ''
+        for p in paths:
+            if p.startswith('static/') or p.startswith('evidences/'):
+                path_js = p.replace('\\', '\\\\').replace("'", "\\'")
+                src = '/' + p if not p.startswith('/') else p
+                preview_html += f'<img src="{src}" style="width:28px;height:28px;object-fit:cover;cursor:pointer;border:1px solid #ccc;border-radius:4px;" onclick="event.stopPropagation(); viewImg(\'{path_js}\')" title="클릭 시 크게 보기" alt="">'
+        if preview_html:
+            preview_html = f'<div style="display:flex; flex-wrap:wrap; gap:2px; justify-content:center; margin-bottom:4px;">{preview_html}</div>'
+        links_html = '<div style="display:flex; flex-direction:column; align-items:center;">' + preview_html + '<div style="display:flex; gap:3px; justify-content:center;">'
+        for i in range(1, 6):
+            has_file = len(paths) >= i and (paths[i-1].startswith('static/') or paths[i-1].startswith('evidences/'))
+            css_class = "link-btn has-file" if has_file else "link-btn"
+            links_html += f'<a href="/upload_evidence/{ledger_id}?type={img_type}&seq={i}" target="_blank" class="{css_class}">{i}</a>'
+        links_html += '</div></div>'
+        return links_html
+
+    # 통합장부(ledger)와 동일 계산식:
+    # 공급가액 = 수금운임(fee) + 수수료(comm) + 선착불(pre_post)
+    # 매출 부가세/합계 = 공급가액 기준(업체현금이면 0)
+    supply_val, vat1, total1, _fee_out_ign, _vat2_ign, _total2_ign = calc_totals_with_vat(row)
+    fee_raw = row.get('fee')
+    pre_post_raw = row.get('pre_post')
+    try:
+        fee_val = int(float(fee_raw)) if fee_raw not in (None, '', 'None') else 0
+    except Exception:
+        fee_val = 0
+    try:
+        pre_post_val = int(float(pre_post_raw)) if pre_post_raw not in (None, '', 'None') else 0
+    except Exception:
+        pre_post_val = 0
+    pre_post_chk_raw = row.get('pre_post_chk')
+    pre_post_chk_checked = str(pre_post_chk_raw or '').strip() in ('1', 'Y', '✅')
+    pre_post_chk_cell = f'<input type="checkbox" {"checked" if pre_post_chk_checked else ""} onchange="fetch(\'/api/update_status\', {{method:\'POST\', headers:{{\'Content-Type\':\'application/json\'}}, body: JSON.stringify({{id:{rid}, key:\'pre_post_chk\', value: this.checked ? \'1\' : \'\'}})}}).then(r=>r.json()).then(res=>{{if(res.status===\'success\') {{ if (typeof window.refreshSettlementTable===\'function\') window.refreshSettlementTable([{rid}]); }} else alert(res.message||\'반영 실패\');}});">'
+    supply_val_disp = f"{int(supply_val):,}" if supply_val is not None else ""
+    is_cash_client = (str(row.get('pay_method_client') or '').strip() == '현금')
+    is_cash_driver = (str(row.get('pay_method_driver') or '').strip() == '현금')
+    _tax_biz_s_for_cash = (str(row.get('tax_biz') or '')).strip()
+    is_cash_confirm = '현금' in _tax_biz_s_for_cash
+    pay_to_s = (str(row.get('pay_to') or '')).strip()
+    # 기존 렌더링 코드가 _tax_biz_s 이름을 참조하므로, 표시값은 pay_to_s로 유지
+    _tax_biz_s = pay_to_s
+    # vat1/total1 는 위 calc_totals_with_vat 결과 사용
+    fee_out_val = int(float(row.get('fee_out') or 0))
+    vat2 = 0 if (is_cash_driver or is_cash_confirm) else int(round(fee_out_val * 0.1))
+    total2 = fee_out_val + vat2
+    order_no = "n" + str(row['id']).zfill(2)
+    _esc_attr = lambda x: (str(x) or '').replace('"', '&quot;')[:200]
+    has_tax = '1' if any(p.strip().startswith(('static/', 'evidences/')) for p in (row.get('tax_img') or '').split(',')) else '0'
+    has_ship = '1' if any(p.strip().startswith(('static/', 'evidences/')) for p in (row.get('ship_img') or '').split(',')) else '0'
+    me_c = '1' if (str(row.get('month_end_client') or '').strip() in ('1', 'Y')) else '0'
+    me_d = '1' if (str(row.get('month_end_driver') or '').strip() in ('1', 'Y')) else '0'
+    _tax_chk_val = '발행완료' if tax_chk_ok else ''
+    _mail_val = '확인완료' if mail_ok else '미확인'
+    _dispatch_dt = (row.get('dispatch_dt') or '')[:10] if row.get('dispatch_dt') else ''
+    return f"""<tr class="data-row" data-id="{row['id']}" data-sums="{','.join(str(v) for v in _settlement_row_sums(row))}" data-order-no="{order_no}" data-client-name="{_esc_attr(row.get('client_name'))}" data-c-mgr-name="{_esc_attr(row.get('c_mgr_name'))}" data-tax-chk="{_esc_attr(_tax_chk_val)}" data-tax-dt="{_esc_attr(tax_dt_val)}" data-order-dt="{row.get('order_dt') or ''}" data-dispatch-dt="{_dispatch_dt}" data-route="{_esc_attr(row.get('route'))}" data-d-name="{_esc_attr(row.get('d_name'))}" data-c-num="{_esc_attr(row.get('c_num'))}" data-supply="{fee_val}" data-vat1="{vat1}" data-total1="{total1}" data-m-st="{row['m_st']}" data-fee-out="{fee_out_val}" data-vat2="{vat2}" data-total2="{total2}" data-p-st="{row['p_st']}" data-mail="{_esc_attr(_mail_val)}" data-issue-dt="{row.get('issue_dt') or ''}" data-tax-biz-name="{_esc_attr(row.get('tax_biz_name'))}" data-tax-biz2="{_esc_attr(tax_biz2_val)}" data-tax-biz="{_esc_attr(pay_to_s)}" data-has-tax="{has_tax}" data-has-ship="{has_ship}" data-me-c="{me_c}" data-me-d="{me_d}">
+        <td style="white-space:nowrap;">
+            <input type="checkbox" class="settle-sel" value="{row['id']}" title="일괄 변경 선택" style="vertical-align:middle; margin:0 4px 0 0;">
+            <span class="order-no" style="display:inline-block; font-weight:700; color:#1a2a6c; margin-right:8px; font-size:12px;" title="고유오더번호">{order_no}</span>
+            <button class="btn-log" onclick="viewOrderLog({row['id']})" style="background:#6c757d; color:white; border:none; padding:2px 5px; cursor:pointer; font-size:11px; border-radius:3px;">로그</button><br>
+            <button type="button" class="btn-status" style="font-size:10px; padding:2px 6px; margin-top:2px; background:#e3f2fd; color:#1a2a6c;" onclick="viewSettlementClientInfo({row['id']})" title="매출처(업체) 정보">매출처</button>
+            <button type="button" class="btn-status" style="font-size:10px; padding:2px 6px; margin-left:2px; margin-top:2px; background:#ffebee; color:#b71c1c;" onclick="viewSettlementVendorInfo({row['id']})" title="매입처(기사) 정보">매입처</button>
+        </td>
+        <td>{row['order_dt']}</td><td>{_dispatch_dt}</td><td>{row['route']}</td><td>{row['d_name']}</td><td>{row['c_num']}</td><td style="text-align:center;">{month_end_driver_cell}</td><td>{fee_out_val:,}</td><td>{vat2:,}</td><td>{total2:,}</td><td>{pay_btn}</td><td>{make_direct_links(row['id'], 'tax', row['tax_img'])}</td><td>{row.get('tax_biz_name') or ''}</td><td style="text-align:center;">{pay_driver_tabs}</td><td>{issue_btn}</td><td>{tax_biz2_cell}</td><td style="text-align:center;">{pre_post_chk_cell}</td><td>{(f"{pre_post_val:,}" if pre_post_val else "")}</td><td>{fee_val:,}</td><td>{supply_val_disp}</td><td>{vat1:,}</td><td>{total1:,}</td><td>{misu_btn}</td><td style="text-align:center;">{pay_client_tabs}</td><td style="text-align:center;">{month_end_client_cell}</td><td>{row.get('c_mgr_name') or ''}</td><td>{row['client_name']}</td><td>{tax_cell}</td><td>{pay_to_cell}</td><td>{mail_btn}</td><td>{make_direct_links(row['id'], 'ship', row['ship_img'])}</td></tr>"""
+
+
 @app.route('/settlement')
 @login_required 
 def settlement():
@@ -2798,14 +4670,15 @@ def settlement():
     q_out_dt_start = _arg_str('out_dt_start')
     q_out_dt_end = _arg_str('out_dt_end')
     # 통계와 동일 기준: 기사관리의 차량번호 매핑으로 고정/개별/협력사 판별
-    fixed_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '고정'}
-    hyup_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '협력사'}
-    gae_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '개별'}
-    fixed_c_nums.discard('')
-    hyup_c_nums.discard('')
-    gae_c_nums.discard('')
+    fixed_c_nums, hyup_c_nums, gae_c_nums = mem_dir.fixed_c_nums, mem_dir.hyup_c_nums, mem_dir.gae_c_nums
 
-    filtered_rows = _settlement_filtered_rows_from_request(request)
+    def _settlement_result():
+        rows = _settlement_filtered_rows_from_request(request)
+        return rows, _settlement_sums(rows)
+
+    # 같은 조건(page·per_page 제외)·같은 데이터 버전의 재조회는 캐시된 행·총합계 사용 (읽기 전용)
+    filtered_rows, sums = _ledger_cached('settlement', LedgerQuery(request.args, 'settlement'), _settlement_result,
+                                         size=lambda res: len(res[0]))
     today = now_kst()
 
     total_pages = max(1, (len(filtered_rows) + per_page - 1) // per_page)
@@ -2813,172 +4686,15 @@ def settlement():
     start = (page - 1) * per_page
     end = start + per_page
     page_data = filtered_rows[start:end]
+    _perf_mark('render')
 
-    # 현재 검색된 목록 전체의 총합계 — 정산 통계(배차일 수익통계)와 동일 항목: 선착불·수금운임·공급가액·매출부가세·매출합계·지급운임·매입부가세·지출합계·납부부가세
-    sum_pre_post = sum_sugum = sum_supply = sum_fee_out = sum_vat1 = sum_vat2 = sum_total1 = sum_total2 = 0
-    for r in filtered_rows:
-        supply_val = int(calc_supply_value(r))
-        pre_i = int(float(r.get('pre_post') or 0))
-        sugum = supply_val - pre_i  # 수금운임 = 공급가액 − 선착불 (수수료+업체운임)
-        is_cc = (str(r.get('pay_method_client') or '').strip() == '현금')
-        is_cd = (str(r.get('pay_method_driver') or '').strip() == '현금')
-        _tbs = (str(r.get('tax_biz') or '')).strip()
-        is_cash_confirm = '현금' in _tbs
-        v1 = 0 if is_cc else int(round(supply_val * 0.1))
-        t1 = supply_val + v1
-        fo = int(float(r.get('fee_out') or 0))
-        v2 = 0 if (is_cd or is_cash_confirm) else int(round(fo * 0.1))
-        t2 = fo + v2
-        sum_pre_post += pre_i
-        sum_sugum += sugum
-        sum_supply += supply_val
-        sum_fee_out += fo
-        sum_vat1 += v1
-        sum_vat2 += v2
-        sum_total1 += t1
-        sum_total2 += t2
-    sum_count = len(filtered_rows)
-    sum_vat_profit = sum_vat1 - sum_vat2
-    sum_profit = sum_sugum - sum_fee_out  # 수익 = 수금운임(=공급가-선착불) − 지급운임(지급운임)
-    _st_th = 'padding:10px 12px; text-align:right; font-weight:600; color:#334155; background:#f1f5f9; border:1px solid #cbd5e1; white-space:nowrap; font-variant-numeric:tabular-nums;'
-    _st_td = 'padding:10px 12px; text-align:right; border:1px solid #e2e8f0; color:#475569; font-variant-numeric:tabular-nums;'
-    settlement_totals_html = f'''<div class="settlement-totals" style="margin:12px 0; padding:14px 20px; background:#f0f3f7; border:1px solid #d0d7de; border-radius:8px; font-size:13px;">
-        <div style="margin-bottom:10px;"><strong style="color:#1a2a6c;">📊 현재 검색 결과 총합계</strong> <span style="color:#666;">(총 {sum_count:,}건)</span></div>
-        <div style="overflow-x:auto;">
-        <table style="width:100%; min-width:900px; margin:0; font-size:13px; border-collapse:collapse;"><thead><tr>
-            <th style="{_st_th}">선착불</th><th style="{_st_th}">수금운임</th><th style="{_st_th}">공급가액</th><th style="{_st_th}">매출부가세</th><th style="{_st_th}">매출합계</th>
-            <th style="{_st_th}">지급운임</th><th style="{_st_th}">매입 부가세</th><th style="{_st_th}">지출 합계</th><th style="{_st_th}">수익</th><th style="{_st_th}">납부부가세</th>
-        </tr></thead><tbody><tr>
-            <td style="{_st_td} font-weight:bold;">{sum_pre_post:,}</td>
-            <td style="{_st_td} font-weight:bold;">{sum_sugum:,}</td>
-            <td style="{_st_td} font-weight:bold;">{sum_supply:,}</td>
-            <td style="{_st_td} font-weight:bold;">{sum_vat1:,}</td>
-            <td style="{_st_td} font-weight:bold;color:#1a2a6c;">{sum_total1:,}</td>
-            <td style="{_st_td} font-weight:bold;">{sum_fee_out:,}</td>
-            <td style="{_st_td} font-weight:bold;">{sum_vat2:,}</td>
-            <td style="{_st_td} font-weight:bold;color:#b71c1c;">{sum_total2:,}</td>
-            <td style="{_st_td} font-weight:bold;color:#1a2a6c;">{sum_profit:,}</td>
-            <td style="{_st_td} font-weight:bold;">{sum_vat_profit:,}</td>
-        </tr></tbody></table></div>
-    </div>'''
+    # 현재 검색된 목록 전체의 총합계(sums) — 정산 통계(배차일 수익통계)와 동일 항목: 선착불·수금운임·공급가액·매출부가세·매출합계·지급운임·매입부가세·지출합계·납부부가세
+    settlement_totals_html = _settlement_totals_html(len(filtered_rows), sums)
     # 하단 수식 안내 제거: 구 HTML에 {settlement_footnote_html} 남아 있어도 NameError 방지
     settlement_footnote_html = ''
 
-    client_by_name = {str(c.get('업체명') or '').strip(): c for c in clients_db if (c.get('업체명') or '').strip()}
-    table_rows = ""
-    for row in page_data:
-        # 계산서·인수증전송: 장부와 동일하게 날짜 유무로 버튼 눌림 상태 판단 (날짜 있음 → 녹색 적용, 없음 → 주황 미적용)
-        tax_dt_val = (row.get('tax_dt') or '').strip()[:10] if row.get('tax_dt') else ''
-        tax_chk_ok = bool(tax_dt_val) or _norm_tax_chk(row.get('tax_chk'))
-        tax_chk_toggle = "''" if tax_chk_ok else "'발행완료'"
-        mail_dt_val = (row.get('mail_dt') or '').strip()[:10] if row.get('mail_dt') else ''
-        mail_ok = bool(mail_dt_val) or _norm_mail_done(row.get('is_mail_done'))
-        # 인수증 확인 토글: mail_dt만 보지 않음(전송일 없이 is_mail_done만 확인완료인 경우 클릭 시 오늘 날짜가 들어가 미확인으로 못 돌아가던 문제 방지)
-        mail_dt_toggle = f"'{today.strftime('%Y-%m-%d')}'" if not mail_ok else "''"
-
-        in_dt_val = (row.get('in_dt') or '')[:10]
-        out_dt_val = (row.get('out_dt') or '')[:10]
-        in_dt_span = f'<span style="font-size:10px; color:#1976d2;">{in_dt_val}</span>' if in_dt_val else ''
-        tax_dt_span = f'<span style="font-size:10px; color:#1976d2;">{tax_dt_val}</span>' if tax_dt_val else ''
-        out_dt_span = f'<span style="font-size:10px; color:#1976d2;">{out_dt_val}</span>' if out_dt_val else ''
-        mail_dt_span = f'<span style="font-size:10px; color:#1976d2;">{mail_dt_val}</span>' if mail_dt_val else ''
-        tax_label = '계산서발급확인' if tax_chk_ok else '미발행'
-        misu_btn = f'<div style="display:flex; flex-direction:column; align-items:center; gap:2px;"><input type="date" value="{in_dt_val}" style="font-size:10px; width:95px; padding:2px;" onchange="changeStatus({row["id"]}, \'in_dt\', this.value)">{in_dt_span}<button type="button" class="btn-status {row["m_cl"]}" onclick="toggleSettlementIn({row["id"]})">{row["m_st"]}</button></div>'
-        tax_issued_btn = f'<button type="button" class="btn-status {"bg-green" if tax_chk_ok else "bg-orange"}" onclick="changeStatus({row["id"]}, \'tax_chk\', {tax_chk_toggle})">{tax_label}</button>'
-        tax_cell = f'<div style="display:flex; flex-direction:column; align-items:center; gap:2px;"><input type="date" value="{tax_dt_val}" style="font-size:10px; width:95px; padding:2px;" onchange="changeStatus({row["id"]}, \'tax_dt\', this.value)">{tax_dt_span}<div>{tax_issued_btn}</div></div>'
-        pay_btn = f'<div style="display:flex; flex-direction:column; align-items:center; gap:2px;"><input type="date" value="{out_dt_val}" style="font-size:10px; width:95px; padding:2px;" onchange="changeStatus({row["id"]}, \'out_dt\', this.value)">{out_dt_span}<button type="button" class="btn-status {row["p_cl"]}" onclick="toggleSettlementPay({row["id"]})">{row["p_st"]}</button></div>'
-        
-        mail_val = '확인완료' if mail_ok else '미확인'
-        mail_color = "bg-green" if mail_ok else "bg-orange"
-        mail_btn = f'<div style="display:flex; flex-direction:column; align-items:center; gap:2px;"><input type="date" value="{mail_dt_val}" style="font-size:10px; width:95px; padding:2px;" onchange="changeStatus({row["id"]}, \'mail_dt\', this.value)">{mail_dt_span}<button class="btn-status {mail_color}" onclick="changeStatus({row["id"]}, \'mail_dt\', {mail_dt_toggle})">{mail_val}</button></div>'
-
-        issue_dt_val = (row.get('issue_dt') or '').strip()[:10]
-        issue_dt_toggle = f"'{today.strftime('%Y-%m-%d')}'" if not issue_dt_val else "''"
-        issue_dt_span = f'<span style="font-size:10px; color:#1976d2;">{issue_dt_val}</span>' if issue_dt_val else ''
-        tax_biz2_val = (row.get('tax_biz2') or '').strip()
-        issue_confirmed = bool(issue_dt_val)
-        issue_btn = f'<div style="display:flex; flex-direction:column; align-items:center; gap:2px;"><input type="date" value="{issue_dt_val}" style="font-size:10px; width:95px; padding:2px;" onchange="changeStatus({row["id"]}, \'issue_dt\', this.value)">{issue_dt_span}<button class="btn-status {"bg-green" if issue_confirmed else "bg-orange"}" onclick="changeStatus({row["id"]}, \'issue_dt\', {issue_dt_toggle})">{"확인완료" if issue_confirmed else "미확인"}</button></div>'
-
-        me_c = (str(row.get('month_end_client') or '').strip() in ('1', 'Y'))
-        me_d = (str(row.get('month_end_driver') or '').strip() in ('1', 'Y'))
-        rid = row['id']
-        tax_biz2_cell = _settlement_tax_biz2_cell_html(rid, row.get('tax_biz2'))
-        pay_to_cell = _settlement_pay_to_cell_html(rid, row.get('pay_to'))
-        is_cash_c = (str(row.get('pay_method_client') or '').strip() == '현금')
-        is_cash_d = (str(row.get('pay_method_driver') or '').strip() == '현금')
-        # 매입처현금 탭 (기사): 표기 발행/현금확인, 백엔드 값은 이체/현금 유지. 기본=발행, 클릭 시 현금확인
-        pay_driver_tabs = f'<span class="settle-pay-tabs" style="display:inline-flex; margin-left:4px; border:1px solid #dee2e6; border-radius:4px; overflow:hidden; font-size:10px;"><span style="padding:2px 6px; cursor:pointer; { "background:#e67e22; color:white;" if is_cash_d else "background:#fff; color:#666;" }" onclick="changeStatus({rid}, \'pay_method_driver\', \'현금\')" title="클릭 시 현금확인">현금확인</span><span style="padding:2px 6px; cursor:pointer; { "background:#b71c1c; color:white;" if not is_cash_d else "background:#fff; color:#666;" }" onclick="changeStatus({rid}, \'pay_method_driver\', \'이체\')" title="기본 발행">발행</span></span>'
-        # 매출처현금 탭 (업체): 표기 현금확인/발행, 백엔드 값은 이체/현금 유지. 기본=발행, 클릭 시 현금확인
-        pay_client_tabs = f'<span class="settle-pay-tabs" style="display:inline-flex; margin-left:4px; border:1px solid #dee2e6; border-radius:4px; overflow:hidden; font-size:10px;"><span style="padding:2px 6px; cursor:pointer; { "background:#e67e22; color:white;" if is_cash_c else "background:#fff; color:#666;" }" onclick="changeStatus({rid}, \'pay_method_client\', \'현금\')" title="클릭 시 현금확인">현금확인</span><span style="padding:2px 6px; cursor:pointer; { "background:#1a2a6c; color:white;" if not is_cash_c else "background:#fff; color:#666;" }" onclick="changeStatus({rid}, \'pay_method_client\', \'이체\')" title="기본 발행">발행</span></span>'
-        month_end_client_cell = f'<input type="checkbox" {"checked" if me_c else ""} onchange="fetch(\'/api/update_status\', {{method:\'POST\', headers:{{\'Content-Type\':\'application/json\'}}, body: JSON.stringify({{id:{rid}, key:\'month_end_client\', value: this.checked ? \'1\' : \'\'}})}}).then(r=>r.json()).then(res=>{{if(res.status===\'success\') {{ if (typeof window.refreshSettlementTable===\'function\') window.refreshSettlementTable(); }} else alert(res.message||\'반영 실패\');}});">'
-        month_end_driver_cell = f'<input type="checkbox" {"checked" if me_d else ""} onchange="fetch(\'/api/update_status\', {{method:\'POST\', headers:{{\'Content-Type\':\'application/json\'}}, body: JSON.stringify({{id:{rid}, key:\'month_end_driver\', value: this.checked ? \'1\' : \'\'}})}}).then(r=>r.json()).then(res=>{{if(res.status===\'success\') {{ if (typeof window.refreshSettlementTable===\'function\') window.refreshSettlementTable(); }} else alert(res.message||\'반영 실패\');}});">'
-
-        def make_direct_links(ledger_id, img_type, raw_paths):
-            paths = [p.strip() for p in (raw_paths or "").split(',')] if raw_paths else []
-            # 미리보기: 업로드된 이미지 썸네일 (클릭 시 모달로 확대)
-            preview_html = ''
-            for p in paths:
-                if p.startswith('static/') or p.startswith('evidences/'):
-                    path_js = p.replace('\\', '\\\\').replace("'", "\\'")
-                    src = '/' + p if not p.startswith('/') else p
-                    preview_html += f'<img src="{src}" style="width:28px;height:28px;object-fit:cover;cursor:pointer;border:1px solid #ccc;border-radius:4px;" onclick="event.stopPropagation(); viewImg(\'{path_js}\')" title="클릭 시 크게 보기" alt="">'
-            if preview_html:
-                preview_html = f'<div style="display:flex; flex-wrap:wrap; gap:2px; justify-content:center; margin-bottom:4px;">{preview_html}</div>'
-            links_html = '<div style="display:flex; flex-direction:column; align-items:center;">' + preview_html + '<div style="display:flex; gap:3px; justify-content:center;">'
-            for i in range(1, 6):
-                has_file = len(paths) >= i and (paths[i-1].startswith('static/') or paths[i-1].startswith('evidences/'))
-                css_class = "link-btn has-file" if has_file else "link-btn"
-                links_html += f'<a href="/upload_evidence/{ledger_id}?type={img_type}&seq={i}" target="_blank" class="{css_class}">{i}</a>'
-            links_html += '</div></div>'
-            return links_html
-
-        # 통합장부(ledger)와 동일 계산식:
-        # 공급가액 = 수금운임(fee) + 수수료(comm) + 선착불(pre_post)
-        # 매출 부가세/합계 = 공급가액 기준(업체현금이면 0)
-        supply_val, vat1, total1, _fee_out_ign, _vat2_ign, _total2_ign = calc_totals_with_vat(row)
-        fee_raw = row.get('fee')
-        pre_post_raw = row.get('pre_post')
-        try:
-            fee_val = int(float(fee_raw)) if fee_raw not in (None, '', 'None') else 0
-        except Exception:
-            fee_val = 0
-        try:
-            pre_post_val = int(float(pre_post_raw)) if pre_post_raw not in (None, '', 'None') else 0
-        except Exception:
-            pre_post_val = 0
-        pre_post_chk_raw = row.get('pre_post_chk')
-        pre_post_chk_checked = str(pre_post_chk_raw or '').strip() in ('1', 'Y', '✅')
-        pre_post_chk_cell = f'<input type="checkbox" {"checked" if pre_post_chk_checked else ""} onchange="fetch(\'/api/update_status\', {{method:\'POST\', headers:{{\'Content-Type\':\'application/json\'}}, body: JSON.stringify({{id:{rid}, key:\'pre_post_chk\', value: this.checked ? \'1\' : \'\'}})}}).then(r=>r.json()).then(res=>{{if(res.status===\'success\') {{ if (typeof window.refreshSettlementTable===\'function\') window.refreshSettlementTable(); }} else alert(res.message||\'반영 실패\');}});">'
-        supply_val_disp = f"{int(supply_val):,}" if supply_val is not None else ""
-        is_cash_client = (str(row.get('pay_method_client') or '').strip() == '현금')
-        is_cash_driver = (str(row.get('pay_method_driver') or '').strip() == '현금')
-        _tax_biz_s_for_cash = (str(row.get('tax_biz') or '')).strip()
-        is_cash_confirm = '현금' in _tax_biz_s_for_cash
-        pay_to_s = (str(row.get('pay_to') or '')).strip()
-        # 기존 렌더링 코드가 _tax_biz_s 이름을 참조하므로, 표시값은 pay_to_s로 유지
-        _tax_biz_s = pay_to_s
-        # vat1/total1 는 위 calc_totals_with_vat 결과 사용
-        fee_out_val = int(float(row.get('fee_out') or 0))
-        vat2 = 0 if (is_cash_driver or is_cash_confirm) else int(round(fee_out_val * 0.1))
-        total2 = fee_out_val + vat2
-        order_no = "n" + str(row['id']).zfill(2)
-        _esc_attr = lambda x: (str(x) or '').replace('"', '&quot;')[:200]
-        has_tax = '1' if any(p.strip().startswith(('static/', 'evidences/')) for p in (row.get('tax_img') or '').split(',')) else '0'
-        has_ship = '1' if any(p.strip().startswith(('static/', 'evidences/')) for p in (row.get('ship_img') or '').split(',')) else '0'
-        me_c = '1' if (str(row.get('month_end_client') or '').strip() in ('1', 'Y')) else '0'
-        me_d = '1' if (str(row.get('month_end_driver') or '').strip() in ('1', 'Y')) else '0'
-        _tax_chk_val = '발행완료' if tax_chk_ok else ''
-        _mail_val = '확인완료' if mail_ok else '미확인'
-        _dispatch_dt = (row.get('dispatch_dt') or '')[:10] if row.get('dispatch_dt') else ''
-        table_rows += f"""<tr class="data-row" data-order-no="{order_no}" data-client-name="{_esc_attr(row.get('client_name'))}" data-c-mgr-name="{_esc_attr(row.get('c_mgr_name'))}" data-tax-chk="{_esc_attr(_tax_chk_val)}" data-tax-dt="{_esc_attr(tax_dt_val)}" data-order-dt="{row.get('order_dt') or ''}" data-dispatch-dt="{_dispatch_dt}" data-route="{_esc_attr(row.get('route'))}" data-d-name="{_esc_attr(row.get('d_name'))}" data-c-num="{_esc_attr(row.get('c_num'))}" data-supply="{fee_val}" data-vat1="{vat1}" data-total1="{total1}" data-m-st="{row['m_st']}" data-fee-out="{fee_out_val}" data-vat2="{vat2}" data-total2="{total2}" data-p-st="{row['p_st']}" data-mail="{_esc_attr(_mail_val)}" data-issue-dt="{row.get('issue_dt') or ''}" data-tax-biz-name="{_esc_attr(row.get('tax_biz_name'))}" data-tax-biz2="{_esc_attr(tax_biz2_val)}" data-tax-biz="{_esc_attr(pay_to_s)}" data-has-tax="{has_tax}" data-has-ship="{has_ship}" data-me-c="{me_c}" data-me-d="{me_d}">
-            <td style="white-space:nowrap;">
-                <span class="order-no" style="display:inline-block; font-weight:700; color:#1a2a6c; margin-right:8px; font-size:12px;" title="고유오더번호">{order_no}</span>
-                <button class="btn-log" onclick="viewOrderLog({row['id']})" style="background:#6c757d; color:white; border:none; padding:2px 5px; cursor:pointer; font-size:11px; border-radius:3px;">로그</button><br>
-                <button type="button" class="btn-status" style="font-size:10px; padding:2px 6px; margin-top:2px; background:#e3f2fd; color:#1a2a6c;" onclick="viewSettlementClientInfo({row['id']})" title="매출처(업체) 정보">매출처</button>
-                <button type="button" class="btn-status" style="font-size:10px; padding:2px 6px; margin-left:2px; margin-top:2px; background:#ffebee; color:#b71c1c;" onclick="viewSettlementVendorInfo({row['id']})" title="매입처(기사) 정보">매입처</button>
-            </td>
-            <td>{row['order_dt']}</td><td>{_dispatch_dt}</td><td>{row['route']}</td><td>{row['d_name']}</td><td>{row['c_num']}</td><td style="text-align:center;">{month_end_driver_cell}</td><td>{fee_out_val:,}</td><td>{vat2:,}</td><td>{total2:,}</td><td>{pay_btn}</td><td>{make_direct_links(row['id'], 'tax', row['tax_img'])}</td><td>{row.get('tax_biz_name') or ''}</td><td style="text-align:center;">{pay_driver_tabs}</td><td>{issue_btn}</td><td>{tax_biz2_cell}</td><td style="text-align:center;">{pre_post_chk_cell}</td><td>{(f"{pre_post_val:,}" if pre_post_val else "")}</td><td>{fee_val:,}</td><td>{supply_val_disp}</td><td>{vat1:,}</td><td>{total1:,}</td><td>{misu_btn}</td><td style="text-align:center;">{pay_client_tabs}</td><td style="text-align:center;">{month_end_client_cell}</td><td>{row.get('c_mgr_name') or ''}</td><td>{row['client_name']}</td><td>{tax_cell}</td><td>{pay_to_cell}</td><td>{mail_btn}</td><td>{make_direct_links(row['id'], 'ship', row['ship_img'])}</td></tr>"""
-    
+    table_rows = "".join(_settlement_row_html(row, today) for row in page_data)
+
     if request.args.get('fragment'):
         return Response(table_rows, mimetype='text/html; charset=utf-8')
     
@@ -3163,6 +4879,13 @@ def settlement():
         <a href="/export_tax_not_issued?{urlencode(_settlement_export_params)}" class="btn-status bg-gray settlement-export-link" data-export-base="/export_tax_not_issued" style="text-decoration:none; margin-left:5px;">세금계산서 미발행 엑셀</a>
         <a href="/export_settlement_excel?{urlencode(_settlement_export_params)}" class="btn-status bg-blue settlement-export-link" data-export-base="/export_settlement_excel" style="text-decoration:none; margin-left:5px;">정산관리 검색결과 엑셀</a>
     </div>
+    <div id="settleBatchBar" style="margin: 0 0 10px; display:flex; align-items:center; gap:6px; flex-wrap:wrap;">
+        <label style="cursor:pointer;"><input type="checkbox" id="settleSelAll" style="vertical-align:middle;"> 목록 전체 선택</label>
+        <span style="color:#555;">(<b id="settleSelCount">0</b>건 선택)</span>
+        <button type="button" class="btn-status bg-green" onclick="settlementBatch('in_dt')">선택 수금완료</button>
+        <button type="button" class="btn-status bg-green" onclick="settlementBatch('out_dt')">선택 지급완료</button>
+        <button type="button" class="btn-status bg-blue" onclick="settlementBatch('tax_chk')">선택 계산서 발행완료</button>
+    </div>
     <script>
     (function(){{
       var form = document.querySelector('.page-settlement form.filter-box');
@@ -3173,7 +4896,8 @@ def settlement():
           var base = a.getAttribute('data-export-base');
           if (!base) return;
           var qs = new URLSearchParams(new FormData(form)).toString();
-          window.location.href = base + (qs ? '?' + qs : '');
+          var url = base + (qs ? '?' + qs : '');
+          if (window.startExportJob) window.startExportJob(url); else window.location.href = url;
         }});
       }});
     }})();
@@ -3225,19 +4949,88 @@ def settlement():
         </div>
     </div>
     <script>
-    window.refreshSettlementTable = function() {{
+    // ids가 있으면 해당 행만 다시 그리고 총합계는 바뀐 행만큼 가감 (/api/settlement_rows), 실패 시 표 전체 다시 읽기
+    window.refreshSettlementTable = function(ids) {{
+        var totalsEl = document.querySelector('.settlement-totals[data-sums]');
+        if (ids && ids.length && totalsEl) {{
+            var prev = null;
+            var trs = {{}};
+            ids.forEach(function(id) {{
+                var tr = document.querySelector('#settlementTable tbody tr[data-id="' + id + '"]');
+                if (!tr) return;
+                trs[id] = tr;
+                var v = (tr.getAttribute('data-sums') || '').split(',').map(Number);
+                if (!prev) prev = v.map(function() {{ return 0; }}).concat([0]);
+                prev[0] += 1;
+                v.forEach(function(n, i) {{ prev[i + 1] += n; }});
+            }});
+            var p = new URLSearchParams(window.location.search);
+            p.set('ids', ids.join(','));
+            p.set('totals', totalsEl.getAttribute('data-sums'));
+            p.set('prev', (prev || []).join(','));
+            fetch('/api/settlement_rows?' + p.toString(), {{ cache: 'no-store' }}).then(function(r) {{ return r.json(); }}).then(function(res) {{
+                if (!res || res.status !== 'success' || !res.totals_html) {{ window.refreshSettlementTable(); return; }}
+                Object.keys(trs).forEach(function(id) {{
+                    var html = res.rows[id];
+                    if (!html) {{ trs[id].remove(); return; }}
+                    var tmp = document.createElement('tbody');
+                    tmp.innerHTML = html;
+                    if (tmp.firstElementChild) trs[id].replaceWith(tmp.firstElementChild);
+                }});
+                var tmp2 = document.createElement('div');
+                tmp2.innerHTML = res.totals_html;
+                if (tmp2.firstElementChild) totalsEl.replaceWith(tmp2.firstElementChild);
+                if (typeof _settleSelSync === 'function') _settleSelSync();
+            }}).catch(function() {{ window.refreshSettlementTable(); }});
+            return;
+        }}
         var q = window.location.search.slice(1);
         var url = '/settlement?' + (q ? q + '&' : '') + 'fragment=1';
         fetch(url, {{ cache: 'no-store' }}).then(function(r) {{ return r.text(); }}).then(function(html) {{
             var tbody = document.querySelector('#settlementTable tbody');
             if (tbody) tbody.innerHTML = html;
+            if (typeof _settleSelSync === 'function') _settleSelSync();
         }}).catch(function() {{}});
     }};
+    // 일괄 변경: 체크한 행에 수금일·지급일(오늘) 또는 계산서 발행완료를 한 번의 요청으로 반영
+    function _settleSelected() {{
+        return Array.prototype.slice.call(document.querySelectorAll('#settlementTable tbody input.settle-sel:checked')).map(function(cb) {{ return parseInt(cb.value, 10); }});
+    }}
+    function _settleSelSync() {{
+        var el = document.getElementById('settleSelCount');
+        if (el) el.textContent = _settleSelected().length;
+    }}
+    document.addEventListener('change', function(e) {{
+        if (e.target && e.target.id === 'settleSelAll') {{
+            document.querySelectorAll('#settlementTable tbody input.settle-sel').forEach(function(cb) {{ cb.checked = e.target.checked; }});
+            _settleSelSync();
+        }} else if (e.target && e.target.classList && e.target.classList.contains('settle-sel')) {{
+            _settleSelSync();
+        }}
+    }});
+    window.settlementBatch = function(key) {{
+        var ids = _settleSelected();
+        if (!ids.length) {{ alert('변경할 행을 선택해 주세요.'); return; }}
+        var today = todayKST();
+        var label = {{ in_dt: '수금완료(수금일 ' + today + ')', out_dt: '지급완료(지급일 ' + today + ')', tax_chk: '계산서 발행완료' }}[key];
+        var value = key === 'tax_chk' ? '발행완료' : today;
+        if (!confirm('선택한 ' + ids.length + '건을 ' + label + '로 변경할까요?')) return;
+        fetch('/api/update_status_batch', {{ method: 'POST', headers: {{'Content-Type': 'application/json'}}, body: JSON.stringify({{ items: ids.map(function(id) {{ return {{ id: id, key: key, value: value }}; }}) }}) }})
+            .then(function(r) {{ return r.json(); }})
+            .then(function(res) {{
+                if (res.status === 'success') {{
+                    var all = document.getElementById('settleSelAll'); if (all) all.checked = false;
+                    if (typeof window.refreshSettlementTable === 'function') window.refreshSettlementTable(ids);
+                    if (res.skipped) alert(res.count + '건 변경, 이미 완료된 ' + res.skipped + '건은 기존 날짜를 유지했습니다.');
+                }} else alert(res.message || '반영 실패');
+            }})
+            .catch(function() {{ alert('저장 요청에 실패했습니다.'); }});
+    }};
     window.changeStatus = function(id, key, val) {{
         fetch('/api/update_status', {{ method: 'POST', headers: {{'Content-Type': 'application/json'}}, body: JSON.stringify({{id: id, key: key, value: val}}) }})
             .then(function(r) {{ return r.json(); }})
             .then(function(res) {{
-                if (res.status === 'success') {{ if (typeof window.refreshSettlementTable === 'function') window.refreshSettlementTable(); }}
+                if (res.status === 'success') {{ if (typeof window.refreshSettlementTable === 'function') window.refreshSettlementTable([id]); }}
                 else alert(res.message || '반영 실패');
             }})
             .catch(function() {{ alert('저장 요청에 실패했습니다.'); }});
@@ -3273,7 +5066,7 @@ def settlement():
         fetch('/api/toggle_settlement_pay', {{ method: 'POST', headers: {{'Content-Type': 'application/json'}}, body: JSON.stringify({{ id: id }}) }})
             .then(function(r) {{ return r.json(); }})
             .then(function(res) {{
-                if (res.status === 'success') {{ if (typeof window.refreshSettlementTable === 'function') window.refreshSettlementTable(); }}
+                if (res.status === 'success') {{ if (typeof window.refreshSettlementTable === 'function') window.refreshSettlementTable([id]); }}
                 else alert(res.message || '반영 실패');
             }})
             .catch(function() {{ alert('저장 요청에 실패했습니다.'); }});
@@ -3282,7 +5075,7 @@ def settlement():
         fetch('/api/toggle_settlement_in', {{ method: 'POST', headers: {{'Content-Type': 'application/json'}}, body: JSON.stringify({{ id: id }}) }})
             .then(function(r) {{ return r.json(); }})
             .then(function(res) {{
-                if (res.status === 'success') {{ if (typeof window.refreshSettlementTable === 'function') window.refreshSettlementTable(); }}
+                if (res.status === 'success') {{ if (typeof window.refreshSettlementTable === 'function') window.refreshSettlementTable([id]); }}
                 else alert(res.message || '반영 실패');
             }})
             .catch(function() {{ alert('저장 요청에 실패했습니다.'); }});
@@ -3484,273 +5277,519 @@ def settlement():
     }})();
     </script>
     """
-    return render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(drivers_db), clients_json=json.dumps(clients_db), col_keys="[]")
-
-
-def _settlement_filtered_rows_from_request(req):
-    """정산관리 settlement()·export_settlement_excel·export_tax_not_issued 공통 GET 쿼리·SQL·Python 필터로 행 목록 반환."""
-    conn = connect_ledger()
-    conn.row_factory = sqlite3.Row
-
-    def _arg_str(key, default=''):
-        return str(req.args.get(key) or default).strip()
-
-    q_status = _arg_str('status')
-    qs_stat = _normalize_settlement_status_param(q_status)
-    q_driver_type = _arg_str('driver_type')
-    q_name = _arg_str('name')
-    q_c_num = _arg_str('c_num')
-    q_amount = _arg_str('q_amount')
-    q_client = _arg_str('q_client')
-    q_in_name = _arg_str('q_in_name')
-    q_phone = _arg_str('q_phone')
-    q_c_mgr_name = _arg_str('q_c_mgr_name')
-    q_vendor = _arg_str('vendor')
-    q_tax_biz2 = _arg_str('q_tax_biz2')   # 매입사업자 구분 레거시 검색
-    q_tb2_hj = _arg_str('tb2_hj')
-    q_tb2_sm = _arg_str('tb2_sm')
-    q_tb2_sq = _arg_str('tb2_sq')
-    q_tb2_tags = _tax_biz2_tags_from_args(q_tb2_hj, q_tb2_sm, q_tb2_sq)
-    q_biz_issue = _arg_str('q_biz_issue') # 매출사업자 구분 레거시 검색
-    q_sb2_hj = _arg_str('sb2_hj')
-    q_sb2_sm = _arg_str('sb2_sm')
-    q_sb2_sq = _arg_str('sb2_sq')
-    q_sb2_tags = _tax_biz2_tags_from_args(q_sb2_hj, q_sb2_sm, q_sb2_sq)
-    q_start = _arg_str('start')
-    q_end = _arg_str('end')
-    q_filter_pay_client = _arg_str('filter_pay_client')   # ''=전체, 1=현금확인, 0=발행
-    q_filter_pay_driver = _arg_str('filter_pay_driver')   # ''=전체, 1=현금확인, 0=발행
-    q_month_client = _arg_str('month_end_client')
-    q_month_driver = _arg_str('month_end_driver')
-    q_not_month_end_client = _arg_str('not_month_end_client')
-    q_not_month_end_driver = _arg_str('not_month_end_driver')
-
-    q_order_start = _arg_str('order_start')
-    q_order_end = _arg_str('order_end')
-    q_in_dt_start = _arg_str('in_dt_start')
-    q_in_dt_end = _arg_str('in_dt_end')
-    q_out_dt_start = _arg_str('out_dt_start')
-    q_out_dt_end = _arg_str('out_dt_end')
-    # 통계와 동일 기준: 기사관리의 차량번호 매핑으로 고정/개별/협력사 판별
-    fixed_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '고정'}
-    hyup_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '협력사'}
-    gae_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '개별'}
-    fixed_c_nums.discard('')
-    hyup_c_nums.discard('')
-    gae_c_nums.discard('')
-
-    # 성능: 날짜/이름 필터를 SQL로 적용 (정산 화면과 동일하게 배차일=start/end 기준)
-    query = "SELECT * FROM ledger"
-    params = []
-    conditions = []
-    if q_start:
-        conditions.append("dispatch_dt IS NOT NULL AND dispatch_dt != '' AND substr(dispatch_dt,1,10) >= ?")
-        params.append(q_start)
-    if q_end:
-        conditions.append("dispatch_dt IS NOT NULL AND dispatch_dt != '' AND substr(dispatch_dt,1,10) <= ?")
-        params.append(q_end)
-    if q_order_start:
-        conditions.append("order_dt >= ?")
-        params.append(q_order_start)
-    if q_order_end:
-        conditions.append("order_dt <= ?")
-        params.append(q_order_end)
-    if q_in_dt_start:
-        conditions.append("in_dt IS NOT NULL AND TRIM(COALESCE(in_dt,'')) != '' AND substr(in_dt,1,10) >= ?")
-        params.append(q_in_dt_start)
-    if q_in_dt_end:
-        conditions.append("in_dt IS NOT NULL AND TRIM(COALESCE(in_dt,'')) != '' AND substr(in_dt,1,10) <= ?")
-        params.append(q_in_dt_end)
-    if q_out_dt_start:
-        conditions.append("out_dt IS NOT NULL AND TRIM(COALESCE(out_dt,'')) != '' AND substr(out_dt,1,10) >= ?")
-        params.append(q_out_dt_start)
-    if q_out_dt_end:
-        conditions.append("out_dt IS NOT NULL AND TRIM(COALESCE(out_dt,'')) != '' AND substr(out_dt,1,10) <= ?")
-        params.append(q_out_dt_end)
-    if q_name:
-        name_part = q_name
-        add_id_condition = False
-        id_val = None
-        # n01, n02 형식 또는 숫자만(01, 02, 12 등) 입력 시 id 조건 추가
-        if name_part.lower().startswith('n'):
-            num_str = name_part[1:].lstrip('0') or '0'
-            if num_str.isdigit():
-                try:
-                    id_val = int(num_str)
-                    add_id_condition = True
-                except (ValueError, TypeError):
-                    pass
-        elif name_part.isdigit():
-            try:
-                id_val = int(name_part)
-                add_id_condition = True
-            except (ValueError, TypeError):
-                pass
-        like_part = "(client_name LIKE ? OR tax_biz_name LIKE ? OR d_name LIKE ?)"
-        like_params = [f"%{name_part}%", f"%{name_part}%", f"%{name_part}%"]
-        if add_id_condition and id_val is not None:
-            conditions.append("(" + like_part + " OR id = ?)")
-            params.extend(like_params + [id_val])
-        else:
-            conditions.append(like_part)
-            params.extend(like_params)
-    if q_c_num:
-        conditions.append("COALESCE(c_num,'') LIKE ?")
-        params.append(f"%{q_c_num}%")
-    if q_vendor:
-        conditions.append("COALESCE(tax_biz_name,'') LIKE ?")
-        params.append(f"%{q_vendor}%")
-    _sql_append_tax_biz2(conditions, params, q_tb2_tags, '' if q_tb2_tags else q_tax_biz2)
-    _sql_append_biz_issue_tags(conditions, params, q_sb2_tags, '' if q_sb2_tags else q_biz_issue)
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-    query += " ORDER BY CASE WHEN dispatch_dt IS NULL OR dispatch_dt = '' THEN 1 ELSE 0 END, dispatch_dt DESC, id DESC"
-
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-
-    filtered_rows = []
-    today = now_kst()
-    today_naive = today.replace(tzinfo=None)  # naive용 비교 (DB 날짜는 timezone 없음)
-
-    for row in rows:
-        r = dict(row)  # KeyError 방지: 구 스키마에 없는 컬럼은 .get()으로 접근
-        in_dt = r.get('in_dt'); out_dt = r.get('out_dt'); dispatch_dt_str = r.get('dispatch_dt')
-        order_dt = r.get('order_dt') or ""
-
-        misu_status, misu_color = _misu_status_for_settlement_row(r, today_naive)
-
-        pay_status = _pay_status_from_row(r)
-        if pay_status == "지급완료":
-            pay_color = "bg-green"
-        elif pay_status == "미지급":
-            pay_color = "bg-red"
+    return render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(mem_dir.drivers), clients_json=json.dumps(mem_dir.clients), col_keys="[]")
+
+
+class LedgerQuery:
+    """정산관리·통계·엑셀 다운로드(export_*) 공통 장부 조회 조건.
+
+    request.args를 한 번만 파싱해 SQL로 표현 가능한 조건은 파라미터 WHERE로 DB에서 먼저 거르고,
+    SQL로 표현이 어려운 조건(초성·쉼표 토큰·공급가액·전화번호 등)은 matches() 잔여 조건으로 확인.
+    SQL 조건은 항상 잔여 조건보다 넓거나 같게 만들고 잔여 조건에서 다시 확인하므로 결과는 화면 규칙과 동일.
+
+    scope='settlement': 정산관리 인자(name, q_client, in_dt_start, driver_type ...), 사업자구분 체크 다중 선택 시 AND.
+    scope='statistics': 통계 인자(client, driver, in_start ...), 사업자구분 체크 다중 선택 시 OR."""
+
+    ORDER_BY = " ORDER BY CASE WHEN dispatch_dt IS NULL OR dispatch_dt = '' THEN 1 ELSE 0 END, dispatch_dt DESC, id DESC"
+
+    def __init__(self, args, scope='settlement'):
+        def _arg_str(key):
+            return str(args.get(key) or '').strip()
+
+        self.scope = scope
+        self.start = _arg_str('start')
+        self.end = _arg_str('end')
+        self.order_start = _arg_str('order_start')
+        self.order_end = _arg_str('order_end')
+        self.status = _normalize_settlement_status_param(_arg_str('status'))
+        self.vendor = _arg_str('vendor')
+        self.c_num = _arg_str('c_num')
+        self.q_amount = _arg_str('q_amount')
+        self.q_in_name = _arg_str('q_in_name')
+        self.q_phone = _arg_str('q_phone')
+        self.filter_pay_client = _arg_str('filter_pay_client')   # ''=전체, 1=현금확인, 0=발행
+        self.filter_pay_driver = _arg_str('filter_pay_driver')   # ''=전체, 1=현금확인, 0=발행
+        self.month_client = _arg_str('month_end_client')
+        self.month_driver = _arg_str('month_end_driver')
+        self.not_month_end_client = _arg_str('not_month_end_client')
+        self.not_month_end_driver = _arg_str('not_month_end_driver')
+        self.tax_biz2 = _arg_str('q_tax_biz2')     # 매입사업자 구분 레거시 검색
+        self.biz_issue = _arg_str('q_biz_issue')   # 매출사업자 구분 레거시 검색
+        self.tb2_tags = _tax_biz2_tags_from_args(args.get('tb2_hj'), args.get('tb2_sm'), args.get('tb2_sq'))
+        self.sb2_tags = _tax_biz2_tags_from_args(args.get('sb2_hj'), args.get('sb2_sm'), args.get('sb2_sq'))
+        if scope == 'statistics':
+            self.in_start = _arg_str('in_start')
+            self.in_end = _arg_str('in_end')
+            self.out_start = _arg_str('out_start')
+            self.out_end = _arg_str('out_end')
+            self.name = ''
+            self.client = _arg_str('client')
+            self.driver = _arg_str('driver')
+            self.q_client = self.client  # 통계: 매출처 검색은 초성 검색(_row_matches_extra_filters)도 함께 적용
+            self.c_mgr_name = ''
+            self.driver_type = ''
         else:
-            pay_color = "bg-blue"
-
-        # 검색 필터 적용 (정산 화면과 동일하게 Python에서 재필터)
-        dispatch_dt_val = (dispatch_dt_str or '')[:10] if dispatch_dt_str else ''
-        if q_start and dispatch_dt_val and dispatch_dt_val < q_start:
-            continue
-        if q_end and dispatch_dt_val and dispatch_dt_val > q_end:
-            continue
-        if q_order_start and order_dt < q_order_start:
-            continue
-        if q_order_end and order_dt > q_order_end:
-            continue
-        if not _ledger_yyyymmdd_in_range(in_dt, q_in_dt_start, q_in_dt_end):
-            continue
-        if not _ledger_yyyymmdd_in_range(out_dt, q_out_dt_start, q_out_dt_end):
-            continue
-
-        # 이름 필터 (매입처/매출결제처명·업체/기사명 + 오더고유번호 n01, n02 또는 숫자만 01, 12 등)
-        if q_name:
-            q = q_name.lower()
-            in_client = q in str(r.get('client_name') or '').lower()
-            in_vendor = q in str(r.get('tax_biz_name') or '').lower()
-            in_driver = q in str(r.get('d_name') or '').lower()
-            order_no = ('n' + str(r.get('id')).zfill(2)).lower()
-            match_order = (q == order_no or q in order_no or order_no in q)
-            match_id = False
-            if q.isdigit():
-                try:
-                    match_id = (r.get('id') == int(q))
-                except (ValueError, TypeError):
-                    pass
-            if not (in_client or in_vendor or in_driver or match_order or match_id):
-                continue
-
-        # 매출처담당자명 전용 필터
-        if q_c_mgr_name and q_c_mgr_name.lower() not in str(r.get('c_mgr_name') or '').lower():
-            continue
-
-        # 차량번호 전용 필터
-        if q_c_num and q_c_num.lower() not in str(r.get('c_num') or '').lower():
-            continue
-
-        # 매입처명 전용 필터
-        if q_vendor and q_vendor.lower() not in str(r.get('tax_biz_name') or '').lower():
-            continue
-
-        # 매출사업자구분 체크(흥진/에스엠/스퀘어): SQL은 biz_issue 부분일치까지 포함할 수 있어 pay_to 토큰으로 UI와 동일하게 재확인
-        if q_sb2_tags and not _row_matches_sb2_pay_to_tokens(r, q_sb2_tags):
-            continue
+            self.in_start = _arg_str('in_dt_start')
+            self.in_end = _arg_str('in_dt_end')
+            self.out_start = _arg_str('out_dt_start')
+            self.out_end = _arg_str('out_dt_end')
+            self.name = _arg_str('name')
+            self.client = ''
+            self.driver = ''
+            self.q_client = _arg_str('q_client')
+            self.c_mgr_name = _arg_str('q_c_mgr_name')
+            self.driver_type = _arg_str('driver_type')
+        # 기사관리의 차량번호 매핑으로 고정/협력사/개별 판별 (정산·통계 동일 기준)
+        self.fixed_c_nums = mem_dir.fixed_c_nums
+        self.hyup_c_nums = mem_dir.hyup_c_nums
+        self.gae_c_nums = mem_dir.gae_c_nums
+
+    def _name_id(self):
+        """name 검색어가 오더고유번호(n01) 또는 숫자면 id 값 반환."""
+        name_part = self.name
+        num_str = None
+        if name_part.lower().startswith('n'):
+            num_str = name_part[1:].lstrip('0') or '0'
+        elif name_part.isdigit():
+            num_str = name_part
+        if num_str is not None and num_str.isdigit():
+            try:
+                return int(num_str)
+            except (ValueError, TypeError):
+                pass
+        return None
+
+    def where_sql(self):
+        """(' WHERE ...' 또는 '', params) — 인덱스로 거를 수 있는 조건만."""
+        conditions = []
+        params = []
+        # 날짜 범위: 정규화 컬럼(dispatch_day 등) 인덱스 범위 스캔. 오더일은 원문 비교도 함께(시간 포함 데이터 호환)
+        for col, qs, qe in (('dispatch_day', self.start, self.end), ('in_day', self.in_start, self.in_end),
+                            ('out_day', self.out_start, self.out_end)):
+            if qs:
+                conditions.append(f"{col} >= ?")
+                params.append(qs)
+            if qe:
+                conditions.append(f"{col} <= ?")
+                params.append(qe)
+        if self.order_start:
+            conditions.append("order_day >= substr(?,1,10) AND order_dt >= ?")
+            params.extend([self.order_start, self.order_start])
+        if self.order_end:
+            conditions.append("order_day <= ? AND order_dt <= ?")
+            params.extend([self.order_end, self.order_end])
+        if self.name:
+            like_part = "(client_name LIKE ? OR tax_biz_name LIKE ? OR d_name LIKE ?)"
+            like_params = [f"%{self.name}%"] * 3
+            id_val = self._name_id()
+            if id_val is not None:
+                conditions.append("(" + like_part + " OR id = ?)")
+                params.extend(like_params + [id_val])
+            else:
+                conditions.append(like_part)
+                params.extend(like_params)
+        for col, q in (('client_name', self.client), ('tax_biz_name', self.vendor), ('d_name', self.driver),
+                       ('c_num', self.c_num), ('c_mgr_name', self.c_mgr_name), ('in_name', self.q_in_name)):
+            if q:
+                conditions.append(f"COALESCE({col},'') LIKE ?")
+                params.append(f"%{q}%")
+        for col, flag in (('pay_method_client', self.filter_pay_client), ('pay_method_driver', self.filter_pay_driver)):
+            if flag == '1':
+                conditions.append(f"TRIM(COALESCE({col},'')) = '현금'")
+            elif flag == '0':
+                conditions.append(f"TRIM(COALESCE({col},'')) != '현금'")
+        for col, on, off in (('month_end_client', self.month_client, self.not_month_end_client),
+                             ('month_end_driver', self.month_driver, self.not_month_end_driver)):
+            if on:
+                conditions.append(f"TRIM(COALESCE({col},'')) IN ('1','Y')")
+            if off:
+                conditions.append(f"TRIM(COALESCE({col},'')) NOT IN ('1','Y')")
+        if self.scope == 'statistics':
+            self._sql_append_tags_any(conditions, params)
+        else:
+            _sql_append_tax_biz2(conditions, params, self.tb2_tags, '' if self.tb2_tags else self.tax_biz2)
+            _sql_append_biz_issue_tags(conditions, params, self.sb2_tags, '' if self.sb2_tags else self.biz_issue)
+        self._sql_append_status(conditions, params)
+        if not conditions:
+            return "", params
+        return " WHERE " + " AND ".join(conditions), params
+
+    def _sql_append_tags_any(self, conditions, params):
+        """통계용 사업자구분 체크: 태그 중 하나라도 포함(OR). 태그가 없으면 레거시 부분일치."""
+        if self.tb2_tags:
+            sub = []
+            for t in self.tb2_tags:
+                for a in TAX_BIZ2_TAG_ALIASES.get(t, (t,)):
+                    sub.append("COALESCE(tax_biz2,'') LIKE ?")
+                    params.append(f"%{a}%")
+            conditions.append("(" + " OR ".join(sub) + ")")
+        else:
+            _sql_append_tax_biz2(conditions, params, [], self.tax_biz2)
+        if self.sb2_tags:
+            sub = []
+            for t in self.sb2_tags:
+                for a in TAX_BIZ2_TAG_ALIASES.get(t, (t,)):
+                    sub.append("(COALESCE(pay_to,'') LIKE ? OR COALESCE(biz_issue,'') LIKE ?)")
+                    params.extend([f"%{a}%", f"%{a}%"])
+            conditions.append("(" + " OR ".join(sub) + ")")
+        else:
+            _append_ledger_q_biz_issue_sql(conditions, params, self.biz_issue)
+
+    def _c_num_set_for(self, label):
+        return {'고정': self.fixed_c_nums, '협력사': self.hyup_c_nums, '개별': self.gae_c_nums}.get(label)
+
+    def _sql_append_status(self, conditions, params):
+        """상태 필터: 저장된 수금·지급 상태 컬럼(인덱스)과 날짜 유무, 기사구분은 차량번호 목록으로."""
+        st = self.status
+        if st == 'misu_all':
+            conditions.append("COALESCE(in_dt,'') = ''")
+        elif st == 'pay_all':
+            conditions.append("COALESCE(out_dt,'') = ''")
+        elif st == 'done_in':
+            conditions.append("COALESCE(in_dt,'') != ''")
+        elif st == 'done_out':
+            conditions.append("COALESCE(out_dt,'') != ''")
+        elif st in ('misu_only', 'cond_misu'):
+            conditions.append("misu_status = ?")
+            params.append('미수' if st == 'misu_only' else '조건부미수금')
+        elif st in ('pay_only', 'cond_pay'):
+            conditions.append("pay_status = ?")
+            params.append('미지급' if st == 'pay_only' else '조건부미지급')
+        elif st in ('tax_issued', 'tax_not_issued'):
+            tax_ok_sql = "(TRIM(COALESCE(tax_dt,'')) != '' OR TRIM(COALESCE(tax_chk,'')) = '발행완료')"
+            conditions.append(tax_ok_sql if st == 'tax_issued' else f"NOT {tax_ok_sql}")
+        elif st in ('issue_done', 'issue_not_done'):
+            conditions.append("TRIM(COALESCE(issue_dt,'')) != ''" if st == 'issue_done' else "TRIM(COALESCE(issue_dt,'')) = ''")
+        # 기사구분(고정/협력사/개별·직영/일반): 기사관리 차량번호 목록으로 IN / NOT IN
+        include = exclude = None
+        if st in ('고정', '협력사', '개별'):
+            include = self._c_num_set_for(st)
+        elif self.scope == 'statistics' and st == '직영':
+            include = self.fixed_c_nums
+        elif self.scope == 'statistics' and st == '일반':
+            exclude = self.fixed_c_nums
+        if self.driver_type in ('고정', '협력사', '개별'):
+            include = self._c_num_set_for(self.driver_type) if include is None else (include & self._c_num_set_for(self.driver_type))
+        elif self.driver_type in ('non_fixed', '고정아닌것', '고정아님'):
+            exclude = self.fixed_c_nums if exclude is None else (exclude | self.fixed_c_nums)
+        if include is not None:
+            if not include:
+                conditions.append("0")
+            else:
+                conditions.append(f"TRIM(COALESCE(c_num,'')) IN ({', '.join(['?'] * len(include))})")
+                params.extend(sorted(include))
+        if exclude:
+            conditions.append(f"TRIM(COALESCE(c_num,'')) NOT IN ({', '.join(['?'] * len(exclude))})")
+            params.extend(sorted(exclude))
+
+    def _name_matches(self, r):
+        """이름 필터 (매입처/매출결제처명·업체/기사명 + 오더고유번호 n01, n02 또는 숫자만 01, 12 등)."""
+        q = self.name.lower()
+        in_client = q in str(r.get('client_name') or '').lower()
+        in_vendor = q in str(r.get('tax_biz_name') or '').lower()
+        in_driver = q in str(r.get('d_name') or '').lower()
+        order_no = ('n' + str(r.get('id')).zfill(2)).lower()
+        match_order = (q == order_no or q in order_no or order_no in q)
+        match_id = False
+        if q.isdigit():
+            try:
+                match_id = (r.get('id') == int(q))
+            except (ValueError, TypeError):
+                pass
+        return in_client or in_vendor or in_driver or match_order or match_id
 
-        # 업체현금/기사현금 필터 (현금확인=현금, 발행=이체)
-        if q_filter_pay_client == '1' and (str(r.get('pay_method_client') or '').strip() != '현금'):
-            continue
-        if q_filter_pay_client == '0' and (str(r.get('pay_method_client') or '').strip() == '현금'):
-            continue
-        if q_filter_pay_driver == '1' and (str(r.get('pay_method_driver') or '').strip() != '현금'):
-            continue
-        if q_filter_pay_driver == '0' and (str(r.get('pay_method_driver') or '').strip() == '현금'):
-            continue
+    def matches(self, r):
+        """SQL로 거른 행에 대한 잔여 조건. r은 misu_status·pay_status가 채워진 dict."""
+        if not _dispatch_in_settlement_range(r.get('dispatch_dt'), self.start, self.end):
+            return False
+        if not _order_in_settlement_range(r.get('order_dt'), self.order_start, self.order_end):
+            return False
+        if not _ledger_yyyymmdd_in_range(r.get('in_dt'), self.in_start, self.in_end):
+            return False
+        if not _ledger_yyyymmdd_in_range(r.get('out_dt'), self.out_start, self.out_end):
+            return False
+        if self.name and not self._name_matches(r):
+            return False
+        for col, q in (('client_name', self.client), ('tax_biz_name', self.vendor), ('d_name', self.driver),
+                       ('c_num', self.c_num), ('c_mgr_name', self.c_mgr_name)):
+            if q and q.lower() not in str(r.get(col) or '').lower():
+                return False
+        if self.scope == 'statistics':
+            if not _row_matches_biz_issue_combined_any(r, self.sb2_tags, self.biz_issue):
+                return False
+            if not _row_matches_tax_biz2_combined_any(r, self.tb2_tags, self.tax_biz2):
+                return False
+        else:
+            if not _row_matches_tax_biz2_combined(r, self.tb2_tags, self.tax_biz2):
+                return False
+            if not _row_matches_biz_issue_combined(r, self.sb2_tags, self.biz_issue):
+                return False
+            # 매출사업자구분 체크(흥진/에스엠/스퀘어): biz_issue 부분일치 누수 방지 위해 pay_to 토큰으로 UI와 동일하게 재확인
+            if not _row_matches_sb2_pay_to_tokens(r, self.sb2_tags):
+                return False
+        for col, flag in (('pay_method_client', self.filter_pay_client), ('pay_method_driver', self.filter_pay_driver)):
+            is_cash = str(r.get(col) or '').strip() == '현금'
+            if (flag == '1' and not is_cash) or (flag == '0' and is_cash):
+                return False
+        if not _row_matches_month_end_ledger_filters(r, self.month_client, self.month_driver, self.not_month_end_client, self.not_month_end_driver):
+            return False
+        # 금액·매출처·입금자명·전화번호 별도 검색
+        if not _row_matches_extra_filters(r, self.q_amount, self.q_client, self.q_in_name, self.q_phone):
+            return False
+        c_num = str(r.get('c_num') or '').strip()
+        if self.driver_type:
+            if self.driver_type in ('고정', '협력사', '개별') and c_num not in self._c_num_set_for(self.driver_type):
+                return False
+            if self.driver_type in ('non_fixed', '고정아닌것', '고정아님') and c_num in self.fixed_c_nums:
+                return False
+        st = self.status
+        if st:
+            in_dt = r.get('in_dt')
+            out_dt = r.get('out_dt')
+            tax_ok = bool((r.get('tax_dt') or '').strip()) or _norm_tax_chk(r.get('tax_chk'))
+            issue_ok = bool((r.get('issue_dt') or '').strip())
+            if st == 'misu_all' and in_dt: return False
+            if st == 'pay_all' and out_dt: return False
+            if st == 'misu_only' and r.get('misu_status') != '미수': return False
+            if st == 'cond_misu' and r.get('misu_status') != '조건부미수금': return False
+            if st == 'pay_only' and r.get('pay_status') != '미지급': return False
+            if st == 'cond_pay' and r.get('pay_status') != '조건부미지급': return False
+            if st == 'done_in' and not in_dt: return False
+            if st == 'done_out' and not out_dt: return False
+            if st == 'tax_issued' and not tax_ok: return False
+            if st == 'tax_not_issued' and tax_ok: return False
+            if st == 'issue_done' and not issue_ok: return False
+            if st == 'issue_not_done' and issue_ok: return False
+            if st in ('고정', '협력사', '개별') and c_num not in self._c_num_set_for(st): return False
+            if self.scope == 'statistics' and st in ('직영', '일반'):
+                if st != ("직영" if c_num in self.fixed_c_nums else "일반"):
+                    return False
+        return True
 
-        if not _row_matches_month_end_ledger_filters(r, q_month_client, q_month_driver, q_not_month_end_client, q_not_month_end_driver):
-            continue
+    # 통계 롤업(ledger_rollup) 키만으로 표현되는 상태 필터 (수금·지급일 유무, 저장된 수금·지급 상태, 차량번호 목록)
+    ROLLUP_STATUSES = ('', 'misu_all', 'pay_all', 'done_in', 'done_out', 'misu_only', 'cond_misu', 'pay_only', 'cond_pay',
+                       '고정', '협력사', '개별', '직영', '일반')
+
+    def rollup_where_sql(self):
+        """통계 롤업 조회용 (' WHERE ...', params). 자유 검색어·오더일/수금일/지급일 기간·사업자구분 조건이 있으면 None(행 조회).
+        배차일은 day_norm(= 배차일 앞 10자 strip)으로 _dispatch_in_settlement_range와 같은 비교."""
+        if self.scope != 'statistics' or self.status not in self.ROLLUP_STATUSES:
+            return None
+        if any((self.order_start, self.order_end, self.in_start, self.in_end, self.out_start, self.out_end,
+                self.name, self.client, self.vendor, self.driver, self.c_num, self.c_mgr_name,
+                self.q_amount, self.q_in_name, self.q_phone, self.tax_biz2, self.biz_issue, self.tb2_tags, self.sb2_tags)):
+            return None
+        conditions = ["cnt != 0"]
+        params = []
+        if self.start:
+            conditions.append("day_norm != '' AND day_norm >= ?")
+            params.append(self.start)
+        if self.end:
+            conditions.append("day_norm != '' AND day_norm <= ?")
+            params.append(self.end)
+        for col, flag in (('cash_client', self.filter_pay_client), ('cash_driver', self.filter_pay_driver)):
+            if flag in ('1', '0'):
+                conditions.append(f"{col} = {int(flag)}")
+        for col, on, off in (('me_client', self.month_client, self.not_month_end_client),
+                             ('me_driver', self.month_driver, self.not_month_end_driver)):
+            if on:
+                conditions.append(f"{col} = 1")
+            if off:
+                conditions.append(f"{col} = 0")
+        st = self.status
+        if st in ('misu_all', 'done_in'):
+            conditions.append("in_flag = 0" if st == 'misu_all' else "in_flag != 0")
+        elif st in ('pay_all', 'done_out'):
+            conditions.append("out_flag = 0" if st == 'pay_all' else "out_flag != 0")
+        elif st in ('misu_only', 'cond_misu'):
+            conditions.append("misu_status = ?")
+            params.append('미수' if st == 'misu_only' else '조건부미수금')
+        elif st in ('pay_only', 'cond_pay'):
+            conditions.append("pay_status = ?")
+            params.append('미지급' if st == 'pay_only' else '조건부미지급')
+        include = exclude = None
+        if st in ('고정', '협력사', '개별'):
+            include = self._c_num_set_for(st)
+        elif st == '직영':
+            include = self.fixed_c_nums
+        elif st == '일반':
+            exclude = self.fixed_c_nums
+        if include is not None:
+            if not include:
+                conditions.append("0")
+            else:
+                conditions.append(f"c_num IN ({', '.join(['?'] * len(include))})")
+                params.extend(sorted(include))
+        if exclude:
+            conditions.append(f"c_num NOT IN ({', '.join(['?'] * len(exclude))})")
+            params.extend(sorted(exclude))
+        return " WHERE " + " AND ".join(conditions), params
+
+    @_perf_phase('query')
+    def fetch(self, ids=None):
+        """WHERE로 거른 행을 배차일↓·id↓ 순으로 읽어 잔여 조건까지 통과한 dict 목록 반환.
+        각 행의 misu_status·pay_status는 저장값(없으면 즉시 계산)으로 채움. ids: 주어진 id 중에서만 조회."""
+        # 저장된 수금·지급 상태를 쓰므로 날짜가 바뀐 뒤 첫 조회 시 시간 경과 규칙 반영
+        _ledger_status_sweep()
+        where, params = self.where_sql()
+        if ids is not None:
+            where += (" AND " if where else " WHERE ") + "id IN (SELECT value FROM json_each(?))"
+            params = list(params) + [json.dumps([int(i) for i in ids])]
+        conn = connect_ledger()
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute("SELECT * FROM ledger" + where + self.ORDER_BY, params).fetchall()
+        finally:
+            conn.close()
+        _export_job_progress(scanned=len(rows))
+        _perf_mark('filter')
+        today_naive = now_kst().replace(tzinfo=None)  # naive용 비교 (DB 날짜는 timezone 없음)
+        result = []
+        for row in rows:
+            r = dict(row)  # KeyError 방지: 구 스키마에 없는 컬럼은 .get()으로 접근
+            if not r.get('misu_status') or not r.get('pay_status'):
+                r['misu_status'], r['pay_status'] = _ledger_status_values(r, today_naive)
+            if self.matches(r):
+                result.append(r)
+        return result
+
+    def cache_key(self):
+        """조회 결과 캐시용 정규화 조건 — 값이 같으면 같은 장부·기사관리 상태에서 fetch() 결과가 같음"""
+        return tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in sorted(vars(self).items())
+                     if k not in ('fixed_c_nums', 'hyup_c_nums', 'gae_c_nums'))
+
+
+# 정산·통계 조회 결과 캐시 (워커별 메모리 LRU). 키 = (조회 종류, 정규화 조건, 데이터 버전)
+# 데이터 버전 = DB 파일·장부 세대번호(ledger_gen)·기사·업체 세대번호(dir_gen)·수금/지급 상태 기준일 —
+# 장부 쓰기는 트리거가 ledger_gen을 올리므로 다른 워커의 변경도 다음 조회에서 키가 바뀌어 다시 계산됨.
+LEDGER_RESULT_CACHE_MAX_ENTRIES = 32
+LEDGER_RESULT_CACHE_MAX_ROWS = 200000   # 캐시에 들고 있는 조회 행 수 합계 상한
+
+
+class LedgerResultCache:
+    """크기 제한 LRU — 항목 수(max_entries)·행 수 합계(max_rows)를 넘으면 가장 오래 안 쓴 항목부터 제거.
+    저장한 결과는 여러 요청이 같은 객체를 공유하므로 호출 측은 읽기 전용으로 사용."""
+
+    def __init__(self, max_entries=LEDGER_RESULT_CACHE_MAX_ENTRIES, max_rows=LEDGER_RESULT_CACHE_MAX_ROWS):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._items = OrderedDict()   # key → (value, rows)
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, rows=0):
+        if rows > self.max_rows:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._rows -= old[1]
+            self._items[key] = (value, rows)
+            self._rows += rows
+            while len(self._items) > self.max_entries or self._rows > self.max_rows:
+                _, (_, n) = self._items.popitem(last=False)
+                self._rows -= n
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._rows = 0
+
+
+ledger_result_cache = LedgerResultCache()
+
+
+def _ledger_data_version():
+    """조회 결과 캐시용 데이터 버전 (읽기 실패 시 None → 캐시 사용 안 함).
+    날짜가 바뀐 첫 조회의 상태 일괄 재계산(_ledger_status_sweep)을 먼저 실행해 그 변경도 세대번호에 반영."""
+    _ledger_status_sweep()
+    try:
+        conn = connect_ledger()
+        try:
+            gen = _ledger_gen(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[ledger_data_version error] {e}")
+        return None
+    return (_ledger_pool_key(get_ledger_db_path()), gen, mem_dir.version, now_kst().strftime('%Y-%m-%d'))
+
+
+def _ledger_cached(kind, lq, compute, size=len):
+    """(kind, lq 조건) 조회 결과를 캐시에서 반환, 없으면 compute() 결과를 저장 후 반환.
+    size(결과) = 캐시 행 수 합계에 더할 크기. 반환값은 캐시와 공유되므로 수정하지 말 것."""
+    version = _ledger_data_version()
+    if version is None:
+        return compute()
+    key = (kind, lq.cache_key(), version)
+    result = ledger_result_cache.get(key)
+    if result is None:
+        result = compute()
+        ledger_result_cache.put(key, result, size(result))
+    return result
+
+
+def _settlement_filtered_rows_from_request(req, ids=None):
+    """정산관리 settlement()·export_settlement_excel·export_tax_not_issued 공통 GET 쿼리·SQL·Python 필터로 행 목록 반환.
+    ids: 주어진 id 중 조건에 맞는 행만 (행 단위 갱신용)."""
+    filtered_rows = LedgerQuery(req.args, 'settlement').fetch(ids=ids)
+    for r in filtered_rows:
+        r['m_st'] = r['misu_status']; r['m_cl'] = MISU_STATUS_COLOR.get(r['misu_status'], "bg-blue")
+        r['p_st'] = r['pay_status']; r['p_cl'] = PAY_STATUS_COLOR.get(r['pay_status'], "bg-blue")
+    return filtered_rows
 
-        # 금액·매출처·입금자명·전화번호 별도 검색
-        if not _row_matches_extra_filters(r, q_amount, q_client, q_in_name, q_phone):
-            continue
 
-        # 기사구분(고정/협력사/개별) 전용 필터
-        if q_driver_type:
-            c_num = str(r.get('c_num', '')).strip()
-            if q_driver_type == '고정' and c_num not in fixed_c_nums:
-                continue
-            if q_driver_type in ('non_fixed', '고정아닌것', '고정아님') and c_num in fixed_c_nums:
-                continue
-            if q_driver_type == '협력사' and c_num not in hyup_c_nums:
-                continue
-            if q_driver_type == '개별' and c_num not in gae_c_nums:
-                continue
+SETTLEMENT_ROWS_MAX_IDS = 500
 
-        # 매출처 계산서·공급자계산서 발행 여부 (필터용)
-        _tax_dt_val = (r.get('tax_dt') or '').strip() if r.get('tax_dt') else ''
-        _tax_ok = bool(_tax_dt_val) or _norm_tax_chk(r.get('tax_chk'))
-        _issue_dt_val = (r.get('issue_dt') or '').strip() if r.get('issue_dt') else ''
-        _issue_ok = bool(_issue_dt_val)
 
-        # 상태 필터
-        if qs_stat:
-            if qs_stat == 'misu_all' and in_dt:
-                continue
-            if qs_stat == 'pay_all' and out_dt:
-                continue
-            if qs_stat == 'misu_only' and misu_status != '미수':
-                continue
-            if qs_stat == 'cond_misu' and misu_status != '조건부미수금':
-                continue
-            if qs_stat == 'pay_only' and pay_status != '미지급':
-                continue
-            if qs_stat == 'cond_pay' and pay_status != '조건부미지급':
-                continue
-            if qs_stat == 'done_in' and not in_dt:
-                continue
-            if qs_stat == 'done_out' and not out_dt:
-                continue
-            if qs_stat == 'tax_issued' and not _tax_ok:
-                continue  # 매출처계산서 발급확인
-            if qs_stat == 'tax_not_issued' and _tax_ok:
-                continue  # 매출처계산서 미발행
-            if qs_stat == 'issue_done' and not _issue_ok:
-                continue # 공급자계산서발행일 확인완료
-            if qs_stat == 'issue_not_done' and _issue_ok:
-                continue # 공급자계산서발행일 미발행
-            c_num = str(r.get('c_num', '')).strip()
-            if qs_stat == '고정' and c_num not in fixed_c_nums:
-                continue
-            if qs_stat == '협력사' and c_num not in hyup_c_nums:
-                continue
-            if qs_stat == '개별' and c_num not in gae_c_nums:
-                continue
+@app.route('/api/settlement_rows')
+@login_required
+def settlement_rows():
+    """정산관리 표 행 단위 갱신 — 현재 검색 조건(쿼리 그대로) + ids=1,2,3.
+
+    totals: 화면 총합계 블록의 data-sums(건수+합계), prev: 바뀌기 전 해당 행들의 data-sums 합(건수 포함).
+    반환 rows: {id: <tr> HTML 또는 null(검색 조건에서 빠진 행)}, totals_html: totals − prev + 바뀐 행 합계로 만든 총합계 블록
+    (totals/prev가 없거나 형식이 맞지 않으면 null → 화면에서 표 전체 다시 읽기)."""
+    ids = []
+    for tok in str(request.args.get('ids') or '').split(','):
+        tok = tok.strip()
+        if tok.isdigit() and int(tok) > 0:
+            ids.append(int(tok))
+    if not ids:
+        return jsonify({"status": "error", "message": "ids가 없습니다."}), 400
+    if len(ids) > SETTLEMENT_ROWS_MAX_IDS:
+        return jsonify({"status": "error", "message": f"한 번에 최대 {SETTLEMENT_ROWS_MAX_IDS}건까지 조회할 수 있습니다."}), 400
+    rows = _settlement_filtered_rows_from_request(request, ids=ids)
+    today = now_kst()
+    by_id = {r['id']: r for r in rows}
+    out_rows = {str(i): (_settlement_row_html(by_id[i], today) if i in by_id else None) for i in ids}
 
-        row_data = r
-        row_data['m_st'] = misu_status; row_data['m_cl'] = misu_color
-        row_data['p_st'] = pay_status; row_data['p_cl'] = pay_color
-        filtered_rows.append(row_data)
+    def _nums(name):
+        try:
+            vals = [int(float(x)) for x in str(request.args.get(name) or '').split(',')]
+        except (ValueError, OverflowError):  # 숫자 아님·nan / inf
+            return None
+        return vals if len(vals) == len(SETTLEMENT_SUM_KEYS) + 1 else None
 
-    return filtered_rows
+    totals, prev = _nums('totals'), _nums('prev')
+    totals_html = None
+    if totals is not None and prev is not None:
+        new = [len(rows)] + _settlement_sums(rows)
+        cur = [t - p + n for t, p, n in zip(totals, prev, new)]
+        totals_html = _settlement_totals_html(cur[0], cur[1:])
+    return jsonify({"status": "success", "rows": out_rows, "totals_html": totals_html})
 
 
 @app.route('/export_settlement_excel')
@@ -3815,11 +5854,12 @@ def export_settlement_excel():
             '매출처인수증 사진': str(r.get('ship_img') or '').strip(),
         })
 
+    _perf_mark('serialize')
     df = pd.DataFrame(excel_rows, columns=export_cols)
 
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df.to_excel(w, index=False, sheet_name='정산관리')
+        _export_df_excel(w, df, index=False, sheet_name='정산관리')
     out.seek(0)
 
     fname = f"정산관리_검색결과_{now_kst().strftime('%Y%m%d_%H%M')}.xlsx"
@@ -3840,130 +5880,153 @@ def _statistics_date_range(period_months, today):
 
 def _statistics_filtered_rows_from_request(req):
     """통계 페이지와 동일한 조회 조건으로 ledger 행을 필터링하고 계산 컬럼을 채워 반환."""
-    q_start = req.args.get('start', '').strip()
-    q_end = req.args.get('end', '').strip()
-    q_order_start = req.args.get('order_start', '').strip()
-    q_order_end = req.args.get('order_end', '').strip()
-    q_client = req.args.get('client', '').strip()
-    q_vendor = req.args.get('vendor', '').strip()
-    q_driver = req.args.get('driver', '').strip()
-    q_c_num = req.args.get('c_num', '').strip()
-    q_status = req.args.get('status', '')
-    q_month_client = req.args.get('month_end_client', '')
-    q_month_driver = req.args.get('month_end_driver', '')
-    q_not_month_end_client = req.args.get('not_month_end_client', '').strip()
-    q_not_month_end_driver = req.args.get('not_month_end_driver', '').strip()
-    q_filter_pay_client = req.args.get('filter_pay_client', '').strip()
-    q_filter_pay_driver = req.args.get('filter_pay_driver', '').strip()
-    q_in_start = req.args.get('in_start', '').strip()
-    q_in_end = req.args.get('in_end', '').strip()
-    q_out_start = req.args.get('out_start', '').strip()
-    q_out_end = req.args.get('out_end', '').strip()
-    q_biz_issue = req.args.get('q_biz_issue', '').strip()
-    q_tax_biz2 = req.args.get('q_tax_biz2', '').strip()
-    q_tb2_tags = _tax_biz2_tags_from_args(
-        req.args.get('tb2_hj'), req.args.get('tb2_sm'), req.args.get('tb2_sq'),
-    )
-    q_sb2_tags = _tax_biz2_tags_from_args(
-        req.args.get('sb2_hj'), req.args.get('sb2_sm'), req.args.get('sb2_sq'),
-    )
-    q_amount = req.args.get('q_amount', '').strip()
-    q_in_name = req.args.get('q_in_name', '').strip()
-    q_phone = req.args.get('q_phone', '').strip()
-
-    conn = connect_ledger()
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM ledger ORDER BY CASE WHEN dispatch_dt IS NULL OR dispatch_dt = '' THEN 1 ELSE 0 END, dispatch_dt DESC, id DESC").fetchall()
-    conn.close()
-
-    today = now_kst()
-    today_naive = today.replace(tzinfo=None) if getattr(today, 'tzinfo', None) else today
-    fixed_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '고정'}
-    hyup_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '협력사'}
-    gae_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '개별'}
-    fixed_c_nums.discard('')
-    hyup_c_nums.discard('')
-    gae_c_nums.discard('')
-
-    filtered_rows = []
-    for row in rows:
-        r = dict(row)
-        order_dt = r.get('order_dt') or ""
-        dispatch_dt_val = (r.get('dispatch_dt') or '')[:10] if r.get('dispatch_dt') else ''
-        if not _dispatch_in_settlement_range(dispatch_dt_val, q_start, q_end): continue
-        if not _order_in_settlement_range(order_dt, q_order_start, q_order_end): continue
-        if q_client and q_client.lower() not in str(r.get('client_name', '') or '').lower(): continue
-        if q_vendor and q_vendor.lower() not in str(r.get('tax_biz_name', '') or '').lower(): continue
-        if q_driver and q_driver.lower() not in str(r.get('d_name', '') or '').lower(): continue
-        if q_c_num and q_c_num.lower() not in str(r.get('c_num', '') or '').lower(): continue
-        if q_month_client and (str(r.get('month_end_client') or '').strip() not in ('1', 'Y')): continue
-        if q_month_driver and (str(r.get('month_end_driver') or '').strip() not in ('1', 'Y')): continue
-        if q_not_month_end_client and (str(r.get('month_end_client') or '').strip() in ('1', 'Y')): continue
-        if q_not_month_end_driver and (str(r.get('month_end_driver') or '').strip() in ('1', 'Y')): continue
-        if q_filter_pay_client == '1' and (str(r.get('pay_method_client') or '').strip() != '현금'): continue
-        if q_filter_pay_client == '0' and (str(r.get('pay_method_client') or '').strip() == '현금'): continue
-        if q_filter_pay_driver == '1' and (str(r.get('pay_method_driver') or '').strip() != '현금'): continue
-        if q_filter_pay_driver == '0' and (str(r.get('pay_method_driver') or '').strip() == '현금'): continue
-        if not _row_matches_extra_filters(r, q_amount, q_client, q_in_name, q_phone): continue
-        if not _row_matches_biz_issue_combined_any(r, q_sb2_tags, q_biz_issue): continue
-        if not _row_matches_tax_biz2_combined_any(r, q_tb2_tags, q_tax_biz2): continue
-
-        in_dt = r.get('in_dt')
-        out_dt = r.get('out_dt')
-        misu_status, _ = _misu_status_for_settlement_row(r, today_naive)
-        m_st = "조건부미수" if misu_status == "조건부미수금" else misu_status
-        p_st = _pay_status_from_row(r)
-        c_num = str(r.get('c_num', '')).strip()
-        d_type = "직영" if c_num in fixed_c_nums else "일반"
-
-        qs_stat = _normalize_settlement_status_param(q_status)
-        if qs_stat:
-            _tax_dt_val = (r.get('tax_dt') or '').strip() if r.get('tax_dt') else ''
-            _tax_ok = bool(_tax_dt_val) or _norm_tax_chk(r.get('tax_chk'))
-            _issue_dt_val = (r.get('issue_dt') or '').strip() if r.get('issue_dt') else ''
-            _issue_ok = bool(_issue_dt_val)
-            if qs_stat == 'misu_all' and in_dt: continue
-            if qs_stat == 'pay_all' and out_dt: continue
-            if qs_stat == 'misu_only' and misu_status != '미수': continue
-            if qs_stat == 'cond_misu' and misu_status != '조건부미수금': continue
-            if qs_stat == 'pay_only' and p_st != '미지급': continue
-            if qs_stat == 'cond_pay' and p_st != '조건부미지급': continue
-            if qs_stat == 'done_in' and not in_dt: continue
-            if qs_stat == 'done_out' and not out_dt: continue
-            if qs_stat == 'tax_issued' and not _tax_ok: continue
-            if qs_stat == 'tax_not_issued' and _tax_ok: continue
-            if qs_stat == 'issue_done' and not _issue_ok: continue
-            if qs_stat == 'issue_not_done' and _issue_ok: continue
-            if qs_stat == '고정' and c_num not in fixed_c_nums: continue
-            if qs_stat == '협력사' and c_num not in hyup_c_nums: continue
-            if qs_stat == '개별' and c_num not in gae_c_nums: continue
-            if qs_stat in ('직영', '일반') and qs_stat != d_type: continue
-
-        if q_in_start or q_in_end:
-            in_dt_val = (in_dt or '')[:10] if in_dt else ''
-            if not in_dt_val: continue
-            if q_in_start and in_dt_val < q_in_start: continue
-            if q_in_end and in_dt_val > q_in_end: continue
-        if q_out_start or q_out_end:
-            out_dt_val = (out_dt or '')[:10] if out_dt else ''
-            if not out_dt_val: continue
-            if q_out_start and out_dt_val < q_out_start: continue
-            if q_out_end and out_dt_val > q_out_end: continue
-
-        r['m_st'] = m_st
-        r['p_st'] = p_st
-        r['d_type'] = d_type
-        supply_val, vat1, total1, fo, vat2, total2 = calc_totals_with_vat(r)
+    lq = LedgerQuery(req.args, 'statistics')
+    filtered_rows = lq.fetch()
+    # 금액(calc_totals_with_vat와 동일)은 컬럼 배열로 한 번에 계산 후 행에 채움
+    totals = _ledger_totals_columns(filtered_rows)
+    amounts = zip(*(totals[c].tolist() for c in ('supply', 'vat1', 'total1', 'fee_out', 'vat2', 'total2')))
+    for r, (supply_val, vat1, total1, fo, vat2, total2) in zip(filtered_rows, amounts):
+        r['m_st'] = "조건부미수" if r['misu_status'] == "조건부미수금" else r['misu_status']
+        r['p_st'] = r['pay_status']
+        r['d_type'] = "직영" if str(r.get('c_num') or '').strip() in lq.fixed_c_nums else "일반"
         r['fee'] = supply_val
         r['vat1'] = vat1
         r['total1'] = total1
         r['fee_out'] = fo
         r['vat2'] = vat2
         r['total2'] = total2
-        filtered_rows.append(r)
     return filtered_rows
 
 
+STATISTICS_MONTH_KEYS = ('cnt', 'fee', 'pre_post', 'vat1', 'total1', 'fee_out', 'vat2', 'total2')
+STATISTICS_DAILY_KEYS = ('mm_t1', 'mn_t1', 'mt_t1', 'pm_t2', 'pn_t2', 'pt_t2')
+
+
+def _statistics_aggregates_new():
+    """빈 통계 집계 dict (count·by_month·daily·by_client·by_vendor)"""
+    return {
+        'count': 0,
+        'by_month': defaultdict(lambda: dict.fromkeys(STATISTICS_MONTH_KEYS, 0)),
+        'daily': defaultdict(lambda: dict.fromkeys(STATISTICS_DAILY_KEYS, 0)),
+        'by_client': defaultdict(lambda: dict.fromkeys(('cnt', 'fee', 'vat1', 'total1'), 0)),
+        'by_vendor': defaultdict(lambda: dict.fromkeys(('cnt', 'fee_out', 'vat2', 'total2'), 0)),
+    }
+
+
+def _statistics_aggregates_add(agg, day, client, vendor, me_d, in_flag, out_flag, cnt, v):
+    """집계 1건(롤업 그룹) 반영. v: fee(공급가액)·pre_post·vat1·total1·fee_out·vat2·total2 합.
+    in_flag/out_flag: 0=값 없음, 1=공백만, 2=날짜 있음 — 일별 미수·미지급은 공백만인 날짜도 미수/미지급."""
+    agg['count'] += cnt
+    b = agg['by_month'][day[:7] if day else '']
+    b['cnt'] += cnt
+    for k in STATISTICS_MONTH_KEYS[1:]:
+        b[k] += v[k]
+    if day:
+        if in_flag < 2:
+            b = agg['daily'][day]
+            b['mt_t1'] += v['total1']
+            b['mm_t1' if me_d else 'mn_t1'] += v['total1']
+        if out_flag < 2:
+            b = agg['daily'][day]
+            b['pt_t2'] += v['total2']
+            b['pm_t2' if me_d else 'pn_t2'] += v['total2']
+    c = agg['by_client'][client]
+    c['cnt'] += cnt
+    for k in ('fee', 'vat1', 'total1'):
+        c[k] += v[k]
+    c = agg['by_vendor'][vendor]
+    c['cnt'] += cnt
+    for k in ('fee_out', 'vat2', 'total2'):
+        c[k] += v[k]
+
+
+@_perf_phase('aggregate')
+def _statistics_aggregates_from_rows(filtered_rows):
+    """통계 집계(건수·배차일 연월별 수익·일별 미수/미지급·매출처/매입처별 합계) — _statistics_filtered_rows_from_request 결과 기준.
+    행을 컬럼 배열(DataFrame)로 옮겨 연월·일자·매출처·매입처별 group-by 합계로 계산 (_statistics_aggregates_add와 같은 규칙)."""
+    agg = _statistics_aggregates_new()
+    if not filtered_rows:
+        return agg
+    keys = ('dispatch_dt', 'client_name', 'tax_biz_name', 'month_end_driver', 'in_dt', 'out_dt', 'pre_post',
+            'fee', 'vat1', 'total1', 'fee_out', 'vat2', 'total2')
+    col = dict(zip(keys, zip(*map(itemgetter(*keys), filtered_rows))))
+
+    def _int_array(values):
+        try:
+            return np.array(values, dtype=np.int64)
+        except (OverflowError, TypeError, ValueError):
+            return np.array([int(v or 0) for v in values], dtype=object)
+
+    pre = _ledger_float_column(col['pre_post'])
+    if np.isfinite(pre).all() and (np.abs(pre) < 2 ** 53).all():
+        pre_post = np.trunc(pre).astype(np.int64)
+    else:
+        pre_post = np.array([int(float(v or 0)) for v in col['pre_post']], dtype=object)
+    day = [v[:10] if v else '' for v in col['dispatch_dt']]
+    df = pd.DataFrame({
+        'day': day,
+        'month': [d[:7] for d in day],
+        'client': [str(v or '') for v in col['client_name']],
+        'vendor': [str(v or '') for v in col['tax_biz_name']],
+        'me_d': _ledger_text_mask(col['month_end_driver'], lambda s: s in ('1', 'Y')),
+        'no_in': _ledger_text_mask(col['in_dt'], lambda s: not s),
+        'no_out': _ledger_text_mask(col['out_dt'], lambda s: not s),
+        'pre_post': pre_post,
+        **{k: _int_array(col[k]) for k in ('fee', 'vat1', 'total1', 'fee_out', 'vat2', 'total2')},
+    })
+    df['cnt'] = 1
+    agg['count'] = len(df)
+
+    def _sum_into(target, by, cols):
+        sums = df.groupby(by, sort=False)[list(cols)].sum()
+        for key, vals in zip(sums.index.tolist(), sums.to_numpy().tolist()):
+            b = target[key]
+            for k, v in zip(cols, vals):
+                b[k] += int(v)
+
+    _sum_into(agg['by_month'], 'month', STATISTICS_MONTH_KEYS)
+    _sum_into(agg['by_client'], 'client', ('cnt', 'fee', 'vat1', 'total1'))
+    _sum_into(agg['by_vendor'], 'vendor', ('cnt', 'fee_out', 'vat2', 'total2'))
+    dated = df[df['day'] != '']
+    for flag, amount, prefix in (('no_in', 'total1', 'm'), ('no_out', 'total2', 'p')):
+        part = dated[dated[flag]]
+        suffix = '_t1' if amount == 'total1' else '_t2'
+        for (d, me_d), v in part.groupby(['day', 'me_d'], sort=False)[amount].sum().items():
+            b = agg['daily'][d]
+            b[prefix + 't' + suffix] += int(v)
+            b[prefix + ('m' if me_d else 'n') + suffix] += int(v)
+    return agg
+
+
+@_perf_phase('aggregate')
+def _statistics_aggregates_from_rollup(lq):
+    """_statistics_aggregates_from_rows와 같은 집계를 통계 롤업(ledger_rollup)에서 계산.
+    조건이 롤업 키로 표현되지 않거나(자유 검색어 등) 저장 상태가 비어 있는 행이 있어 상태 필터를 확정할 수 없으면 None."""
+    where = lq.rollup_where_sql()
+    if where is None:
+        return None
+    where_sql, params = where
+    # 저장된 수금·지급 상태를 쓰므로 행 조회(LedgerQuery.fetch)와 같이 날짜가 바뀐 뒤 첫 조회 시 시간 경과 규칙 반영
+    _ledger_status_sweep()
+    _ledger_derived_sync()
+    group_cols = "day, client_name, vendor, me_driver, in_flag, out_flag"
+    conn = connect_ledger()
+    try:
+        if lq.status in ('misu_only', 'cond_misu', 'pay_only', 'cond_pay') and conn.execute(
+                "SELECT 1 FROM ledger_rollup WHERE cnt != 0 AND (misu_status = '' OR pay_status = '') LIMIT 1").fetchone():
+            return None
+        rows = conn.execute(
+            f"SELECT {group_cols}, SUM(cnt), {', '.join(f'SUM({c})' for c in LEDGER_ROLLUP_SUMS)} "
+            f"FROM ledger_rollup{where_sql} GROUP BY {group_cols}", params).fetchall()
+    finally:
+        conn.close()
+    agg = _statistics_aggregates_new()
+    for day, client, vendor, me_d, in_flag, out_flag, cnt, *sums in rows:
+        v = dict(zip(('fee',) + LEDGER_ROLLUP_SUMS[1:], sums))
+        _statistics_aggregates_add(agg, day, client, vendor, me_d, in_flag, out_flag, cnt, v)
+    return agg
+
+
 @app.route('/statistics')
 @login_required 
 def statistics():
@@ -4001,28 +6064,20 @@ def statistics():
     q_in_name = request.args.get('q_in_name', '').strip()
     q_phone = request.args.get('q_phone', '').strip()
 
-    filtered_rows = _statistics_filtered_rows_from_request(request)
-    fixed_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '고정'}
-    hyup_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '협력사'}
-    gae_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '개별'}
-    fixed_c_nums.discard('')
-    hyup_c_nums.discard('')
-    gae_c_nums.discard('')
+    fixed_c_nums, hyup_c_nums, gae_c_nums = mem_dir.fixed_c_nums, mem_dir.hyup_c_nums, mem_dir.gae_c_nums
 
-    # 배차일 수익통계(연월별): 폼의 상태·매출처·기사·합산발행·입금/지급 변경일 등 전체 조회 조건과 동일(filtered_rows) 기준 집계
-    by_month = defaultdict(lambda: {'cnt': 0, 'fee': 0, 'pre_post': 0, 'vat1': 0, 'total1': 0, 'fee_out': 0, 'vat2': 0, 'total2': 0})
-    for r in filtered_rows:
-        dispatch_dt_val = (r.get('dispatch_dt') or '')[:10] if r.get('dispatch_dt') else ''
-        m = dispatch_dt_val[:7] if dispatch_dt_val else ''
-        pre_i = int(float(r.get('pre_post') or 0))
-        by_month[m]['cnt'] += 1
-        by_month[m]['fee'] += int(r.get('fee') or 0)
-        by_month[m]['pre_post'] += pre_i
-        by_month[m]['vat1'] += int(r.get('vat1') or 0)
-        by_month[m]['total1'] += int(r.get('total1') or 0)
-        by_month[m]['fee_out'] += int(r.get('fee_out') or 0)
-        by_month[m]['vat2'] += int(r.get('vat2') or 0)
-        by_month[m]['total2'] += int(r.get('total2') or 0)
+    # 배차일 수익통계(연월별)·일별 미수/미지급: 폼의 전체 조회 조건과 동일(filtered_rows) 기준 집계.
+    # 이 화면은 정산서·매입처·고정기사·미수확인 표에 행이 어차피 필요하므로 조회한 행에서 바로 집계
+    # (롤업 조회를 더하면 같은 조건을 두 번 계산) — 행 없이 합계만 필요한 경우는 /api/statistics_summary가 롤업 사용
+    def _statistics_result():
+        rows = _statistics_filtered_rows_from_request(request)
+        return rows, _statistics_aggregates_from_rows(rows)
+
+    # 같은 조건·같은 데이터 버전의 재조회는 캐시된 행·집계 사용 (읽기 전용)
+    filtered_rows, stats_agg = _ledger_cached('statistics', LedgerQuery(request.args, 'statistics'), _statistics_result,
+                                              size=lambda res: len(res[0]))
+    _perf_mark('render')
+    by_month = stats_agg['by_month']
     dispatch_revenue_rows_html = ""
     for m in sorted([k for k in by_month.keys() if k], reverse=True):
         v = by_month[m]
@@ -4082,34 +6137,7 @@ def statistics():
         dispatch_revenue_rows_html = "<tr><td colspan=\"12\" style=\"text-align:center; color:#94a3b8;\">배차일 기간(시작~종료)을 선택 후 [데이터 조회]를 눌러 주세요.</td></tr>"
 
     # 일별 미수금·미지급 통계: 배차일 기준 · 미수=매출합계(total1)만 · 미지급=매입합계(total2)만 · 매입처 합산발행 구분
-    daily_misu_pay = defaultdict(lambda: {
-        'mm_t1': 0, 'mn_t1': 0, 'mt_t1': 0,
-        'pm_t2': 0, 'pn_t2': 0, 'pt_t2': 0,
-    })
-    for r in filtered_rows:
-        day = (r.get('dispatch_dt') or '')[:10] if r.get('dispatch_dt') else ''
-        if not day:
-            continue
-        t1 = int(r.get('total1') or 0)
-        t2 = int(r.get('total2') or 0)
-        me_d = str(r.get('month_end_driver') or '').strip() in ('1', 'Y')
-        no_in = not str(r.get('in_dt') or '').strip()
-        no_out = not str(r.get('out_dt') or '').strip()
-        if no_in:
-            b = daily_misu_pay[day]
-            b['mt_t1'] += t1
-            if me_d:
-                b['mm_t1'] += t1
-            else:
-                b['mn_t1'] += t1
-        if no_out:
-            b = daily_misu_pay[day]
-            b['pt_t2'] += t2
-            if me_d:
-                b['pm_t2'] += t2
-            else:
-                b['pn_t2'] += t2
-
+    daily_misu_pay = stats_agg['daily']
     stats_daily_misu_pay_rows = ""
     smm1 = smn1 = smt1 = 0
     spm2 = spn2 = spt2 = 0
@@ -4782,7 +6810,7 @@ def statistics():
                 <div class="stats-filter-actions">
                     <button type="submit" class="btn-save">데이터 조회</button>
                     <button type="button" class="btn-status bg-gray" onclick="resetDispatchRangeTo90('/statistics')">초기화(90일)</button>
-                    <button type="button" onclick="location.href='/export_stats'+window.location.search" class="btn-status bg-green">엑셀 다운로드</button>
+                    <button type="button" onclick="var u='/export_stats'+window.location.search; if(window.startExportJob) window.startExportJob(u); else location.href=u;" class="btn-status bg-green">엑셀 다운로드</button>
                 </div>
             </div>
         </form>
@@ -5163,7 +7191,7 @@ def statistics():
         }}
     </script>
     """
-    resp = make_response(render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(drivers_db), clients_json=json.dumps(clients_db), col_keys="[]"))
+    resp = make_response(render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(mem_dir.drivers), clients_json=json.dumps(mem_dir.clients), col_keys="[]"))
     if q_start and q_end:
         resp.set_cookie('stats_start', q_start, max_age=365*24*60*60)
         resp.set_cookie('stats_end', q_end, max_age=365*24*60*60)
@@ -5173,105 +7201,10 @@ def statistics():
 @login_required
 def statistics_biz_settlement_excel():
     """통계 고정기사 운행내역서 엑셀: 화면 테이블과 동일 컬럼·순서(기사명~지급관련비고) + 하단 총합계액. 매입/매출 사업자구분 체크 다중 선택 시 OR."""
-    q_start = request.args.get('start', '').strip()
-    q_end = request.args.get('end', '').strip()
-    q_client = request.args.get('client', '').strip()
-    q_vendor = request.args.get('vendor', '').strip()
-    q_driver = request.args.get('driver', '').strip()
-    q_c_num = request.args.get('c_num', '').strip()
-    q_status = request.args.get('status', '')
-    q_month_client = request.args.get('month_end_client', '')
-    q_month_driver = request.args.get('month_end_driver', '')
-    q_not_month_end_client = request.args.get('not_month_end_client', '').strip()
-    q_not_month_end_driver = request.args.get('not_month_end_driver', '').strip()
-    q_filter_pay_client = request.args.get('filter_pay_client', '').strip()
-    q_filter_pay_driver = request.args.get('filter_pay_driver', '').strip()
-    q_in_start = request.args.get('in_start', '').strip()
-    q_in_end = request.args.get('in_end', '').strip()
-    q_out_start = request.args.get('out_start', '').strip()
-    q_out_end = request.args.get('out_end', '').strip()
-    q_order_start = request.args.get('order_start', '').strip()
-    q_order_end = request.args.get('order_end', '').strip()
-    q_amount = request.args.get('q_amount', '').strip()
-    q_in_name = request.args.get('q_in_name', '').strip()
-    q_phone = request.args.get('q_phone', '').strip()
-    q_biz_issue = request.args.get('q_biz_issue', '').strip()
-    q_tax_biz2 = request.args.get('q_tax_biz2', '').strip()
-    q_tb2_tags = _tax_biz2_tags_from_args(
-        request.args.get('tb2_hj'), request.args.get('tb2_sm'), request.args.get('tb2_sq'),
-    )
-    q_sb2_tags = _tax_biz2_tags_from_args(
-        request.args.get('sb2_hj'), request.args.get('sb2_sm'), request.args.get('sb2_sq'),
-    )
-    fixed_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '고정'}
-    hyup_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '협력사'}
-    gae_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '개별'}
-    fixed_c_nums.discard(''); hyup_c_nums.discard(''); gae_c_nums.discard('')
-    conn = connect_ledger()
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM ledger").fetchall()
-    conn.close()
     filtered = []
-    for row in rows:
-        r = dict(row)
-        order_dt = r.get('order_dt') or ''
-        dispatch_dt_val = (r.get('dispatch_dt') or '')[:10] if r.get('dispatch_dt') else ''
-        if not _dispatch_in_settlement_range(dispatch_dt_val, q_start, q_end):
-            continue
-        if not _order_in_settlement_range(order_dt, q_order_start, q_order_end):
-            continue
-        if q_client and q_client not in str(r.get('client_name', '')):
-            continue
-        if q_vendor and q_vendor not in str(r.get('tax_biz_name', '')):
-            continue
-        if q_driver and q_driver not in str(r.get('d_name', '')):
-            continue
-        if q_c_num and q_c_num not in str(r.get('c_num', '')):
-            continue
-        if q_month_client and (str(r.get('month_end_client') or '').strip() not in ('1', 'Y')):
-            continue
-        if q_month_driver and (str(r.get('month_end_driver') or '').strip() not in ('1', 'Y')):
-            continue
-        if q_not_month_end_client and (str(r.get('month_end_client') or '').strip() in ('1', 'Y')): continue
-        if q_not_month_end_driver and (str(r.get('month_end_driver') or '').strip() in ('1', 'Y')): continue
-        if q_filter_pay_client == '1' and (str(r.get('pay_method_client') or '').strip() != '현금'): continue
-        if q_filter_pay_client == '0' and (str(r.get('pay_method_client') or '').strip() == '현금'): continue
-        if q_filter_pay_driver == '1' and (str(r.get('pay_method_driver') or '').strip() != '현금'): continue
-        if q_filter_pay_driver == '0' and (str(r.get('pay_method_driver') or '').strip() == '현금'): continue
-        if not _row_matches_extra_filters(r, q_amount, q_client, q_in_name, q_phone): continue
-        if not _row_matches_biz_issue_combined_any(r, q_sb2_tags, q_biz_issue): continue
-        if not _row_matches_tax_biz2_combined_any(r, q_tb2_tags, q_tax_biz2): continue
+    for r in LedgerQuery(request.args, 'statistics').fetch():
         in_dt = r.get('in_dt')
         out_dt = r.get('out_dt')
-        if q_in_start or q_in_end:
-            in_dt_val = (in_dt or '')[:10] if in_dt else ''
-            if not in_dt_val: continue
-            if q_in_start and in_dt_val < q_in_start: continue
-            if q_in_end and in_dt_val > q_in_end: continue
-        if q_out_start or q_out_end:
-            out_dt_val = (out_dt or '')[:10] if out_dt else ''
-            if not out_dt_val: continue
-            if q_out_start and out_dt_val < q_out_start: continue
-            if q_out_end and out_dt_val > q_out_end: continue
-        m_st = "수금완료" if in_dt else ("조건부미수" if not r.get('pre_post') and not r.get('pay_due_dt') else "미수")
-        p_st = _pay_status_from_row(r)
-        c_num = str(r.get('c_num', '')).strip()
-        d_type = "직영" if c_num in fixed_c_nums else "일반"
-        if q_status:
-            if q_status == "misu_all" and m_st not in ("미수", "조건부미수"): continue
-            if q_status == "pay_all" and p_st not in ("미지급", "조건부미지급"): continue
-            if q_status in ["미수", "조건부미수", "수금완료"] and q_status != m_st:
-                continue
-            if q_status in ["미지급", "조건부미지급", "지급완료"] and q_status != p_st:
-                continue
-            if q_status == "고정" and c_num not in fixed_c_nums:
-                continue
-            if q_status == "협력사" and c_num not in hyup_c_nums:
-                continue
-            if q_status == "개별" and c_num not in gae_c_nums:
-                continue
-            if q_status in ["직영", "일반"] and q_status != d_type:
-                continue
         fee_out, vat2, total2 = calc_totals_with_vat(r)[3:6]
         dispatch_dt = str(r.get('dispatch_dt', '') or '')[:19] if r.get('dispatch_dt') else ''
         pay_memo_val = _ledger_driver_pay_memo_str(r)
@@ -5338,7 +7271,7 @@ def statistics_biz_settlement_excel():
         df = pd.DataFrame(columns=excel_cols)
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df.to_excel(w, index=False, sheet_name='고정기사 운행내역서')
+        _export_df_excel(w, df, index=False, sheet_name='고정기사 운행내역서')
     out.seek(0)
     fname = f"고정기사_운행내역서_{now_kst().strftime('%Y%m%d_%H%M')}.xlsx"
     return send_file(out, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name=fname)
@@ -5346,63 +7279,11 @@ def statistics_biz_settlement_excel():
 @app.route('/export_custom_settlement')
 @login_required 
 def export_custom_settlement():
-    t = request.args.get('type', 'client'); s = request.args.get('start',''); e = request.args.get('end','')
-    c = request.args.get('client',''); d = request.args.get('driver',''); st = request.args.get('status', '')
-    month_client = request.args.get('month_end_client', '')
-    month_driver = request.args.get('month_end_driver', '')
-    fixed_c_nums = {str(dr.get('차량번호', '')).strip() for dr in drivers_db if str(dr.get('개인/고정', '')).strip() == '고정'}
-    fixed_c_nums.discard('')
-    today_naive = now_kst().replace(tzinfo=None)
-    conn = connect_ledger(); conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM ledger").fetchall(); conn.close()
+    """업체별/기사별 정산서 엑셀 (type=client|driver). 조회 조건은 통계와 동일(LedgerQuery statistics)."""
+    t = request.args.get('type', 'client')
     filtered_data = []
-    for row in rows:
-        r = dict(row)
-        in_dt = r['in_dt']; out_dt = r['out_dt']; p_due = r['pay_due_dt']; pre = r['pre_post']
-        o_dt = r['order_dt'] or ""; t_img = r['tax_img'] or ""; s_img = r['ship_img'] or ""
-        # 수금상태: 정산관리와 동일 — 배차일 기준 30일 경과·수금예정일 경과·선착불 금액 기입 시 미수금
-        if in_dt:
-            m_st = "수금완료"
-        else:
-            is_over_30 = False
-            dispatch_dt_str = r.get('dispatch_dt')
-            if dispatch_dt_str:
-                try:
-                    d_dt = datetime.fromisoformat(str(dispatch_dt_str).replace(' ', 'T'))
-                    if today_naive > d_dt + timedelta(days=30): is_over_30 = True
-                except Exception:
-                    try:
-                        d_dt = datetime.strptime((dispatch_dt_str or '')[:10], "%Y-%m-%d")
-                        if today_naive > d_dt + timedelta(days=30): is_over_30 = True
-                    except Exception: pass
-            is_due_passed = False
-            if p_due:
-                try:
-                    if today_naive.date() > datetime.strptime((str(p_due) or '')[:10], "%Y-%m-%d").date(): is_due_passed = True
-                except Exception: pass
-            has_pre_post = bool(pre is not None and float(pre or 0) != 0)
-            m_st = "미수" if (is_over_30 or is_due_passed or has_pre_post) else "조건부미수금"
-        p_st = _pay_status_from_row(r)
-        c_num = str(r.get('c_num', '')).strip()
-        d_type = "직영" if c_num in fixed_c_nums else "일반"
-        if s and e and not (s <= o_dt <= e): continue
-        if c and c not in str(r['client_name']): continue
-        if d and d not in str(r['d_name']): continue
-        if month_client and (str(r.get('month_end_client') or '').strip() not in ('1', 'Y')): continue
-        if month_driver and (str(r.get('month_end_driver') or '').strip() not in ('1', 'Y')): continue
-        st_map = {'미수':'misu_only', '조건부미수':'cond_misu', '수금완료':'done_in', '지급완료':'done_out', '미지급':'pay_only', '조건부미지급':'cond_pay'}
-        st_use = st_map.get(st, st)
-        if st_use == 'misu_all' and in_dt: continue
-        if st_use == 'misu_only' and m_st != '미수': continue
-        if st_use == 'cond_misu' and m_st != '조건부미수금': continue
-        if st_use == 'pay_all' and out_dt: continue
-        if st_use == 'pay_only' and p_st != '미지급': continue
-        if st_use == 'cond_pay' and p_st != '조건부미지급': continue
-        if st_use == 'done_in' and not in_dt: continue
-        if st_use == 'done_out' and not out_dt: continue
-        if st == '고정' and c_num not in fixed_c_nums: continue
-        if st in ['직영', '일반'] and d_type != st: continue
-        r['m_st'] = m_st; r['p_st'] = p_st
+    for r in LedgerQuery(request.args, 'statistics').fetch():
+        r['m_st'] = r['misu_status']; r['p_st'] = r['pay_status']
         filtered_data.append(r)
     df = pd.DataFrame(filtered_data)
     if df.empty: return "데이터가 없습니다."
@@ -5429,7 +7310,7 @@ def export_custom_settlement():
             excel_list.append({})
     result_df = pd.DataFrame(excel_list)
     out = io.BytesIO()
-    with pd.ExcelWriter(out, engine='openpyxl') as w: result_df.to_excel(w, index=False)
+    with pd.ExcelWriter(out, engine='openpyxl') as w: _export_df_excel(w, result_df, index=False)
     out.seek(0); return send_file(out, as_attachment=True, download_name=f"{t}_settlement.xlsx")
 
 @app.route('/export_settlement_sheet')
@@ -5471,7 +7352,7 @@ def export_settlement_sheet():
     df = pd.DataFrame(filtered, columns=cols)
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df.to_excel(w, index=False, sheet_name='정산서')
+        _export_df_excel(w, df, index=False, sheet_name='정산서')
     out.seek(0)
     return send_file(out, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name=f"정산서_{now_kst().strftime('%Y%m%d_%H%M')}.xlsx")
 
@@ -5514,7 +7395,7 @@ def export_vendor_sheet():
     df = pd.DataFrame(filtered, columns=cols)
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df.to_excel(w, index=False, sheet_name='매입처합산발행')
+        _export_df_excel(w, df, index=False, sheet_name='매입처합산발행')
     out.seek(0)
     return send_file(out, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name=f"매입처합산발행_{now_kst().strftime('%Y%m%d_%H%M')}.xlsx")
 
@@ -5523,12 +7404,7 @@ def export_vendor_sheet():
 def export_fixed_driver_sheet():
     """통계 고정기사 합산발행 엑셀: 로그번호/구분(개별/고정/협력사)/기사명/오더일/배차일/차량번호/노선/지급운임/매입부가세/합계/매입발행사업자구분 + 하단 합계금액. 매입/매출 사업자구분 체크 다중 선택 시 OR."""
     rows = _statistics_filtered_rows_from_request(request)
-    fixed_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '고정'}
-    hyup_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '협력사'}
-    gae_c_nums = {str(d.get('차량번호', '')).strip() for d in drivers_db if str(d.get('개인/고정', '')).strip() == '개별'}
-    fixed_c_nums.discard('')
-    hyup_c_nums.discard('')
-    gae_c_nums.discard('')
+    fixed_c_nums, hyup_c_nums, gae_c_nums = mem_dir.fixed_c_nums, mem_dir.hyup_c_nums, mem_dir.gae_c_nums
     filtered = []
     for r in rows:
         c_num = str(r.get('c_num', '')).strip()
@@ -5577,107 +7453,23 @@ def export_fixed_driver_sheet():
     df = pd.DataFrame(excel_list)
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df.to_excel(w, index=False, sheet_name='고정기사합산발행')
+        _export_df_excel(w, df, index=False, sheet_name='고정기사합산발행')
     out.seek(0)
     return send_file(out, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name=f"고정기사합산발행_{now_kst().strftime('%Y%m%d_%H%M')}.xlsx")
 
 @app.route('/export_misu_info')
 @login_required 
 def export_misu_info():
-    """미수금 업체정보 엑셀. 정산 검색과 동일; 매입/매출 사업자구분 체크 다중 선택 시 OR."""
-    q_st = request.args.get('status', ''); q_name = request.args.get('name', '')
-    q_c_num = request.args.get('c_num', '').strip()
-    q_start = request.args.get('start', '').strip(); q_end = request.args.get('end', '').strip()
-    q_order_start = request.args.get('order_start', '').strip(); q_order_end = request.args.get('order_end', '').strip()
-    q_in_dt_start = request.args.get('in_dt_start', '').strip()
-    q_in_dt_end = request.args.get('in_dt_end', '').strip()
-    q_out_dt_start = request.args.get('out_dt_start', '').strip()
-    q_out_dt_end = request.args.get('out_dt_end', '').strip()
-    q_vendor = request.args.get('vendor', '').strip()
-    q_tax_biz2 = request.args.get('q_tax_biz2', '').strip(); q_biz_issue = request.args.get('q_biz_issue', '').strip()
-    q_tb2_tags = _tax_biz2_tags_from_args(
-        request.args.get('tb2_hj'), request.args.get('tb2_sm'), request.args.get('tb2_sq'),
-    )
-    q_sb2_tags = _tax_biz2_tags_from_args(
-        request.args.get('sb2_hj'), request.args.get('sb2_sm'), request.args.get('sb2_sq'),
-    )
-    q_amount = request.args.get('q_amount', '').strip(); q_client = request.args.get('q_client', '').strip()
-    q_in_name = request.args.get('q_in_name', '').strip(); q_phone = request.args.get('q_phone', '').strip()
-    q_mc = str(request.args.get('month_end_client') or '').strip()
-    q_md = str(request.args.get('month_end_driver') or '').strip()
-    q_nmc = str(request.args.get('not_month_end_client') or '').strip()
-    q_nmd = str(request.args.get('not_month_end_driver') or '').strip()
-    q_filter_pay_client = str(request.args.get('filter_pay_client') or '').strip()
-    q_filter_pay_driver = str(request.args.get('filter_pay_driver') or '').strip()
-    today = now_kst()
-    today_naive = today.replace(tzinfo=None)
-    conn = connect_ledger(); conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM ledger").fetchall(); conn.close()
+    """미수금 업체정보 엑셀. 정산 검색과 동일(LedgerQuery, 매입/매출 사업자구분 체크 다중 선택 시 AND). 상태 미선택 시 미수 전체."""
+    lq = LedgerQuery(request.args, 'settlement')
+    if not lq.status:
+        lq.status = 'misu_all'  # 상태 미선택 시 수금일 없는 건만
     export_data = []
-    for row in rows:
-        row_dict = dict(row)
-        order_dt = row_dict.get('order_dt') or ''
-        dispatch_dt_val = (row_dict.get('dispatch_dt') or '')[:10] if row_dict.get('dispatch_dt') else ''
-        if not _dispatch_in_settlement_range(dispatch_dt_val, q_start, q_end):
-            continue
-        if not _order_in_settlement_range(order_dt, q_order_start, q_order_end):
-            continue
-        if not _ledger_yyyymmdd_in_range(row_dict.get('in_dt'), q_in_dt_start, q_in_dt_end):
-            continue
-        if not _ledger_yyyymmdd_in_range(row_dict.get('out_dt'), q_out_dt_start, q_out_dt_end):
-            continue
-        if q_vendor and q_vendor.lower() not in str(row_dict.get('tax_biz_name') or '').lower(): continue
-        if not _row_matches_tax_biz2_combined(row_dict, q_tb2_tags, q_tax_biz2): continue
-        if q_c_num and q_c_num.lower() not in str(row_dict.get('c_num') or '').lower(): continue
-        if q_filter_pay_client == '1' and (str(row_dict.get('pay_method_client') or '').strip() != '현금'): continue
-        if q_filter_pay_client == '0' and (str(row_dict.get('pay_method_client') or '').strip() == '현금'): continue
-        if q_filter_pay_driver == '1' and (str(row_dict.get('pay_method_driver') or '').strip() != '현금'): continue
-        if q_filter_pay_driver == '0' and (str(row_dict.get('pay_method_driver') or '').strip() == '현금'): continue
-        if not _row_matches_biz_issue_combined_any(row_dict, q_sb2_tags, q_biz_issue): continue
-        if not _row_matches_extra_filters(row_dict, q_amount, q_client, q_in_name, q_phone): continue
-        if not _row_matches_month_end_ledger_filters(row_dict, q_mc, q_md, q_nmc, q_nmd): continue
-        in_dt = row_dict.get('in_dt')
-        out_dt = row_dict.get('out_dt')
-        misu_status, _ = _misu_status_for_settlement_row(row_dict, today_naive)
-        pay_status = _pay_status_from_row(row_dict)
-        _tax_dt_val = (row_dict.get('tax_dt') or '').strip() if row_dict.get('tax_dt') else ''
-        _tax_ok = bool(_tax_dt_val) or _norm_tax_chk(row_dict.get('tax_chk'))
-        _issue_dt_val = (row_dict.get('issue_dt') or '').strip() if row_dict.get('issue_dt') else ''
-        _issue_ok = bool(_issue_dt_val)
-        if q_st:
-            if q_st == 'misu_all' and in_dt: continue
-            if q_st == 'pay_all' and out_dt: continue
-            if q_st == 'misu_only' and misu_status != '미수': continue
-            if q_st == 'cond_misu' and misu_status != '조건부미수금': continue
-            if q_st == 'pay_only' and pay_status != '미지급': continue
-            if q_st == 'cond_pay' and pay_status != '조건부미지급': continue
-            if q_st == 'done_in' and not in_dt: continue
-            if q_st == 'done_out' and not out_dt: continue
-            if q_st == 'tax_issued' and not _tax_ok: continue
-            if q_st == 'tax_not_issued' and _tax_ok: continue
-            if q_st == 'issue_done' and not _issue_ok: continue
-            if q_st == 'issue_not_done' and _issue_ok: continue
-        else:
-            if in_dt: continue
-        if q_name:
-            q = q_name.lower()
-            in_client = q in str(row_dict.get('client_name') or '').lower()
-            in_vendor = q in str(row_dict.get('tax_biz_name') or '').lower()
-            in_driver = q in str(row_dict.get('d_name') or '').lower()
-            order_no = ('n' + str(row_dict.get('id')).zfill(2)).lower()
-            match_order = (q == order_no or q in order_no or order_no in q)
-            match_id = False
-            if q.isdigit():
-                try:
-                    match_id = (row_dict.get('id') == int(q))
-                except (ValueError, TypeError):
-                    pass
-            if not (in_client or in_vendor or in_driver or match_order or match_id):
-                continue
+    for row_dict in lq.fetch():
         export_data.append({'거래처명': row_dict['client_name'], '사업자번호': row_dict['biz_num'], '대표자': row_dict['biz_owner'], '메일': row_dict['mail'], '연락처': row_dict['c_phone'], '노선': row_dict['route'], '공급가액': int(calc_supply_value(row_dict)), '오더일': row_dict['order_dt'], '결제예정일': row_dict['pay_due_dt']})
     df = pd.DataFrame(export_data)
     out = io.BytesIO()
-    with pd.ExcelWriter(out, engine='openpyxl') as w: df.to_excel(w, index=False)
+    with pd.ExcelWriter(out, engine='openpyxl') as w: _export_df_excel(w, df, index=False)
     out.seek(0); return send_file(out, as_attachment=True, download_name="misu_client_info.xlsx")
 
 @app.route('/export_tax_not_issued')
@@ -5686,7 +7478,6 @@ def export_tax_not_issued():
     """매출 세금계산서 형식 엑셀. 행·건수·순서는 정산관리 검색결과와 동일(_settlement_filtered_rows_from_request, 배차일↓·id↓).
     마지막 행만 총합계(데이터 행 수 = 화면 '총 N건')."""
     filtered_rows = _settlement_filtered_rows_from_request(request)
-    client_by_name = {str(c.get('업체명') or '').strip(): c for c in clients_db if (c.get('업체명') or '').strip()}
     cols = [
         '매출처사업자번호', '매출사업자구분', '매입사업자구분', '사업자주소', '업태', '종목', '메일주소', '업체명', '대표자명',
         '공급가액', '매출부가세', '매출합계', '노선', '차량번호/기사명',
@@ -5695,7 +7486,7 @@ def export_tax_not_issued():
     for r in filtered_rows:
         fee, vat1, total1, _, _, _ = calc_totals_with_vat(r)
         cname = str(r.get('client_name') or '').strip()
-        client = client_by_name.get(cname, {})
+        client = mem_dir.client(cname) or {}
         biz_reg_no = (client.get('사업자등록번호', '') or r.get('biz_num', '') or '').strip()
         # 다운로드 엑셀에 '-' 같은 placeholder가 그대로 노출되지 않도록 처리
         if biz_reg_no in ('-', '–', '—', 'None', 'nan', 'NaN'):
@@ -5738,43 +7529,17 @@ def export_tax_not_issued():
     df_out = pd.DataFrame(excel_rows if excel_rows else [{}], columns=cols)
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df_out.to_excel(w, index=False)
+        _export_df_excel(w, df_out, index=False)
     out.seek(0)
     return send_file(out, as_attachment=True, download_name="tax_not_issued.xlsx")
 
 @app.route('/export_pay_info')
 @login_required 
 def export_pay_info():
-    """미지급 기사정보 엑셀. 정산 검색과 동일; 매입/매출 사업자구분 체크 다중 선택 시 OR."""
-    q_st = request.args.get('status', ''); q_name = request.args.get('name', '')
-    q_c_num = request.args.get('c_num', '').strip()
-    q_start = request.args.get('start', '').strip(); q_end = request.args.get('end', '').strip()
-    q_order_start = request.args.get('order_start', '').strip(); q_order_end = request.args.get('order_end', '').strip()
-    q_in_dt_start = request.args.get('in_dt_start', '').strip()
-    q_in_dt_end = request.args.get('in_dt_end', '').strip()
-    q_out_dt_start = request.args.get('out_dt_start', '').strip()
-    q_out_dt_end = request.args.get('out_dt_end', '').strip()
-    q_vendor = request.args.get('vendor', '').strip()
-    q_tax_biz2 = request.args.get('q_tax_biz2', '').strip(); q_biz_issue = request.args.get('q_biz_issue', '').strip()
-    q_tb2_tags = _tax_biz2_tags_from_args(
-        request.args.get('tb2_hj'), request.args.get('tb2_sm'), request.args.get('tb2_sq'),
-    )
-    q_sb2_tags = _tax_biz2_tags_from_args(
-        request.args.get('sb2_hj'), request.args.get('sb2_sm'), request.args.get('sb2_sq'),
-    )
-    q_amount = request.args.get('q_amount', '').strip(); q_client = request.args.get('q_client', '').strip()
-    q_in_name = request.args.get('q_in_name', '').strip(); q_phone = request.args.get('q_phone', '').strip()
-    q_mc = str(request.args.get('month_end_client') or '').strip()
-    q_md = str(request.args.get('month_end_driver') or '').strip()
-    q_nmc = str(request.args.get('not_month_end_client') or '').strip()
-    q_nmd = str(request.args.get('not_month_end_driver') or '').strip()
-    q_filter_pay_client = str(request.args.get('filter_pay_client') or '').strip()
-    q_filter_pay_driver = str(request.args.get('filter_pay_driver') or '').strip()
-    today = now_kst()
-    today_naive = today.replace(tzinfo=None)
+    """미지급 기사정보 엑셀. 정산 검색과 동일(LedgerQuery, 매입/매출 사업자구분 체크 다중 선택 시 AND)."""
     # 기사(기사명+차량번호)별 은행정보 보조 (ledger에 없을 때 사용)
     driver_bank = {}
-    for d in drivers_db:
+    for d in mem_dir.drivers:
         key = (str(d.get('기사명') or '').strip(), str(d.get('차량번호') or '').strip())
         if key[0] or key[1]:
             driver_bank[key] = {
@@ -5782,71 +7547,14 @@ def export_pay_info():
                 '예금주': str(d.get('예금주') or d.get('사업자') or '').strip(),
                 '계좌번호': str(d.get('계좌번호') or '').strip(),
             }
-    conn = connect_ledger(); conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM ledger").fetchall(); conn.close()
     export_cols = [
         '지급관련비고', '기사명', '매입처명', '매입처 은행명', '매입처 계좌번호', '매입처 예금주',
         '지급금액', '수금일(매출처)', '지급일(매입처)', '은행코드',
     ]
     raw_list = []
-    for row in rows:
-        row_dict = dict(row)
+    for row_dict in LedgerQuery(request.args, 'settlement').fetch():
         order_dt = row_dict.get('order_dt') or ''
         dispatch_dt_val = (row_dict.get('dispatch_dt') or '')[:10] if row_dict.get('dispatch_dt') else ''
-        if not _dispatch_in_settlement_range(dispatch_dt_val, q_start, q_end):
-            continue
-        if not _order_in_settlement_range(order_dt, q_order_start, q_order_end):
-            continue
-        if not _ledger_yyyymmdd_in_range(row_dict.get('in_dt'), q_in_dt_start, q_in_dt_end):
-            continue
-        if not _ledger_yyyymmdd_in_range(row_dict.get('out_dt'), q_out_dt_start, q_out_dt_end):
-            continue
-        if q_vendor and q_vendor.lower() not in str(row_dict.get('tax_biz_name') or '').lower(): continue
-        if not _row_matches_tax_biz2_combined(row_dict, q_tb2_tags, q_tax_biz2): continue
-        if q_c_num and q_c_num.lower() not in str(row_dict.get('c_num') or '').lower(): continue
-        if q_filter_pay_client == '1' and (str(row_dict.get('pay_method_client') or '').strip() != '현금'): continue
-        if q_filter_pay_client == '0' and (str(row_dict.get('pay_method_client') or '').strip() == '현금'): continue
-        if q_filter_pay_driver == '1' and (str(row_dict.get('pay_method_driver') or '').strip() != '현금'): continue
-        if q_filter_pay_driver == '0' and (str(row_dict.get('pay_method_driver') or '').strip() == '현금'): continue
-        if not _row_matches_biz_issue_combined_any(row_dict, q_sb2_tags, q_biz_issue): continue
-        if not _row_matches_extra_filters(row_dict, q_amount, q_client, q_in_name, q_phone): continue
-        if not _row_matches_month_end_ledger_filters(row_dict, q_mc, q_md, q_nmc, q_nmd): continue
-        in_dt = row_dict.get('in_dt')
-        out_dt = row_dict.get('out_dt')
-        misu_status, _ = _misu_status_for_settlement_row(row_dict, today_naive)
-        pay_status = _pay_status_from_row(row_dict)
-        _tax_dt_val = (row_dict.get('tax_dt') or '').strip() if row_dict.get('tax_dt') else ''
-        _tax_ok = bool(_tax_dt_val) or _norm_tax_chk(row_dict.get('tax_chk'))
-        _issue_dt_val = (row_dict.get('issue_dt') or '').strip() if row_dict.get('issue_dt') else ''
-        _issue_ok = bool(_issue_dt_val)
-        if q_st:
-            if q_st == 'misu_all' and in_dt: continue
-            if q_st == 'pay_all' and out_dt: continue
-            if q_st == 'misu_only' and misu_status != '미수': continue
-            if q_st == 'cond_misu' and misu_status != '조건부미수금': continue
-            if q_st == 'pay_only' and pay_status != '미지급': continue
-            if q_st == 'cond_pay' and pay_status != '조건부미지급': continue
-            if q_st == 'done_in' and not in_dt: continue
-            if q_st == 'done_out' and not out_dt: continue
-            if q_st == 'tax_issued' and not _tax_ok: continue
-            if q_st == 'tax_not_issued' and _tax_ok: continue
-            if q_st == 'issue_done' and not _issue_ok: continue
-            if q_st == 'issue_not_done' and _issue_ok: continue
-        if q_name:
-            q = q_name.lower()
-            in_client = q in str(row_dict.get('client_name') or '').lower()
-            in_vendor = q in str(row_dict.get('tax_biz_name') or '').lower()
-            in_driver = q in str(row_dict.get('d_name') or '').lower()
-            order_no = ('n' + str(row_dict.get('id')).zfill(2)).lower()
-            match_order = (q == order_no or q in order_no or order_no in q)
-            match_id = False
-            if q.isdigit():
-                try:
-                    match_id = (row_dict.get('id') == int(q))
-                except (ValueError, TypeError):
-                    pass
-            if not (in_client or in_vendor or in_driver or match_order or match_id):
-                continue
         d_name = str(row_dict.get('d_name') or '').strip()
         c_num = str(row_dict.get('c_num') or '').strip()
         bank_name = str(row_dict.get('d_bank_name') or '').strip()
@@ -5889,83 +7597,40 @@ def export_pay_info():
         df = df_sorted[export_cols]
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df.to_excel(w, index=False)
+        _export_df_excel(w, df, index=False)
     out.seek(0)
     return send_file(out, as_attachment=True, download_name="pay_driver_info.xlsx")
 
+@app.route('/api/statistics_summary')
+@login_required
+def statistics_summary():
+    """통계 요약(JSON) — 통계 화면과 같은 GET 조건의 건수·배차일 연월별 수익·일별 미수/미지급·매출처/매입처별 합계.
+    조건이 롤업 키로 표현되면 ledger_rollup에서(source='rollup'), 자유 검색어 등이 있으면 장부 행 조회로(source='rows') 계산."""
+    try:
+        agg = _statistics_aggregates_from_rollup(LedgerQuery(request.args, 'statistics'))
+        source = 'rollup'
+        if agg is None:
+            agg = _statistics_aggregates_from_rows(_statistics_filtered_rows_from_request(request))
+            source = 'rows'
+    except Exception as e:
+        print(f"[statistics_summary error] {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    by_month = [dict(month=m, **v) for m, v in sorted(agg['by_month'].items(), reverse=True) if m and v['cnt']]
+    daily = [dict(day=d, **v) for d, v in sorted(agg['daily'].items(), reverse=True) if any(v.values())]
+    by_client = [dict(client_name=k, **v) for k, v in sorted(agg['by_client'].items()) if v['cnt']]
+    by_vendor = [dict(tax_biz_name=k, **v) for k, v in sorted(agg['by_vendor'].items()) if v['cnt']]
+    return jsonify({"status": "success", "source": source, "count": agg['count'],
+                    "by_month": by_month, "daily": daily, "by_client": by_client, "by_vendor": by_vendor})
+
+
 @app.route('/export_stats')
 @login_required 
 def export_stats():
     """통계 엑셀. 매입/매출 사업자구분 체크 다중 선택 시 OR(통계 화면과 동일)."""
-    s = request.args.get('start',''); e = request.args.get('end','')
-    c = request.args.get('client',''); v = request.args.get('vendor','').strip(); d = request.args.get('driver','')
-    c_num_param = request.args.get('c_num', '').strip()
-    st = request.args.get('status', '')
-    q_biz_issue = request.args.get('q_biz_issue', '').strip()
-    q_tax_biz2 = request.args.get('q_tax_biz2', '').strip()
-    q_tb2_tags = _tax_biz2_tags_from_args(
-        request.args.get('tb2_hj'), request.args.get('tb2_sm'), request.args.get('tb2_sq'),
-    )
-    q_sb2_tags = _tax_biz2_tags_from_args(
-        request.args.get('sb2_hj'), request.args.get('sb2_sm'), request.args.get('sb2_sq'),
-    )
-    month_client = request.args.get('month_end_client', '')
-    month_driver = request.args.get('month_end_driver', '')
-    in_start = request.args.get('in_start', '').strip()
-    in_end = request.args.get('in_end', '').strip()
-    out_start = request.args.get('out_start', '').strip()
-    out_end = request.args.get('out_end', '').strip()
-    
-    conn = connect_ledger(); conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM ledger").fetchall(); conn.close()
-    
-    # 기사관리에서 개인/고정 값별 차량번호 목록 (차량번호 기준)
-    fixed_c_nums = {str(dr.get('차량번호', '')).strip() for dr in drivers_db if str(dr.get('개인/고정', '')).strip() == '고정'}
-    hyup_c_nums = {str(dr.get('차량번호', '')).strip() for dr in drivers_db if str(dr.get('개인/고정', '')).strip() == '협력사'}
-    gae_c_nums = {str(dr.get('차량번호', '')).strip() for dr in drivers_db if str(dr.get('개인/고정', '')).strip() == '개별'}
-    fixed_c_nums.discard(''); hyup_c_nums.discard(''); gae_c_nums.discard('')
     export_data = []
-
-    for row in rows:
-        r = dict(row)
-        # 상태 계산 로직 (통계 함수와 동일하게 적용)
-        in_dt = r.get('in_dt'); out_dt = r.get('out_dt')
-        if in_start or in_end:
-            in_dt_val = (in_dt or '')[:10] if in_dt else ''
-            if not in_dt_val: continue
-            if in_start and in_dt_val < in_start: continue
-            if in_end and in_dt_val > in_end: continue
-        if out_start or out_end:
-            out_dt_val = (out_dt or '')[:10] if out_dt else ''
-            if not out_dt_val: continue
-            if out_start and out_dt_val < out_start: continue
-            if out_end and out_dt_val > out_end: continue
-        m_st = "수금완료" if in_dt else ("조건부미수" if not r.get('pre_post') and not r.get('pay_due_dt') else "미수")
-        p_st = _pay_status_from_row(r)
-        c_num = str(r.get('c_num', '')).strip()
-        d_type = "직영" if c_num in fixed_c_nums else "일반"
-
-        # 필터링
-        if s and e and not (s <= (r['order_dt'] or "") <= e): continue
-        if c and c not in str(r['client_name']): continue
-        if v and v not in str(r.get('tax_biz_name', '')): continue
-        if d and d not in str(r['d_name']): continue
-        if c_num_param and c_num_param not in str(r.get('c_num', '')): continue
-        if not _row_matches_biz_issue_combined_any(r, q_sb2_tags, q_biz_issue): continue
-        if not _row_matches_tax_biz2_combined_any(r, q_tb2_tags, q_tax_biz2): continue
-        if month_client and (str(r.get('month_end_client') or '').strip() not in ('1', 'Y')): continue
-        if month_driver and (str(r.get('month_end_driver') or '').strip() not in ('1', 'Y')): continue
-        if st:
-            if st == "misu_all" and m_st not in ("미수", "조건부미수"): continue
-            if st == "pay_all" and p_st not in ("미지급", "조건부미지급"): continue
-            if st in ["미수", "조건부미수", "수금완료"] and st != m_st: continue
-            if st in ["미지급", "조건부미지급", "지급완료"] and st != p_st: continue
-            if st == "고정" and c_num not in fixed_c_nums: continue
-            if st == "협력사" and c_num not in hyup_c_nums: continue
-            if st == "개별" and c_num not in gae_c_nums: continue
-            if st in ["직영", "일반"] and st != d_type: continue
-
-        fee, vat1, total1, fee_out, vat2, total2 = calc_totals_with_vat(r)
+    for r in _statistics_filtered_rows_from_request(request):
+        fee, vat1, total1, fee_out, vat2, total2 = r['fee'], r['vat1'], r['total1'], r['fee_out'], r['vat2'], r['total2']
+        m_st, p_st, d_type = r['m_st'], r['p_st'], r['d_type']
         export_data.append({
             '오더일': r['order_dt'], '업체명': r['client_name'], '노선': r['route'],
             '기사명': r['d_name'], '공급가액': fee, '부가세': vat1, '매출(합계)': total1, '수금상태': m_st,
@@ -5976,9 +7641,10 @@ def export_stats():
     if not df.empty:
         sum_row = {'오더일': '합계', '업체명': '', '노선': '', '기사명': '', '공급가액': int(df['공급가액'].sum()), '부가세': int(df['부가세'].sum()), '매출(합계)': int(df['매출(합계)'].sum()), '수금상태': '', '기사운임': int(df['기사운임'].sum()), '기사부가세': int(df['기사부가세'].sum()), '지출(기사합계)': int(df['지출(기사합계)'].sum()), '지급상태': '', '기사구분': ''}
         df = pd.concat([df, pd.DataFrame([sum_row])], ignore_index=True)
+    _perf_mark('serialize')
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df.to_excel(w, index=False, sheet_name='통계데이터')
+        _export_df_excel(w, df, index=False, sheet_name='통계데이터')
     out.seek(0)
     return send_file(out, as_attachment=True, download_name=f"SM_Logis_Stats_{now_kst().strftime('%y%m%d')}.xlsx")
 
@@ -6011,7 +7677,7 @@ def statistics_misu_confirm_excel():
     df = pd.DataFrame(excel_rows)
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df.to_excel(w, index=False, sheet_name='미수확인')
+        _export_df_excel(w, df, index=False, sheet_name='미수확인')
     out.seek(0)
     return send_file(out, as_attachment=True, download_name=f"통계_미수확인_{now_kst().strftime('%Y%m%d_%H%M')}.xlsx")
 
@@ -6047,7 +7713,7 @@ def statistics_done_in_excel():
     df = pd.DataFrame(excel_rows)
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df.to_excel(w, index=False, sheet_name='수금완료 이체확인')
+        _export_df_excel(w, df, index=False, sheet_name='수금완료 이체확인')
     out.seek(0)
     return send_file(out, as_attachment=True, download_name=f"통계_수금완료이체확인_{now_kst().strftime('%Y%m%d_%H%M')}.xlsx")
 
@@ -6083,7 +7749,7 @@ def statistics_done_out_excel():
     df = pd.DataFrame(excel_rows)
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df.to_excel(w, index=False, sheet_name='지급완료 이체확인')
+        _export_df_excel(w, df, index=False, sheet_name='지급완료 이체확인')
     out.seek(0)
     return send_file(out, as_attachment=True, download_name=f"통계_지급완료이체확인_{now_kst().strftime('%Y%m%d_%H%M')}.xlsx")
 
@@ -6149,6 +7815,7 @@ def upload_evidence(ledger_id):
                     os.remove(old_fs)
                 except OSError:
                     pass
+            _refresh_ledger_status_cols(conn, [ledger_id])
             conn.commit()
         conn.close()
         from flask import redirect
@@ -6187,6 +7854,7 @@ def upload_evidence(ledger_id):
             conn.execute("UPDATE ledger SET ship_img = ? WHERE id = ?", (update_p(row['ship_img'] or "", store_path, target_seq), ledger_id))
             # 매출처 인수증 사진 업로드 시 인수증전송일·확인완료 처리
             conn.execute("UPDATE ledger SET mail_dt = ?, is_mail_done = ? WHERE id = ?", (today_str, "확인완료", ledger_id))
+        _refresh_ledger_status_cols(conn, [ledger_id])
         conn.commit(); conn.close(); return "<h3>업로드 완료</h3><script>setTimeout(()=>location.reload(), 1000);</script>"
 
     # GET: 현재 업로드 상태 조회 (삭제 버튼 표시용)
@@ -6251,9 +7919,8 @@ def sanitize_ledger_value(k, v):
     """컬럼 타입에 맞게 값 정제 (잘못된 형식이면 빈 문자열)"""
     if v is None: return ''
     v = str(v).strip()
-    col = next((c for c in FULL_COLUMNS if c['k'] == k), None)
-    if not col: return v
-    t = col.get('t', 'text')
+    t = FULL_COLUMN_TYPES.get(k)
+    if t is None: return v
     if t == 'number':
         if not v: return ''
         try:
@@ -6283,6 +7950,18 @@ def sanitize_ledger_value(k, v):
         return ''
     return v
 
+def _ledger_update_changed(conn, row_id, new_vals, current):
+    """장부 1행에서 new_vals 중 현재 값(current: 행 dict)과 다른 컬럼만 UPDATE 한 문장으로 기록.
+    NULL과 빈 문자열은 같은 값으로 본다. 반환: 실제로 바뀐 {컬럼: 값}"""
+    def _norm(v):
+        return '' if v is None else str(v)
+    changed = {k: v for k, v in new_vals.items() if _norm(current.get(k)) != _norm(v)}
+    if changed:
+        conn.execute(f"UPDATE ledger SET {', '.join(f'[{k}] = ?' for k in changed)} WHERE id = ?",
+                     list(changed.values()) + [row_id])
+    return changed
+
+
 @app.route('/api/save_ledger', methods=['POST'])
 @login_required 
 def save_ledger_api():
@@ -6306,9 +7985,12 @@ def save_ledger_api():
         except (ValueError, TypeError):
             return jsonify({"status": "error", "message": "invalid id"}), 400
         action_type = "수정"
-        sql = ", ".join([f"[{k}] = ?" for k in keys])
-        vals = [data.get(k, '') for k in keys] + [target_id]
-        cursor.execute(f"UPDATE ledger SET {sql} WHERE id = ?", vals)
+        # 바뀐 컬럼만 UPDATE (행이 없으면 기록 없음)
+        cursor.execute("SELECT * FROM ledger WHERE id = ?", (target_id,))
+        cur_row = cursor.fetchone()
+        if cur_row:
+            current = dict(zip([d[0] for d in cursor.description], cur_row))
+            _ledger_update_changed(conn, target_id, {k: data.get(k, '') for k in keys}, current)
     else:
         action_type = "신규등록"
         placeholders = ", ".join(['?'] * len(keys))
@@ -6320,53 +8002,49 @@ def save_ledger_api():
     cursor.execute("INSERT INTO activity_logs (action, target_id, details) VALUES (?, ?, ?)",
                    (action_type, target_id, details))
 
+    dir_drivers = []  # 실제로 추가·변경된 기사 (기사명, 차량번호) / 업체명 — 있을 때만 dir_gen +1
+    dir_clients = []
     # 기사명·차량번호 있으면 기사관리 10개 항목 전체(연락처·은행명·계좌번호·예금주·사업자번호·사업자·개인고정·메모) 저장 — 기사 메모는 콜명(memo2)과 연동
     # 단, 빠른오더는 memo2를 보내지 않으므로 기사관리 메모는 기존값 유지(장부 콜명은 공란 저장).
     if data.get('d_name') and data.get('c_num'):
         cursor.execute("SELECT 메모 FROM drivers WHERE 기사명 = ? AND 차량번호 = ?", (data.get('d_name'), data.get('c_num')))
         existing_driver = cursor.fetchone()
         driver_memo = data.get('memo2', '') if ('memo2' in raw) else ((existing_driver[0] if existing_driver else '') or '')
-        d_vals = (
-            data.get('d_phone',''), data.get('bank_acc',''), data.get('tax_biz_num',''),
-            data.get('tax_biz_name',''), driver_memo,
-            data.get('d_bank_name',''), data.get('d_bank_owner',''), 
-            str(data.get('log_move','')).strip(),
-            data.get('d_name'), data.get('c_num')
-        )
-        if existing_driver:
-            cursor.execute("UPDATE drivers SET 연락처=?, 계좌번호=?, 사업자번호=?, 사업자=?, 메모=?, 은행명=?, 예금주=?, [개인/고정]=? WHERE 기사명=? AND 차량번호=?", d_vals)
-        else:
-            cursor.execute("INSERT INTO drivers (연락처, 계좌번호, 사업자번호, 사업자, 메모, 은행명, 예금주, [개인/고정], 기사명, 차량번호) VALUES (?,?,?,?,?,?,?,?,?,?)", d_vals)
+        d_vals = {
+            '연락처': data.get('d_phone', ''), '계좌번호': data.get('bank_acc', ''), '사업자번호': data.get('tax_biz_num', ''),
+            '사업자': data.get('tax_biz_name', ''), '메모': driver_memo,
+            '은행명': data.get('d_bank_name', ''), '예금주': data.get('d_bank_owner', ''),
+            '개인/고정': str(data.get('log_move', '')).strip(),
+        }
+        if _dir_write(cursor, 'drivers', {'기사명': data.get('d_name'), '차량번호': data.get('c_num')}, d_vals, insert_extra={}):
+            dir_drivers.append((data.get('d_name'), data.get('c_num')))
 
     # 업체명 있으면 업체관리(clients) 동기화 — pay_to(매출사업자구분)는 장부 독립 txt로 clients.사업자구분과 연동하지 않음
     if data.get('client_name'):
         c_name = str(data.get('client_name', '')).strip()
-        c_vals = (
-            str(data.get('biz_issue', '')).strip(),
-            str(data.get('biz_num', '')).strip(),
-            str(data.get('biz_owner', '')).strip(),
-            str(data.get('biz_addr', '')).strip(),
-            str(data.get('biz_type2', '')).strip(),
-            str(data.get('biz_type1', '')).strip(),
-            str(data.get('mail', '')).strip(),
-            str(data.get('c_mgr_name', '')).strip(),
-            str(data.get('c_phone', '')).strip(),
-            str(data.get('pay_memo', '')).strip(),
-            str(data.get('client_memo', '')).strip(),
-            c_name
-        )
-        cursor.execute("SELECT rowid FROM clients WHERE 업체명 = ?", (c_name,))
-        row = cursor.fetchone()
-        if row:
-            cursor.execute("""UPDATE clients SET [발행구분]=?, [사업자등록번호]=?, [대표자명]=?, [사업자주소]=?, [업태]=?, [종목]=?, [메일주소]=?, [담당자]=?, [연락처]=?, [결제특이사항]=?, [비고]=? WHERE 업체명=?""", c_vals)
-        else:
-            cursor.execute("""INSERT INTO clients ([사업자구분], [업체명], [발행구분], [사업자등록번호], [대표자명], [사업자주소], [업태], [종목], [메일주소], [담당자], [연락처], [결제특이사항], [비고])
-                VALUES ('', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (c_name, c_vals[0], c_vals[1], c_vals[2], c_vals[3], c_vals[4], c_vals[5], c_vals[6], c_vals[7], c_vals[8], c_vals[9], c_vals[10]))
+        c_vals = {
+            '발행구분': str(data.get('biz_issue', '')).strip(),
+            '사업자등록번호': str(data.get('biz_num', '')).strip(),
+            '대표자명': str(data.get('biz_owner', '')).strip(),
+            '사업자주소': str(data.get('biz_addr', '')).strip(),
+            '업태': str(data.get('biz_type2', '')).strip(),
+            '종목': str(data.get('biz_type1', '')).strip(),
+            '메일주소': str(data.get('mail', '')).strip(),
+            '담당자': str(data.get('c_mgr_name', '')).strip(),
+            '연락처': str(data.get('c_phone', '')).strip(),
+            '결제특이사항': str(data.get('pay_memo', '')).strip(),
+            '비고': str(data.get('client_memo', '')).strip(),
+        }
+        if _dir_write(cursor, 'clients', {'업체명': c_name}, c_vals, insert_extra={'사업자구분': ''}):
+            dir_clients.append(c_name)
 
+    dir_gen = _dir_gen_bump(conn) if (dir_drivers or dir_clients) else None
+    _refresh_ledger_status_cols(conn, [target_id])
     conn.commit()
+    # 기사관리·업체관리 메모리: 이번 저장으로 바뀐 기사 1건·업체 1건만 반영
+    if dir_gen is not None:
+        _mem_dir_apply(conn, dir_gen, driver_keys=dir_drivers, client_names=dir_clients)
     conn.close()
-    load_db_to_mem()
     return jsonify({"status": "success", "id": target_id})
 
 @app.route('/api/get_order_logs/<int:order_id>')
@@ -6403,7 +8081,73 @@ def get_logs():
 
 @app.route('/api/load_db_mem')
 @login_required 
-def api_load_db_mem(): load_db_to_mem(); return jsonify({"drivers": drivers_db, "clients": clients_db})
+def api_load_db_mem(): _mem_dir_sync(); return jsonify({"drivers": mem_dir.drivers, "clients": mem_dir.clients})
+
+# 통합장부 keyset(seek) 페이지: 장부 정렬(배차일 없음 뒤로, 배차일↓, id↓)을 구간 3개로 나눠 각 구간을 idx_ledger_dispatch_sort 범위 탐색.
+# 구간 0 = 배차일 있음(배차일↓·id↓), 1 = 배차일 '' (id↓), 2 = 배차일 NULL (id↓) — ORDER BY에서 ''가 NULL보다 앞.
+# cursor = 기준 행 정렬키 (구간, 배차일, id) + 조회 조건 지문을 base64로 감싼 값 (조건이 바뀌면 무시하고 page 기준 조회)
+LEDGER_SORT_EMPTY_SQL = "(CASE WHEN dispatch_dt IS NULL OR dispatch_dt = '' THEN 1 ELSE 0 END)"
+LEDGER_SEEK_SEGMENTS = (
+    (f"{LEDGER_SORT_EMPTY_SQL} = 0", "dispatch_dt DESC, id DESC", "dispatch_dt ASC, id ASC"),
+    (f"{LEDGER_SORT_EMPTY_SQL} = 1 AND dispatch_dt = ''", "id DESC", "id ASC"),
+    (f"{LEDGER_SORT_EMPTY_SQL} = 1 AND dispatch_dt IS NULL", "id DESC", "id ASC"),
+)
+LEDGER_PAGE_BLOCK = 10   # 페이지 바 한 묶음의 페이지 수 (renderPagination blockSize와 동일)
+
+
+def _ledger_sort_key(row):
+    """장부 정렬키 (구간, 배차일, id) — LEDGER_SEEK_SEGMENTS 기준"""
+    d = row['dispatch_dt']
+    return (0 if d else (1 if d == '' else 2), d or '', int(row['id']))
+
+
+def _ledger_cursor_scope(args):
+    """cursor가 유효한 조회 조건 지문 — page·cursor·dir·count를 뺀 쿼리 인자(per_page 포함)"""
+    items = sorted((k, v) for k, v in args.items(multi=True) if k not in ('page', 'cursor', 'dir', 'count'))
+    return hashlib.sha1(json.dumps(items, ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+
+
+def _ledger_cursor_encode(key, scope):
+    raw = json.dumps([scope, key[0], key[1], key[2]], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _ledger_cursor_decode(token, scope):
+    """cursor → 정렬키. 형식이 틀리거나 다른 조회 조건의 cursor면 None"""
+    token = str(token or '').strip()
+    if not token:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8'))
+        c_scope, seg, d, row_id = data
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if c_scope != scope or seg not in (0, 1, 2) or not isinstance(d, str) or not isinstance(row_id, int):
+        return None
+    return (seg, d, row_id)
+
+
+def _ledger_seek_rows(conn, conditions, params, key=None, backward=False):
+    """조건(conditions/params)에 맞는 장부 행을 정렬 순서대로(backward면 역순) key 다음부터 차례로 반환.
+    구간마다 인덱스 범위 탐색 후 순서대로 읽으므로 필요한 만큼만 읽고 멈추면 비용이 앞 페이지 수와 무관."""
+    segs = (2, 1, 0) if backward else (0, 1, 2)
+    for seg in segs:
+        if key is not None and (seg > key[0] if backward else seg < key[0]):
+            continue
+        where, order_desc, order_asc = LEDGER_SEEK_SEGMENTS[seg]
+        conds = list(conditions) + [where]
+        seg_params = list(params)
+        if key is not None and seg == key[0]:
+            if seg == 0:
+                conds.append("dispatch_dt >= ? AND (dispatch_dt > ? OR id > ?)" if backward
+                             else "dispatch_dt <= ? AND (dispatch_dt < ? OR id < ?)")
+                seg_params.extend([key[1], key[1], key[2]])
+            else:
+                conds.append("id > ?" if backward else "id < ?")
+                seg_params.append(key[2])
+        sql = "SELECT * FROM ledger WHERE " + " AND ".join(conds) + " ORDER BY " + (order_asc if backward else order_desc)
+        yield from conn.execute(sql, seg_params)
+
 
 @app.route('/api/get_ledger')
 @login_required 
@@ -6443,21 +8187,21 @@ def get_ledger():
     params = []
     conditions = []
     
-    # 날짜 필터링: 기본은 배차일 기준 (start만/end만 있어도 적용)
+    # 날짜 필터링: 기본은 배차일 기준 (start만/end만 있어도 적용) — dispatch_day 인덱스 범위 스캔
     if start_dt or end_dt:
         if start_dt and end_dt:
-            conditions.append(" dispatch_dt IS NOT NULL AND dispatch_dt != '' AND substr(dispatch_dt,1,10) BETWEEN ? AND ?")
+            conditions.append(" dispatch_day BETWEEN ? AND ?")
             params.extend([start_dt, end_dt])
         elif start_dt:
-            conditions.append(" dispatch_dt IS NOT NULL AND dispatch_dt != '' AND substr(dispatch_dt,1,10) >= ?")
+            conditions.append(" dispatch_day >= ?")
             params.append(start_dt)
         else:
-            conditions.append(" dispatch_dt IS NOT NULL AND dispatch_dt != '' AND substr(dispatch_dt,1,10) <= ?")
+            conditions.append(" dispatch_day <= ?")
             params.append(end_dt)
-    # 오더일 추가 검색
+    # 오더일 추가 검색 (order_day 인덱스로 범위 축소 후 원문 비교)
     if order_start and order_end:
-        conditions.append(" order_dt BETWEEN ? AND ?")
-        params.extend([order_start, order_end])
+        conditions.append(" order_day BETWEEN substr(?,1,10) AND ? AND order_dt BETWEEN ? AND ?")
+        params.extend([order_start, order_end, order_start, order_end])
     # 월말합산 필터
     if month_end_client:
         conditions.append(" (month_end_client = '1' OR month_end_client = 'Y')")
@@ -6482,47 +8226,84 @@ def get_ledger():
         conditions.append(" (issue_dt IS NULL OR trim(issue_dt) = '')")
     _sql_append_tax_biz2(conditions, params, q_tb2_tags, '' if q_tb2_tags else q_tax_biz2)
     _sql_append_biz_issue_tags(conditions, params, q_sb2_tags, q_biz_issue)
+    # 검색어(q): 검색 인덱스(ledger_search)로 SQL에서 조회. LIKE 와일드카드(%, _)가 든 검색어는 Python에서 재확인
+    q_in_sql = _append_ledger_q_search_sql(conditions, params, q_search, leading=" ")
+    q_recheck = bool(q_search) and (not q_in_sql or '%' in q_search or '_' in q_search)
     base_where = " WHERE " + " AND ".join(conditions) if conditions else ""
     start_idx = (page - 1) * per_page
-
-    # 검색어(q) 또는 금액/매출처/입금자명/전화번호 필터 있을 때: 후보 행 가져온 뒤 Python에서 필터
-    if q_search or has_extra:
-        LIMIT_CANDIDATES = 5000
-        query_candidates = query + base_where + " ORDER BY CASE WHEN dispatch_dt IS NULL OR dispatch_dt = '' THEN 1 ELSE 0 END, dispatch_dt DESC, id DESC LIMIT ?"
-        params_cand = list(params) + [LIMIT_CANDIDATES]
-        rows = conn.execute(query_candidates, params_cand).fetchall()
-        filtered = [r for r in rows if _row_matches_q(r, q_search) and _row_matches_extra_filters(r, q_amount, q_client, q_in_name, q_phone)]
+    python_filter = q_recheck or has_extra
+
+    def _keep(r):
+        return (not q_recheck or _row_matches_q(r, q_search)) and _row_matches_extra_filters(r, q_amount, q_client, q_in_name, q_phone)
+
+    # cursor(이전 응답의 next_cursor/prev_cursor, dir=next|prev): 같은 조회 조건이면 OFFSET 없이 기준 행 다음부터 인덱스 탐색.
+    # count=approx: Python 필터 조회는 페이지 바에 필요한 만큼(현재 페이지 묶음 끝 + 1건)까지만 세어 total_pages 근사 (total_exact=False).
+    # SQL 조건만 있으면 COUNT(*)가 인덱스로 충분히 빠르므로 항상 정확한 건수
+    cursor_scope = _ledger_cursor_scope(request.args)
+    seek_key = _ledger_cursor_decode(request.args.get('cursor'), cursor_scope)
+    backward = seek_key is not None and request.args.get('dir') == 'prev'
+    count_cap = None
+    if python_filter and request.args.get('count') == 'approx':
+        count_cap = ((page - 1) // LEDGER_PAGE_BLOCK + 1) * LEDGER_PAGE_BLOCK * per_page + 1
+
+    if seek_key is not None:
+        rows = []
+        for r in _ledger_seek_rows(conn, conditions, params, seek_key, backward):
+            if not python_filter or _keep(r):
+                rows.append(r)
+                if len(rows) > per_page:
+                    break
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if backward:
+            rows.reverse()
+        has_prev, has_next = (has_more, True) if backward else (True, has_more)
+        if python_filter:
+            matched = (r for r in _ledger_seek_rows(conn, conditions, params) if _keep(r))
+            total_count = sum(1 for _ in (islice(matched, count_cap) if count_cap else matched))
+        else:
+            total_count = conn.execute("SELECT COUNT(*) FROM ledger" + base_where, params).fetchone()[0]
+    # 금액/매출처/입금자명/전화번호 필터(또는 검색어 재확인) 있을 때: SQL 결과 전체를 Python에서 필터 (count=approx면 상한 건수까지만)
+    elif python_filter:
+        query_candidates = query + base_where + LedgerQuery.ORDER_BY
+        matched = (r for r in conn.execute(query_candidates, params) if _keep(r))
+        filtered = list(islice(matched, count_cap) if count_cap else matched)
         total_count = len(filtered)
-        total_pages = max(1, (total_count + per_page - 1) // per_page)
         rows = filtered[start_idx:start_idx + per_page]
+        has_prev, has_next = page > 1, start_idx + per_page < total_count
     else:
         total_count = conn.execute("SELECT COUNT(*) FROM ledger" + base_where, params).fetchone()[0]
-        total_pages = max(1, (total_count + per_page - 1) // per_page)
-        query += base_where + " ORDER BY CASE WHEN dispatch_dt IS NULL OR dispatch_dt = '' THEN 1 ELSE 0 END, dispatch_dt DESC, id DESC LIMIT ? OFFSET ?"
+        query += base_where + LedgerQuery.ORDER_BY + " LIMIT ? OFFSET ?"
         params.extend([per_page, start_idx])
         rows = conn.execute(query, params).fetchall()
+        has_prev, has_next = page > 1, start_idx + per_page < total_count
+    total_pages = max(1, (total_count + per_page - 1) // per_page)
+    total_exact = not count_cap or total_count < count_cap
+    prev_cursor = _ledger_cursor_encode(_ledger_sort_key(rows[0]), cursor_scope) if rows and has_prev else None
+    next_cursor = _ledger_cursor_encode(_ledger_sort_key(rows[-1]), cursor_scope) if rows and has_next else None
 
     page_rows = []
     for r in rows:
-        d = dict(r)
+        d = {k: v for k, v in dict(r).items() if k not in LEDGER_DERIVED_COLS}
         # 계산서/인수증전송: 장부·정산 동일 표시를 위해 정규화 (컬럼 없을 수 있음)
         d['tax_chk'] = '발행완료' if _norm_tax_chk(d.get('tax_chk')) else ''
         d['is_mail_done'] = '확인완료' if _norm_mail_done(d.get('is_mail_done')) else '미확인'
         calc_vat_auto(d)
         # 개인/고정: 기사관리(기사현황)와 연동하여 해당 기사 값 표시
-        driver_fixed = get_driver_fixed_type(drivers_db, d.get('d_name'), d.get('c_num'))
+        driver_fixed = mem_dir.driver_fixed_type(d.get('d_name'), d.get('c_num'))
         if driver_fixed is not None:
             d['log_move'] = driver_fixed
         # 콜명(memo2)은 장부 저장값을 그대로 표시(빠른오더 공란 유지).
         # 업체비고: 업체관리(clients) 비고와 연동 — 목록 표시 시 해당 업체의 비고 표시
         c_name = (d.get('client_name') or '').strip()
         if c_name:
-            client_row = next((c for c in clients_db if (c.get('업체명') or '').strip() == c_name), None)
+            client_row = mem_dir.client(c_name)
             if client_row is not None:
                 d['client_memo'] = client_row.get('비고') or d.get('client_memo') or ''
         page_rows.append(d)
     conn.close()
-    return jsonify({"data": page_rows, "total_pages": total_pages, "current_page": page})
+    return jsonify({"data": page_rows, "total_pages": total_pages, "current_page": page, "total_exact": total_exact,
+                    "prev_cursor": prev_cursor, "next_cursor": next_cursor})
 
 
 def _excel_val_to_date_str(val, key):
@@ -6618,17 +8399,15 @@ def ledger_excel():
     order_end = request.args.get('order_end', '')
     month_end_client = request.args.get('month_end_client', '')
     month_end_driver = request.args.get('month_end_driver', '')
-    conn = connect_ledger()
-    conn.row_factory = sqlite3.Row
     query = "SELECT * FROM ledger"
     params = []
     conditions = []
     if start_dt and end_dt:
-        conditions.append(" dispatch_dt IS NOT NULL AND dispatch_dt != '' AND substr(dispatch_dt,1,10) BETWEEN ? AND ?")
+        conditions.append(" dispatch_day BETWEEN ? AND ?")
         params.extend([start_dt, end_dt])
     if order_start and order_end:
-        conditions.append(" order_dt BETWEEN ? AND ?")
-        params.extend([order_start, order_end])
+        conditions.append(" order_day BETWEEN substr(?,1,10) AND ? AND order_dt BETWEEN ? AND ?")
+        params.extend([order_start, order_end, order_start, order_end])
     if month_end_client:
         conditions.append(" (month_end_client = '1' OR month_end_client = 'Y')")
     if month_end_driver:
@@ -6636,8 +8415,6 @@ def ledger_excel():
     if conditions:
         query += " WHERE " + " AND ".join(conditions)
     query += " ORDER BY CASE WHEN dispatch_dt IS NULL OR dispatch_dt = '' THEN 1 ELSE 0 END, dispatch_dt DESC, id DESC"
-    all_rows = conn.execute(query, params).fetchall()
-    conn.close()
     # 한글 헤더 + 계산 보정. 매입계산서 사진·매출처인수증 사진은 DB에 경로(주소)로 저장되어 엑셀에도 경로가 그대로 다운로드됨
     export_cols = ledger_export_columns()
     col_keys = [k for k, _ in export_cols if k != 'id']
@@ -6647,44 +8424,27 @@ def ledger_excel():
         if k in ('month_end_client', 'month_end_driver'):
             return '확인' if str(v or '').strip() in ('1', 'Y') else ''
         return v or ''
-    rows = []
-    for r in all_rows:
-        d = dict(r)
-        calc_vat_auto(d)
-        driver_fixed = get_driver_fixed_type(drivers_db, d.get('d_name'), d.get('c_num'))
-        if driver_fixed is not None:
-            d['log_move'] = driver_fixed
-        # 콜명(memo2)은 장부 저장값을 그대로 내보냄.
-        row = [d.get('id', '')] + [_excel_cell(k, d.get(k, '')) for k in col_keys]
-        rows.append(row)
-    df = pd.DataFrame(rows if rows else [[]], columns=headers)
-    out = io.BytesIO()
-    with pd.ExcelWriter(out, engine='openpyxl') as w:
-        df.to_excel(w, index=False, sheet_name='통합장부')
-    out.seek(0)
+
+    # 커서를 순회하며 바로 xlsx 조각으로 전송 (전체 행을 메모리에 올리지 않음). 콜명(memo2)은 장부 저장값 그대로.
+    def _chunks():
+        conn = connect_ledger()
+        try:
+            rows = ([d.get('id', '')] + [_excel_cell(k, d.get(k, '')) for k in col_keys]
+                    for d in _ledger_export_row_iter(conn, query, params))
+            yield from _xlsx_stream('통합장부', headers, rows)
+        finally:
+            conn.close()
     fname = f"통합장부_{now_kst().strftime('%Y%m%d_%H%M')}.xlsx"
-    return send_file(out, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name=fname)
+    return _xlsx_stream_response(_chunks(), fname)
 
 
-@app.route('/api/ledger_upload', methods=['POST'])
-@login_required
-def ledger_upload():
-    """통합장부 엑셀 업로드 — 다운로드 양식(장부 목록 표시 순서, id + 한글 헤더)과 동일한 엑셀을 업로드하여 반영"""
-    if 'file' not in request.files:
-        return jsonify({"status": "error", "message": "파일이 없습니다."}), 400
-    file = request.files['file']
-    if not file or file.filename == '':
-        return jsonify({"status": "error", "message": "파일을 선택해 주세요."}), 400
-    if not file.filename.lower().endswith(('.xlsx', '.xls')):
-        return jsonify({"status": "error", "message": "엑셀 파일(.xlsx, .xls)만 업로드 가능합니다."}), 400
-    try:
-        xl = pd.ExcelFile(file, engine='openpyxl')
-        if '통합장부' in xl.sheet_names:
-            df = pd.read_excel(xl, sheet_name='통합장부', engine='openpyxl').fillna('')
-        else:
-            df = pd.read_excel(xl, sheet_name=0, engine='openpyxl').fillna('')
-    except Exception as e:
-        return jsonify({"status": "error", "message": f"엑셀 읽기 오류: {str(e)}"}), 400
+# 통합장부 엑셀 업로드: 한 트랜잭션에 반영하는 행 수 (쓰기 잠금 시간을 나눠 다른 요청이 끼어들 수 있게)
+LEDGER_UPLOAD_CHUNK = 1000
+LEDGER_UPLOAD_DIFF_SAMPLES = 50  # 미리보기(dry_run)에 보여줄 변경 셀 예시 수
+
+
+def _ledger_upload_header_map():
+    """업로드 엑셀 헤더 → 장부 키. (정확 일치 dict, 공백 제거 dict)"""
     # 헤더 매핑: 한글(c['n']) -> 키(c['k']), id -> id (현재 통합장부 FULL_COLUMNS만 인식)
     header_to_key = {'id': 'id'}
     for c in FULL_COLUMNS:
@@ -6710,55 +8470,93 @@ def ledger_upload():
         h_norm = re.sub(r'\s+', '', str(h))
         if h_norm and h_norm not in header_to_key_norm:
             header_to_key_norm[h_norm] = k
-    keys = [c['k'] for c in FULL_COLUMNS]
+    return header_to_key, header_to_key_norm
+
+
+def _ledger_upload_numbers(strs):
+    """숫자 컬럼 값 정제 (sanitize_ledger_value와 동일 결과) — pandas로 일괄 판정하고 애매한 값만 float()로 재확인"""
+    ok = pd.to_numeric(pd.Series(strs, dtype=object), errors='coerce').notna().tolist()
+    out = []
+    for v, good in zip(strs, ok):
+        if good or not v:
+            out.append(v)
+            continue
+        try:
+            float(v)
+            out.append(v)
+        except (ValueError, TypeError):
+            out.append('')
+    return out
+
+
+def _ledger_upload_records(df):
+    """업로드 DataFrame → 행별 장부 dict 목록. 헤더 매핑·값 변환은 컬럼 단위로 한 번에 처리.
+
+    행 dict에는 엑셀에 있는 컬럼의 키만 들어감 (부가세 자동계산·오더일 기본값 적용 후)."""
+    header_to_key, header_to_key_norm = _ledger_upload_header_map()
     date_keys = {c['k'] for c in FULL_COLUMNS if c.get('t') == 'date'}
     checkbox_keys = {'month_end_client', 'month_end_driver', 'pre_post_chk'}  # 엑셀에 "확인" 있으면 체크(1)로 저장
     # 매입계산서 사진·매출처인수증 사진: 엑셀의 경로(주소) 문자열을 그대로 DB에 저장 → 다운 양식 업로드 시 사진 경로 자동 반영
     path_keys = {'tax_img', 'ship_img'}
-    conn = connect_ledger()
-    cursor = conn.cursor()
-    inserted = updated = 0
-    today_str = now_kst().strftime('%Y-%m-%d')
-    for _, row in df.iterrows():
-        data = {}
-        for col in df.columns:
-            col_name = str(col).strip()
-            val = row.get(col, '')
-            # 구 헤더 호환: 기존 "실입출금액" 단일 값을 부호로 분리
-            #  - 값이 0 이상이면 실출금액
-            #  - 값이 0 미만이면 실입금액(절대값)
-            if re.sub(r'\s+', '', col_name) == '실입출금액':
+    n = len(df)
+    columns = []  # [(키, 행별 값 목록 — None이면 그 행에는 값 없음)], 같은 키는 뒤 컬럼이 우선
+    for col in df.columns:
+        col_name = str(col).strip()
+        raw = df[col].astype(object).tolist()
+        # 구 헤더 호환: 기존 "실입출금액" 단일 값을 부호로 분리
+        #  - 값이 0 이상이면 실출금액
+        #  - 값이 0 미만이면 실입금액(절대값)
+        if re.sub(r'\s+', '', col_name) == '실입출금액':
+            out_vals, in_vals = [None] * n, [None] * n
+            for i, val in enumerate(raw):
                 try:
                     fv = float(val)
-                    if fv >= 0:
-                        data['real_out_amt'] = str(fv)
-                    else:
-                        data['real_in_amt'] = str(abs(fv))
                 except (ValueError, TypeError):
-                    pass
-                continue
-
-            key = header_to_key.get(col_name)
-            if not key:
-                # 공백 제거 후 매칭 시도 (오늘 수정 이전에 다운로드한 엑셀 헤더와도 호환)
-                key = header_to_key_norm.get(re.sub(r'\s+', '', col_name))
-            if key:
-                try:
-                    if val is None or pd.isna(val): val = ''
-                except (TypeError, ValueError):
-                    pass
-                # 날짜 타입 컬럼: 항상 변환 적용 (빈값/시리얼/문자열/객체 → YYYY-MM-DD 또는 '')
-                if key in date_keys:
-                    val = _excel_val_to_date_str(val, key)
-                elif key in path_keys:
-                    # 매입계산서 사진·매출처인수증 사진: 경로(주소) 문자열 그대로 보존 (쉼표 구분 다중 경로 포함)
-                    val = str(val).strip() if val != '' and not pd.isna(val) else ''
-                elif key != 'id' and val != '':
-                    val = str(val) if not pd.isna(val) else ''
-                data[key] = sanitize_ledger_value(key, str(val)) if key != 'id' else str(val).strip()
-                # 매출처/매입처 합산발행: 셀에 "확인" 있으면 체크(1), 없으면 미체크('')
-                if key in checkbox_keys:
-                    data[key] = '1' if ('확인' in str(val) or str(val).strip() in ('1', 'Y', '1.0')) else ''
+                    continue
+                if fv >= 0:
+                    out_vals[i] = str(fv)
+                else:
+                    in_vals[i] = str(abs(fv))
+            columns.append(('real_out_amt', out_vals))
+            columns.append(('real_in_amt', in_vals))
+            continue
+        key = header_to_key.get(col_name)
+        if not key:
+            # 공백 제거 후 매칭 시도 (오늘 수정 이전에 다운로드한 엑셀 헤더와도 호환)
+            key = header_to_key_norm.get(re.sub(r'\s+', '', col_name))
+        if not key:
+            continue
+        na = df[col].isna().tolist()
+        vals = ['' if is_na else v for v, is_na in zip(raw, na)]
+        if key == 'id':
+            columns.append((key, [str(v).strip() for v in vals]))
+            continue
+        # 날짜 타입 컬럼: 항상 변환 적용 (빈값/시리얼/문자열/객체 → YYYY-MM-DD 또는 '')
+        if key in date_keys:
+            vals = [_excel_val_to_date_str(v, key) for v in vals]
+        elif key in path_keys:
+            # 매입계산서 사진·매출처인수증 사진: 경로(주소) 문자열 그대로 보존 (쉼표 구분 다중 경로 포함)
+            vals = [str(v).strip() if v != '' else '' for v in vals]
+        else:
+            vals = [str(v) if v != '' else '' for v in vals]
+        if key in checkbox_keys:
+            # 매출처/매입처 합산발행: 셀에 "확인" 있으면 체크(1), 없으면 미체크('')
+            vals = ['1' if ('확인' in v or v.strip() in ('1', 'Y', '1.0')) else '' for v in vals]
+        elif FULL_COLUMN_TYPES.get(key) == 'number':
+            vals = _ledger_upload_numbers([v.strip() for v in vals])
+        else:
+            vals = [sanitize_ledger_value(key, v) for v in vals]
+        columns.append((key, vals))
+    if not columns:
+        return []
+    today_str = now_kst().strftime('%Y-%m-%d')
+    records = []
+    for i in range(n):
+        data = {}
+        for key, vals in columns:
+            v = vals[i]
+            if v is not None:
+                data[key] = v
         if not data:
             continue
         # 오더일: 업로드에 입력된 값 유지. 비어 있을 때만 오늘로 설정 (통계 기간 필터용)
@@ -6768,28 +8566,154 @@ def ledger_upload():
         else:
             data['order_dt'] = str(od)[:10].replace('/', '-')
         calc_vat_auto(data)
+        records.append(data)
+    return records
+
+
+def _ledger_upload_plan(conn, records):
+    """업로드 행을 현재 장부와 비교해 반영 계획 작성 (DB 변경 없음).
+
+    대상 id의 현재 행을 한 번의 조회(json_each)로 읽어 컬럼 단위로 비교하고, 수정 행은 바뀐 컬럼만 남긴다.
+    같은 id가 여러 행이면 마지막 행 기준. NULL과 빈 문자열, 숫자·금액 컬럼(텍스트 타입인 선착불 포함)의 '50000'과 '50000.0'(엑셀 실수)은 같은 값으로 본다.
+    반환: {'inserts': [값 목록], 'updates': [(id, {키: 새 값})], 'unchanged': 건수,
+           'col_counts': {키: 바뀐 행 수}, 'samples': [{id, key, old, new}]}"""
+    keys = [c['k'] for c in FULL_COLUMNS]
+    parsed = []
+    for data in records:
         lid = data.get('id', '')
         try:
             target_id = int(float(str(lid).strip())) if lid else 0
         except (ValueError, TypeError):
             target_id = 0
-        if target_id > 0:
-            cursor.execute("SELECT 1 FROM ledger WHERE id = ?", (target_id,))
-            if cursor.fetchone():
-                sql = ", ".join([f"[{k}] = ?" for k in keys])
-                vals = [data.get(k, '') for k in keys] + [target_id]
-                cursor.execute(f"UPDATE ledger SET {sql} WHERE id = ?", vals)
-                updated += 1
-                continue
-        # 신규 삽입 (id 없거나 DB에 없음)
-        data.pop('id', None)
-        placeholders = ", ".join(['?'] * len(keys))
-        cursor.execute(f"INSERT INTO ledger ({', '.join([f'[{k}]' for k in keys])}) VALUES ({placeholders})", [data.get(k, '') for k in keys])
-        inserted += 1
-    conn.commit()
-    conn.close()
-    load_db_to_mem()
-    return jsonify({"status": "success", "message": f"반영 완료: 신규 {inserted}건, 수정 {updated}건. 통계 페이지를 새로고침하면 반영됩니다."})
+        parsed.append((target_id, data))
+    cand_ids = sorted({tid for tid, _ in parsed if tid > 0})
+    current = {}
+    if cand_ids:
+        cols_sql = ', '.join(f'[{k}]' for k in keys)
+        for row in conn.execute(f"SELECT id, {cols_sql} FROM ledger WHERE id IN (SELECT value FROM json_each(?))",
+                                (json.dumps(cand_ids),)):
+            current[row[0]] = row[1:]
+    inserts = []
+    targets = {}
+    for tid, data in parsed:
+        if tid in current:
+            targets[tid] = data
+        else:
+            # 신규 삽입 (id 없거나 DB에 없음)
+            inserts.append([data.get(k, '') for k in keys])
+    # number 타입 + 합계 금액 컬럼(선착불은 text 타입)
+    number_keys = {k for k in keys if FULL_COLUMN_TYPES.get(k) == 'number' or k in LEDGER_TOTALS_COLS}
+
+    def _same(k, old, new):
+        if old == new:
+            return True
+        if k in number_keys and old and new:
+            try:
+                return float(old) == float(new)
+            except (ValueError, TypeError):
+                return False
+        return False
+
+    updates = []
+    col_counts = defaultdict(int)
+    samples = []
+    for tid, data in targets.items():
+        changed = {}
+        for k, old in zip(keys, current[tid]):
+            new = data.get(k, '')
+            if not _same(k, '' if old is None else str(old), new):
+                changed[k] = new
+                col_counts[k] += 1
+                if len(samples) < LEDGER_UPLOAD_DIFF_SAMPLES:
+                    samples.append({'id': tid, 'key': k, 'old': '' if old is None else str(old), 'new': new})
+        if changed:
+            updates.append((tid, changed))
+    return {'inserts': inserts, 'updates': updates, 'unchanged': len(targets) - len(updates),
+            'col_counts': dict(col_counts), 'samples': samples}
+
+
+def _ledger_upload_apply(conn, plan):
+    """반영 계획 실행: 수정 행은 바뀐 컬럼만 UPDATE(같은 컬럼 조합끼리 executemany), 신규 행은 INSERT.
+    LEDGER_UPLOAD_CHUNK행씩 트랜잭션으로 나눠 커밋.
+
+    반환: (신규 건수, 수정 건수, 오류 메시지 또는 None). 오류 시 그 청크만 되돌리고 이전 청크는 반영된 상태."""
+    keys = [c['k'] for c in FULL_COLUMNS]
+    insert_sql = f"INSERT INTO ledger ({', '.join(f'[{k}]' for k in keys)}) VALUES ({', '.join(['?'] * len(keys))})"
+    inserted = updated = 0
+    updates, inserts = plan['updates'], plan['inserts']
+    for start in range(0, len(updates) + len(inserts), LEDGER_UPLOAD_CHUNK):
+        upd_chunk = updates[start:start + LEDGER_UPLOAD_CHUNK]
+        ins_from = max(0, start - len(updates))
+        ins_chunk = inserts[ins_from:ins_from + LEDGER_UPLOAD_CHUNK - len(upd_chunk)]
+        by_cols = defaultdict(list)
+        for tid, changed in upd_chunk:
+            cols = tuple(changed)
+            by_cols[cols].append([changed[k] for k in cols] + [tid])
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            touched_ids = [tid for tid, _ in upd_chunk]  # 수금·지급 상태 컬럼 재계산 대상
+            for cols, rows in by_cols.items():
+                conn.executemany(f"UPDATE ledger SET {', '.join(f'[{k}] = ?' for k in cols)} WHERE id = ?", rows)
+            if ins_chunk:
+                max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM ledger").fetchone()[0]
+                conn.executemany(insert_sql, ins_chunk)
+                touched_ids.extend(r[0] for r in conn.execute("SELECT id FROM ledger WHERE id > ?", (max_id,)))
+            _refresh_ledger_status_cols(conn, touched_ids)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"[ledger_upload error] {e}")
+            return inserted, updated, str(e)
+        inserted += len(ins_chunk)
+        updated += len(upd_chunk)
+    return inserted, updated, None
+
+
+@app.route('/api/ledger_upload', methods=['POST'])
+@login_required
+def ledger_upload():
+    """통합장부 엑셀 업로드 — 다운로드 양식(장부 목록 표시 순서, id + 한글 헤더)과 동일한 엑셀을 업로드하여 반영
+
+    form dry_run=1: 반영하지 않고 현재 장부와의 차이(신규·수정·변경 없음 건수, 컬럼별 변경 수, 변경 셀 예시)만 반환.
+    반영 시 기존 행은 바뀐 컬럼만 UPDATE."""
+    if 'file' not in request.files:
+        return jsonify({"status": "error", "message": "파일이 없습니다."}), 400
+    file = request.files['file']
+    if not file or file.filename == '':
+        return jsonify({"status": "error", "message": "파일을 선택해 주세요."}), 400
+    if not file.filename.lower().endswith(('.xlsx', '.xls')):
+        return jsonify({"status": "error", "message": "엑셀 파일(.xlsx, .xls)만 업로드 가능합니다."}), 400
+    try:
+        xl = pd.ExcelFile(file, engine='openpyxl')
+        if '통합장부' in xl.sheet_names:
+            df = pd.read_excel(xl, sheet_name='통합장부', engine='openpyxl').fillna('')
+        else:
+            df = pd.read_excel(xl, sheet_name=0, engine='openpyxl').fillna('')
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"엑셀 읽기 오류: {str(e)}"}), 400
+    dry_run = str(request.form.get('dry_run') or '').strip().lower() in ('1', 'true', 'y')
+    records = _ledger_upload_records(df)
+    conn = connect_ledger()
+    try:
+        plan = _ledger_upload_plan(conn, records)
+        if dry_run:
+            names = {c['k']: c['n'] for c in FULL_COLUMNS}
+            columns = sorted(plan['col_counts'].items(), key=lambda kv: -kv[1])
+            return jsonify({
+                "status": "success",
+                "dry_run": True,
+                "insert": len(plan['inserts']),
+                "update": len(plan['updates']),
+                "unchanged": plan['unchanged'],
+                "columns": [{"key": k, "name": names.get(k, k), "count": n} for k, n in columns],
+                "samples": [dict(d, name=names.get(d['key'], d['key'])) for d in plan['samples']],
+            })
+        inserted, updated, error = _ledger_upload_apply(conn, plan)
+    finally:
+        conn.close()
+    if error:
+        return jsonify({"status": "error", "message": f"업로드 중 오류 (신규 {inserted}건, 수정 {updated}건까지 반영됨): {error}"}), 500
+    return jsonify({"status": "success", "message": f"반영 완료: 신규 {inserted}건, 수정 {updated}건, 변경 없음 {plan['unchanged']}건. 통계 페이지를 새로고침하면 반영됩니다."})
 
 
 @app.route('/api/get_ledger_row/<int:row_id>')
@@ -6801,20 +8725,20 @@ def get_ledger_row(row_id):
     conn.close()
     if not row:
         return jsonify({"error": "not found"}), 404
-    d = dict(row)
+    d = {k: v for k, v in dict(row).items() if k not in LEDGER_DERIVED_COLS}
     # 계산서/인수증전송: 장부·정산 동일 표시를 위해 저장값 정규화하여 반환 (컬럼 없을 수 있음)
     d['tax_chk'] = '발행완료' if _norm_tax_chk(d.get('tax_chk')) else ''
     d['is_mail_done'] = '확인완료' if _norm_mail_done(d.get('is_mail_done')) else '미확인'
     calc_vat_auto(d)
     # 개인/고정: 기사관리와 연동
-    driver_fixed = get_driver_fixed_type(drivers_db, d.get('d_name'), d.get('c_num'))
+    driver_fixed = mem_dir.driver_fixed_type(d.get('d_name'), d.get('c_num'))
     if driver_fixed is not None:
         d['log_move'] = driver_fixed
     # 콜명(memo2): 장부 저장값을 그대로 반환
     d_name = (d.get('d_name') or '').strip()
     c_num = (d.get('c_num') or '').strip()
     if d_name or c_num:
-        driver_row = next((dr for dr in drivers_db if (dr.get('기사명') or '').strip() == d_name and (dr.get('차량번호') or '').strip() == c_num), None)
+        driver_row = mem_dir.driver(d_name, c_num)
         if driver_row is not None:
             # 정산관리 매입처 정보 모달용: 기사관리(드라이버) 전체 정보
             _driver_cols = ["기사명", "차량번호", "연락처", "은행명", "계좌번호", "예금주", "사업자번호", "사업자", "개인/고정", "메모"]
@@ -6839,7 +8763,6 @@ def ledger_delete_all_api():
     conn.execute("INSERT INTO activity_logs (action, target_id, details) VALUES (?, ?, ?)", ("장부전체삭제", 0, f"장부 {count}건 전체 삭제"))
     conn.commit()
     conn.close()
-    load_db_to_mem()
     return jsonify({"status": "success", "message": f"장부 {count}건이 전체 삭제되었습니다."})
 
 
@@ -6891,6 +8814,7 @@ def recall_ledger_api(row_id):
     cursor.execute(f"INSERT INTO ledger ({', '.join([f'[{k}]' for k in keys])}) VALUES ({placeholders})", [data.get(k, '') for k in keys])
     new_id = cursor.lastrowid
     cursor.execute("INSERT INTO activity_logs (action, target_id, details) VALUES (?, ?, ?)", ("재호출", new_id, f"원본 ID {row_id} → 신규 ID {new_id}"))
+    _refresh_ledger_status_cols(conn, [new_id])
     conn.commit()
     conn.close()
     return jsonify({"status": "success", "id": new_id})
@@ -6899,6 +8823,93 @@ def recall_ledger_api(row_id):
 # update_status에서 허용할 컬럼명 화이트리스트 (SQL injection 방지)
 ALLOWED_STATUS_KEYS = {c['k'] for c in FULL_COLUMNS} | {'tax_chk', 'is_mail_done', 'memo1_bg'}  # memo1_bg=비고란 셀 배경색
 
+def _apply_status_update(conn, row_id, key, data, dir_drivers, dir_clients):
+    """장부 1행의 단일 항목 변경(+연동 컬럼·부가세 재계산·기사/업체관리 동기화) 기록 (commit은 호출하는 쪽에서).
+
+    conn.row_factory는 sqlite3.Row. data: 요청 항목 {id, key, value}.
+    기사·업체관리를 바꾼 경우 dir_drivers/dir_clients에 추가. 반환: 활동 로그 문구"""
+    cursor = conn.cursor()
+    display_name = next((col['n'] for col in FULL_COLUMNS if col['k'] == key), key)
+    val = data.get('value')
+    # 계산서/인수증전송: 장부·정산 연동을 위해 DB에는 항상 동일한 값만 저장
+    if key == 'tax_chk':
+        val = '발행완료' if (val and str(val).strip() == '발행완료') else ''
+    if key == 'is_mail_done':
+        val = '확인완료' if (val and str(val).strip() == '확인완료') else '미확인'
+    # 현재 행을 한 번 읽어 두고, 연동 컬럼·자동계산 값을 모아 바뀐 컬럼만 한 번에 UPDATE
+    cur_row = cursor.execute("SELECT * FROM ledger WHERE id = ?", (row_id,)).fetchone()
+    current = dict(cur_row) if cur_row else {}
+    changes = {key: val}
+    if key == 'out_dt':
+        changes['pay_click_miju'] = ''
+    if key == 'in_dt':
+        changes['in_click_misu'] = ''
+    # 계산서 발행완료 시 계산서발행일(tax_dt) 동시 설정, 취소 시 비움
+    if key == 'tax_chk':
+        changes['tax_dt'] = now_kst().strftime('%Y-%m-%d') if (val == '발행완료') else ''
+    # tax_dt 변경 시 tax_chk 연동 (날짜 있음 → 발행완료, 없음 → '')
+    if key == 'tax_dt':
+        v = data.get('value')
+        changes['tax_chk'] = '발행완료' if (v and str(v).strip()) else ''
+    # 개인/고정: 기사관리와 연동 — 장부에서 변경 시 해당 기사의 기사관리(개인/고정)도 동기화
+    if key == 'log_move' and cur_row and (current.get('d_name') or current.get('c_num')):
+        d_name, c_num = current.get('d_name') or '', current.get('c_num') or ''
+        if _dir_write(cursor, 'drivers', {'기사명': d_name, '차량번호': c_num},
+                      {'개인/고정': str(data.get('value', '')).strip()}, insert_extra={}):
+            dir_drivers.append((d_name, c_num))
+    # is_mail_done(인수증전송확인) 변경 시 mail_dt(인수증전송일) 연동 — 확인완료면 오늘 날짜, 아니면 비움
+    if key == 'is_mail_done':
+        changes['mail_dt'] = now_kst().strftime('%Y-%m-%d') if (val == '확인완료') else ''
+    # mail_dt(인수증전송일) 변경 시 is_mail_done 연동 (날짜 있음 → 확인완료, 없음 → 미확인)
+    if key == 'mail_dt':
+        v = data.get('value')
+        changes['is_mail_done'] = '확인완료' if (v and str(v).strip()) else '미확인'
+    # 부가세·합계 재계산 대상: 결제방법(현금/이체), 현금확인(tax_biz) '현금' 표기 시 매입부가세 0, 업체·기사운임 변경
+    recalc_keys = ()
+    if key in ('pay_method_client', 'pay_method_driver'):
+        recalc_keys = ('vat1', 'total1', 'vat2', 'total2', 'net_profit', 'vat_final')
+    elif key == 'tax_biz':
+        recalc_keys = ('vat2', 'total2', 'net_profit', 'vat_final')
+    elif key in ('fee', 'fee_out'):
+        recalc_keys = ('sup_val', 'vat1', 'total1', 'vat2', 'total2', 'net_profit', 'vat_final')
+    if recalc_keys and cur_row:
+        d = dict(current, **changes)
+        calc_vat_auto(d)
+        for k in recalc_keys:
+            changes[k] = d.get(k, '')
+    # 매출처현금(업체 현금) 선택 시 매출처 계산서발행일 상태를 계산서발급확인으로,
+    # 발행(이체) 선택 시 미발행으로 자동 전환
+    if key == 'pay_method_client':
+        if str(val or '').strip() == '현금':
+            changes['month_val'] = '현금'
+            tax_dt_now = (current.get('tax_dt') or '').strip()
+            tax_chk_now = (current.get('tax_chk') or '').strip()
+            if cur_row and not tax_dt_now and str(tax_chk_now) != '발행완료':
+                changes['tax_chk'] = '발행완료'
+                changes['tax_dt'] = now_kst().strftime('%Y-%m-%d')
+        else:
+            changes['tax_chk'] = ''
+            changes['tax_dt'] = ''
+    # 매입처 현금(기사 현금) 선택 시 공급자 계산서 발행일을 확인완료(오늘 날짜)로,
+    # 발행(이체) 선택 시 미확인(빈값)으로 자동 전환
+    if key == 'pay_method_driver':
+        changes['issue_dt'] = now_kst().strftime('%Y-%m-%d') if str(val or '').strip() == '현금' else ''
+    # 업체비고(client_memo): 장부목록에서 변경 시 업체관리(clients) 비고와 연동
+    if key == 'client_memo' and (current.get('client_name') or '').strip():
+        if _dir_write(cursor, 'clients', {'업체명': current['client_name'].strip()},
+                      {'비고': str(data.get('value', '')).strip()}):
+            dir_clients.append(current['client_name'])
+    # 비고(memo2): 장부목록에서 변경 시 기사관리(기사 비고/메모)와 연동
+    if key == 'memo2' and cur_row and (current.get('d_name') or current.get('c_num')):
+        d_name, c_num = current.get('d_name') or '', current.get('c_num') or ''
+        if _dir_write(cursor, 'drivers', {'기사명': d_name, '차량번호': c_num},
+                      {'메모': str(data.get('value', '')).strip()}, insert_extra={}):
+            dir_drivers.append((d_name, c_num))
+    if cur_row:
+        _ledger_update_changed(conn, row_id, changes, current)
+    return f"[{display_name}] 항목이 '{data.get('value')}'(으)로 변경됨"
+
+
 @app.route('/api/update_status', methods=['POST'])
 @login_required 
 def update_status():
@@ -6915,110 +8926,17 @@ def update_status():
     conn = connect_ledger()
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
+    dir_drivers = []  # 기사관리·업체관리 연동으로 바뀐 (기사명, 차량번호) / 업체명 — 메모리 디렉터리 행 단위 반영용
+    dir_clients = []
     try:
-        display_name = next((col['n'] for col in FULL_COLUMNS if col['k'] == key), key)
-        val = data.get('value')
-        # 계산서/인수증전송: 장부·정산 연동을 위해 DB에는 항상 동일한 값만 저장
-        if key == 'tax_chk':
-            val = '발행완료' if (val and str(val).strip() == '발행완료') else ''
-        if key == 'is_mail_done':
-            val = '확인완료' if (val and str(val).strip() == '확인완료') else '미확인'
-        cursor.execute(f"UPDATE ledger SET [{key}] = ? WHERE id = ?", (val, row_id))
-        if key == 'out_dt':
-            cursor.execute("UPDATE ledger SET pay_click_miju = ? WHERE id = ?", ('', row_id))
-        if key == 'in_dt':
-            cursor.execute("UPDATE ledger SET in_click_misu = ? WHERE id = ?", ('', row_id))
-        # 계산서 발행완료 시 계산서발행일(tax_dt) 동시 설정, 취소 시 비움
-        if key == 'tax_chk':
-            tax_dt_val = now_kst().strftime('%Y-%m-%d') if (val == '발행완료') else ''
-            cursor.execute("UPDATE ledger SET tax_dt = ? WHERE id = ?", (tax_dt_val, row_id))
-        # tax_dt 변경 시 tax_chk 연동 (날짜 있음 → 발행완료, 없음 → '')
-        if key == 'tax_dt':
-            v = data.get('value')
-            tax_chk_val = '발행완료' if (v and str(v).strip()) else ''
-            cursor.execute("UPDATE ledger SET tax_chk = ? WHERE id = ?", (tax_chk_val, row_id))
-        # 개인/고정: 기사관리와 연동 — 장부에서 변경 시 해당 기사의 기사관리(개인/고정)도 동기화
-        if key == 'log_move':
-            row = cursor.execute("SELECT d_name, c_num FROM ledger WHERE id = ?", (row_id,)).fetchone()
-            if row and (row[0] or row[1]):
-                cursor.execute("UPDATE drivers SET [개인/고정] = ? WHERE 기사명 = ? AND 차량번호 = ?",
-                               (str(data.get('value', '')).strip(), row[0] or '', row[1] or ''))
-                if cursor.rowcount == 0:
-                    cursor.execute("INSERT INTO drivers (기사명, 차량번호, [개인/고정]) VALUES (?, ?, ?)",
-                                   (row[0] or '', row[1] or '', str(data.get('value', '')).strip()))
-        # is_mail_done(인수증전송확인) 변경 시 mail_dt(인수증전송일) 연동 — 확인완료면 오늘 날짜, 아니면 비움
-        if key == 'is_mail_done':
-            mail_dt_val = now_kst().strftime('%Y-%m-%d') if (val == '확인완료') else ''
-            cursor.execute("UPDATE ledger SET mail_dt = ? WHERE id = ?", (mail_dt_val, row_id))
-        # mail_dt(인수증전송일) 변경 시 is_mail_done 연동 (날짜 있음 → 확인완료, 없음 → 미확인)
-        if key == 'mail_dt':
-            v = data.get('value')
-            mail_done_val = '확인완료' if (v and str(v).strip()) else '미확인'
-            cursor.execute("UPDATE ledger SET is_mail_done = ? WHERE id = ?", (mail_done_val, row_id))
-        if key in ('pay_method_client', 'pay_method_driver'):
-            row = cursor.execute("SELECT * FROM ledger WHERE id = ?", (row_id,)).fetchone()
-            if row:
-                d = dict(row)
-                calc_vat_auto(d)
-                for k in ('vat1', 'total1', 'vat2', 'total2', 'net_profit', 'vat_final'):
-                    cursor.execute(f"UPDATE ledger SET [{k}] = ? WHERE id = ?", (d.get(k, ''), row_id))
-            # 매출처현금(업체 현금) 선택 시 매출처 계산서발행일 상태를 계산서발급확인으로,
-            # 발행(이체) 선택 시 미발행으로 자동 전환
-            if key == 'pay_method_client':
-                is_cash_client = (str(val or '').strip() == '현금')
-                if is_cash_client:
-                    cursor.execute("UPDATE ledger SET month_val = ? WHERE id = ?", ('현금', row_id))
-                    row2 = cursor.execute("SELECT tax_dt, tax_chk FROM ledger WHERE id = ?", (row_id,)).fetchone()
-                    tax_dt_now = (row2['tax_dt'] or '').strip() if row2 else ''
-                    tax_chk_now = (row2['tax_chk'] or '').strip() if row2 else ''
-                    if not tax_dt_now and str(tax_chk_now) != '발행완료':
-                        cursor.execute(
-                            "UPDATE ledger SET tax_chk = ?, tax_dt = ? WHERE id = ?",
-                            ('발행완료', now_kst().strftime('%Y-%m-%d'), row_id),
-                        )
-                else:
-                    cursor.execute("UPDATE ledger SET tax_chk = ?, tax_dt = ? WHERE id = ?", ('', '', row_id))
-            # 매입처 현금(기사 현금) 선택 시 공급자 계산서 발행일을 확인완료(오늘 날짜)로,
-            # 발행(이체) 선택 시 미확인(빈값)으로 자동 전환
-            if key == 'pay_method_driver':
-                is_cash_driver = (str(val or '').strip() == '현금')
-                issue_dt_val = now_kst().strftime('%Y-%m-%d') if is_cash_driver else ''
-                cursor.execute("UPDATE ledger SET issue_dt = ? WHERE id = ?", (issue_dt_val, row_id))
-        # 현금확인(tax_biz) 변경 시 '현금' 표기면 매입부가세 0으로 재계산
-        if key == 'tax_biz':
-            row = cursor.execute("SELECT * FROM ledger WHERE id = ?", (row_id,)).fetchone()
-            if row:
-                d = dict(row)
-                calc_vat_auto(d)
-                for k in ('vat2', 'total2', 'net_profit', 'vat_final'):
-                    cursor.execute(f"UPDATE ledger SET [{k}] = ? WHERE id = ?", (d.get(k, ''), row_id))
-        # 업체운임(fee)·기사운임(fee_out) 변경 시 공급가액·부가세·합계 재계산
-        if key in ('fee', 'fee_out'):
-            row = cursor.execute("SELECT * FROM ledger WHERE id = ?", (row_id,)).fetchone()
-            if row:
-                d = dict(row)
-                calc_vat_auto(d)
-                for k in ('sup_val', 'vat1', 'total1', 'vat2', 'total2', 'net_profit', 'vat_final'):
-                    cursor.execute(f"UPDATE ledger SET [{k}] = ? WHERE id = ?", (d.get(k, ''), row_id))
-        # 업체비고(client_memo): 장부목록에서 변경 시 업체관리(clients) 비고와 연동
-        if key == 'client_memo':
-            row = cursor.execute("SELECT client_name FROM ledger WHERE id = ?", (row_id,)).fetchone()
-            if row and (row[0] or '').strip():
-                cursor.execute("UPDATE clients SET [비고] = ? WHERE 업체명 = ?",
-                               (str(data.get('value', '')).strip(), (row[0] or '').strip()))
-        # 비고(memo2): 장부목록에서 변경 시 기사관리(기사 비고/메모)와 연동
-        if key == 'memo2':
-            row = cursor.execute("SELECT d_name, c_num FROM ledger WHERE id = ?", (row_id,)).fetchone()
-            if row and (row[0] or row[1]):
-                cursor.execute("UPDATE drivers SET [메모] = ? WHERE 기사명 = ? AND 차량번호 = ?",
-                               (str(data.get('value', '')).strip(), row[0] or '', row[1] or ''))
-                if cursor.rowcount == 0:
-                    cursor.execute("INSERT INTO drivers (기사명, 차량번호, [메모]) VALUES (?, ?, ?)",
-                                   (row[0] or '', row[1] or '', str(data.get('value', '')).strip()))
-        log_details = f"[{display_name}] 항목이 '{data.get('value')}'(으)로 변경됨"
+        log_details = _apply_status_update(conn, row_id, key, data, dir_drivers, dir_clients)
         cursor.execute("INSERT INTO activity_logs (action, target_id, details) VALUES (?, ?, ?)",
                        ("상태변경", row_id, log_details))
+        dir_gen = _dir_gen_bump(conn) if (dir_drivers or dir_clients) else None
+        _refresh_ledger_status_cols(conn, [row_id])
         conn.commit()
+        if dir_gen is not None:
+            _mem_dir_apply(conn, dir_gen, driver_keys=dir_drivers, client_names=dir_clients)
     except sqlite3.OperationalError as e:
         try:
             conn.rollback()
@@ -7033,11 +8951,88 @@ def update_status():
             conn.close()
         except Exception:
             pass
-    if key in ('log_move', 'client_memo', 'memo2'):
-        load_db_to_mem()
     return jsonify({"status": "success"})
 
 
+UPDATE_STATUS_BATCH_MAX = 5000  # 일괄 상태변경 1회 요청 최대 항목 수
+# 일괄 변경에서 이미 값이 있는 행은 건너뛰는 항목 (기본값 only_if_empty=true) — 수금·지급·계산서 완료 행의 실제 날짜 보존.
+# 정산관리 행별 수금·지급 버튼이 완료 행을 다시 찍지 않는 것과 같은 규칙. 값: 행에 이미 값이 있는지 판별할 컬럼
+BATCH_ONLY_IF_EMPTY_COLS = {
+    'in_dt': ('in_dt',),
+    'out_dt': ('out_dt',),
+    'tax_chk': ('tax_chk', 'tax_dt'),
+}
+
+
+def _batch_item_already_set(conn, row_id, it):
+    """일괄 변경 항목 it가 건너뛸 대상인지: 빈 값이 아닌 값으로 설정하는데 행에 이미 값이 있음 (only_if_empty=false면 항상 적용)"""
+    cols = BATCH_ONLY_IF_EMPTY_COLS.get(it['key'])
+    if not cols or it.get('only_if_empty', True) is False or not str(it.get('value') or '').strip():
+        return False
+    row = conn.execute(f"SELECT {', '.join(cols)} FROM ledger WHERE id = ?", (row_id,)).fetchone()
+    return bool(row) and any(str(v or '').strip() for v in row)
+
+
+@app.route('/api/update_status_batch', methods=['POST'])
+@login_required
+def update_status_batch():
+    """여러 행 상태 일괄 변경 — body: {items: [{id, key, value, only_if_empty}, ...]}.
+    /api/update_status와 같은 규칙을 항목 순서대로 적용하고, 한 트랜잭션·활동 로그 일괄 기록으로 반영.
+    수금일·지급일·계산서 발행완료는 이미 값이 있는 행을 건너뜀(BATCH_ONLY_IF_EMPTY_COLS). 반환: count(변경), skipped(건너뜀)"""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"status": "error", "message": "invalid request"}), 400
+    items = body.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({"status": "error", "message": "변경할 항목이 없습니다."}), 400
+    if len(items) > UPDATE_STATUS_BATCH_MAX:
+        return jsonify({"status": "error", "message": f"한 번에 최대 {UPDATE_STATUS_BATCH_MAX}건까지 변경할 수 있습니다."}), 400
+    parsed = []
+    for it in items:
+        if not isinstance(it, dict) or it.get('key') not in ALLOWED_STATUS_KEYS:
+            return jsonify({"status": "error", "message": "invalid key"}), 400
+        try:
+            row_id = int(it.get('id', 0))
+        except (ValueError, TypeError):
+            row_id = 0
+        if row_id <= 0:
+            return jsonify({"status": "error", "message": "invalid id"}), 400
+        parsed.append((row_id, it))
+    conn = connect_ledger()
+    conn.row_factory = sqlite3.Row
+    dir_drivers = []
+    dir_clients = []
+    skipped = []
+    try:
+        logs = []
+        for row_id, it in parsed:
+            if _batch_item_already_set(conn, row_id, it):
+                skipped.append(row_id)
+                continue
+            logs.append(("상태변경", row_id, _apply_status_update(conn, row_id, it['key'], it, dir_drivers, dir_clients)))
+        conn.executemany("INSERT INTO activity_logs (action, target_id, details) VALUES (?, ?, ?)", logs)
+        dir_gen = _dir_gen_bump(conn) if (dir_drivers or dir_clients) else None
+        _refresh_ledger_status_cols(conn, sorted({row_id for _, row_id, _ in logs}))
+        conn.commit()
+        if dir_gen is not None:
+            _mem_dir_apply(conn, dir_gen, driver_keys=dir_drivers, client_names=dir_clients)
+    except sqlite3.OperationalError as e:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        err = str(e).lower()
+        if 'locked' in err or 'busy' in err:
+            return jsonify({"status": "error", "message": "DB가 잠겨 있습니다. 잠시 후 다시 시도해 주세요."}), 503
+        raise
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    return jsonify({"status": "success", "count": len(parsed) - len(skipped), "skipped": len(skipped), "skipped_ids": skipped})
+
+
 @app.route('/api/toggle_settlement_pay', methods=['POST'])
 @login_required
 def toggle_settlement_pay():
@@ -7076,6 +9071,7 @@ def toggle_settlement_pay():
             log_details = f"[지급일] 지급완료로 전환 (지급일 {today_s})"
     cursor.execute("INSERT INTO activity_logs (action, target_id, details) VALUES (?, ?, ?)",
                    ("상태변경", row_id, log_details))
+    _refresh_ledger_status_cols(conn, [row_id])
     conn.commit()
     conn.close()
     return jsonify({"status": "success"})
@@ -7120,6 +9116,7 @@ def toggle_settlement_in():
             log_details = f"[수금일] 수금완료로 전환 (수금일 {today_s})"
     cursor.execute("INSERT INTO activity_logs (action, target_id, details) VALUES (?, ?, ?)",
                    ("상태변경", row_id, log_details))
+    _refresh_ledger_status_cols(conn, [row_id])
     conn.commit()
     conn.close()
     return jsonify({"status": "success"})
@@ -7160,7 +9157,7 @@ def export_clients():
     # 컬럼 순서: 비고, 사업자구분, 결제특이사항, 발행구분, 사업자등록번호, 대표자명, 사업자주소, 업태, 종목, 메일주소, 오더일, 노선, 공급가액
     export_cols = ['비고', '사업자구분', '결제특이사항', '발행구분', '사업자등록번호', '대표자명', '사업자주소', '업태', '종목', '메일주소', '오더일', '노선', '공급가액']
     export_data = []
-    for c in clients_db:
+    for c in mem_dir.clients:
         cname = (c.get('업체명') or '').strip()
         order_info = latest_order.get(cname, {'오더일': '', '노선': '', '공급가액': ''})
         row = {
@@ -7190,9 +9187,12 @@ def export_clients():
 @login_required
 def api_delete_client(row_id):
     conn = connect_ledger()
+    row = conn.execute("SELECT 업체명 FROM clients WHERE rowid = ?", (row_id,)).fetchone()
     conn.execute("DELETE FROM clients WHERE rowid = ?", (row_id,))
-    conn.commit(); conn.close()
-    load_db_to_mem()
+    dir_gen = _dir_gen_bump(conn)
+    conn.commit()
+    _mem_dir_apply(conn, dir_gen, client_names=[row[0]] if row else [])
+    conn.close()
     return jsonify({"status": "success"})
 
 @app.route('/api/update_client/<int:row_id>', methods=['POST'])
@@ -7213,16 +9213,19 @@ def api_update_client(row_id):
         conn.close()
         return jsonify({"status": "error", "message": "수정할 데이터 없음"}), 400
     vals.append(row_id)
+    old = cursor.execute("SELECT 업체명 FROM clients WHERE rowid = ?", (row_id,)).fetchone()
     cursor.execute(f"UPDATE clients SET {', '.join(updates)} WHERE rowid = ?", vals)
-    conn.commit(); conn.close()
-    load_db_to_mem()
+    new = cursor.execute("SELECT 업체명 FROM clients WHERE rowid = ?", (row_id,)).fetchone()
+    dir_gen = _dir_gen_bump(conn)
+    conn.commit()
+    _mem_dir_apply(conn, dir_gen, client_names=[r[0] for r in (old, new) if r])
+    conn.close()
     return jsonify({"status": "success"})
 
 @app.route('/manage_clients', methods=['GET', 'POST'])
 @login_required 
 def manage_clients():
-    global clients_db
-    load_db_to_mem()  # DB 삭제 후에도 현재 DB 기준으로 목록 표시
+    _mem_dir_sync()  # DB 삭제·다른 곳 변경 후에도 현재 DB 기준으로 목록 표시 (세대번호 다를 때만 다시 읽기)
     if request.method == 'POST' and 'file' in request.files:
         file = request.files['file']
         if file.filename != '':
@@ -7257,6 +9260,7 @@ def manage_clients():
                             by_name[key] = row_dict
                         merge_df = pd.DataFrame(list(by_name.values()), columns=existing.columns)
                 merge_df.to_sql('clients', conn_up, if_exists='replace', index=False)
+                _dir_gen_bump(conn_up)
                 conn_up.commit()
                 load_db_to_mem()
             except Exception as e:
@@ -7391,7 +9395,7 @@ def manage_clients():
         window.addEventListener('resize', matchWidth);
     }})();
     </script></div>"""
-    return render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(drivers_db), clients_json=json.dumps(clients_db), col_keys="[]")
+    return render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(mem_dir.drivers), clients_json=json.dumps(mem_dir.clients), col_keys="[]")
 # --- [도착현황 라우트 및 API] ---
 @app.route('/arrival')
 @login_required
@@ -7786,7 +9790,7 @@ def arrival():
 
         renderArrivalList();
     </script>"""
-    return render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(drivers_db), clients_json=json.dumps(clients_db), col_keys="[]")
+    return render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(mem_dir.drivers), clients_json=json.dumps(mem_dir.clients), col_keys="[]")
 
 @app.route('/api/arrival/add', methods=['POST'])
 @login_required
@@ -7883,8 +9887,7 @@ def drivers_excel():
 @app.route('/manage_drivers', methods=['GET', 'POST'])
 @login_required 
 def manage_drivers():
-    global drivers_db
-    load_db_to_mem()  # DB 삭제 후에도 현재 DB 기준으로 목록 표시
+    _mem_dir_sync()  # DB 삭제·다른 곳 변경 후에도 현재 DB 기준으로 목록 표시 (세대번호 다를 때만 다시 읽기)
     err_msg = ""
     if request.method == 'POST' and 'file' in request.files:
         file = request.files['file']
@@ -7926,6 +9929,7 @@ def manage_drivers():
                 if 'id' in merge_df.columns:
                     merge_df = merge_df.drop(columns=['id'], errors='ignore')
                 merge_df.to_sql('drivers', conn_up, if_exists='replace', index=False)
+                _dir_gen_bump(conn_up)
                 conn_up.commit()
                 load_db_to_mem()
             except Exception as e:
@@ -7939,11 +9943,11 @@ def manage_drivers():
     q_search = (request.args.get('q') or '').strip()
     if q_search:
         q_lower = q_search.lower()
-        drivers_filtered = [r for r in drivers_db if any(q_lower in str(r.get(c, '')).lower() for c in DISPLAY_DRIVER_COLS)]
+        drivers_filtered = [r for r in mem_dir.drivers if any(q_lower in str(r.get(c, '')).lower() for c in DISPLAY_DRIVER_COLS)]
     else:
-        drivers_filtered = drivers_db
+        drivers_filtered = mem_dir.drivers
     drivers_filtered = sorted(drivers_filtered, key=lambda r: (str(r.get('기사명') or '')).strip())
-    total_full = len(drivers_db)
+    total_full = len(mem_dir.drivers)
     total_drivers = len(drivers_filtered)
     page = max(1, safe_int(request.args.get('page'), 1))
     per_page_arg = safe_int(request.args.get('per_page'), 50)
@@ -8055,15 +10059,17 @@ def manage_drivers():
         window.addEventListener('resize', matchWidth);
     }})();
     </script></div>"""
-    return render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(drivers_db), clients_json=json.dumps(clients_db), col_keys="[]")
+    return render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(mem_dir.drivers), clients_json=json.dumps(mem_dir.clients), col_keys="[]")
 
 @app.route('/api/delete_driver/<int:driver_id>', methods=['POST', 'DELETE'])
 @login_required
 def api_delete_driver(driver_id):
     conn = connect_ledger()
     conn.execute("DELETE FROM drivers WHERE rowid = ?", (driver_id,))
-    conn.commit(); conn.close()
-    load_db_to_mem()
+    dir_gen = _dir_gen_bump(conn)
+    conn.commit()
+    _mem_dir_apply(conn, dir_gen, driver_ids=[driver_id])
+    conn.close()
     return jsonify({"status": "success"})
 
 @app.route('/api/update_driver/<int:driver_id>', methods=['POST'])
@@ -8085,8 +10091,10 @@ def api_update_driver(driver_id):
         return jsonify({"status": "error", "message": "수정할 데이터 없음"}), 400
     vals.append(driver_id)
     cursor.execute(f"UPDATE drivers SET {', '.join(updates)} WHERE rowid = ?", vals)
-    conn.commit(); conn.close()
-    load_db_to_mem()
+    dir_gen = _dir_gen_bump(conn)
+    conn.commit()
+    _mem_dir_apply(conn, dir_gen, driver_ids=[driver_id])
+    conn.close()
     return jsonify({"status": "success"})
 
 
@@ -8218,7 +10226,7 @@ def admin_users_page():
     </script>
     """
     content = content.replace('__MY_USER_ID__', _myid_js)
-    return render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(drivers_db), clients_json=json.dumps(clients_db), col_keys="[]")
+    return render_template_string(BASE_HTML, content_body=content, drivers_json=json.dumps(mem_dir.drivers), clients_json=json.dumps(mem_dir.clients), col_keys="[]")
 
 
 @app.route('/api/admin_users', methods=['GET'])
@@ -8381,6 +10389,317 @@ def api_storage_status():
     })
 
 
+@app.route('/api/perf', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def api_perf():
+    """요청 성능 계측 결과(관리자) — 이 워커의 경로별 응답시간 분포·단계별 평균·SQL 문장 상위(top, 기본 20).
+    POST: 누적 통계 초기화. 계측은 LEDGER_PERF=1로 실행했을 때만 수집."""
+    if request.method == 'POST':
+        request_perf_stats.reset()
+        return jsonify({"status": "success"})
+    top = min(200, max(1, safe_int(request.args.get('top'), 20)))
+    return jsonify(dict(
+        status='success', enabled=LEDGER_PERF, pid=os.getpid(),
+        result_cache={'hits': ledger_result_cache.hits, 'misses': ledger_result_cache.misses},
+        **request_perf_stats.snapshot(top),
+    ))
+
+
+# ---------------------------------------------------------------------------
+# 엑셀 내보내기 백그라운드 작업
+# - 큰 엑셀 생성이 요청 스레드를 붙잡아 gunicorn 타임아웃에 걸리지 않도록, 기존 내보내기 URL을 그대로
+#   워커 내 스레드풀에서 실행해 결과를 임시 파일로 저장하고 클라이언트는 상태를 폴링 후 내려받는다.
+# - 작업 상태·진행률은 export_jobs 테이블에 두어 다른 워커로 간 폴링 요청에서도 조회 가능.
+# ---------------------------------------------------------------------------
+EXPORT_JOB_PATHS = frozenset([
+    '/export_settlement_excel',
+    '/export_custom_settlement',
+    '/export_settlement_sheet',
+    '/export_vendor_sheet',
+    '/export_fixed_driver_sheet',
+    '/export_misu_info',
+    '/export_tax_not_issued',
+    '/export_pay_info',
+    '/export_stats',
+    '/api/statistics_biz_settlement_excel',
+    '/api/statistics_misu_confirm_excel',
+    '/api/statistics_done_in_excel',
+    '/api/statistics_done_out_excel',
+    '/api/ledger_excel',
+])
+EXPORT_JOB_DIR = (os.environ.get('EXPORT_JOB_DIR') or '').strip() or os.path.join(tempfile.gettempdir(), 'logi_export_jobs')
+EXPORT_JOB_WORKERS = max(1, int(os.environ.get('EXPORT_JOB_WORKERS', '2') or 2))
+EXPORT_JOB_TTL_SEC = 3600          # 완료·실패 작업의 파일·기록 보관 시간 (finished_at 기준)
+EXPORT_JOB_PROGRESS_SEC = 0.5      # 진행률 DB 기록 최소 간격
+EXPORT_JOB_HEARTBEAT_SEC = 30      # 대기·실행 중 작업의 생존 신호(heartbeat_at) 기록 간격
+EXPORT_JOB_STALE_SEC = 5 * EXPORT_JOB_HEARTBEAT_SEC  # 생존 신호가 이보다 오래 없으면 워커 중단으로 보고 실패 처리
+_export_executor = None
+_export_executor_pid = None
+_export_executor_lock = threading.Lock()
+_export_worker_id = None   # 이 워커(프로세스)의 작업 소유자 표시 (export_jobs.worker)
+_export_active = set()     # 이 워커에서 대기·실행 중인 작업 id
+
+
+def _export_job_heartbeat_loop(worker_id):
+    """워커별 생존 신호 스레드: 이 워커의 대기·실행 중 작업 heartbeat_at 갱신 (작업이 없으면 DB 기록 없음)"""
+    while True:
+        time.sleep(EXPORT_JOB_HEARTBEAT_SEC)
+        with _export_executor_lock:
+            if _export_worker_id != worker_id:
+                return
+            active = list(_export_active)
+        if not active:
+            continue
+        try:
+            conn = connect_ledger()
+            try:
+                conn.execute(f"UPDATE export_jobs SET heartbeat_at = ? WHERE id IN ({', '.join(['?'] * len(active))})",
+                             [time.time()] + active)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"[export_job heartbeat error] {e}")
+
+
+def _export_job_executor():
+    """워커(프로세스)별 스레드풀 + 생존 신호 스레드 — --preload로 fork된 뒤 처음 쓸 때 만든다. 반환: (스레드풀, 워커 id)"""
+    global _export_executor, _export_executor_pid, _export_worker_id
+    with _export_executor_lock:
+        if _export_executor is None or _export_executor_pid != os.getpid():
+            _export_executor = ThreadPoolExecutor(max_workers=EXPORT_JOB_WORKERS, thread_name_prefix='export-job')
+            _export_executor_pid = os.getpid()
+            _export_worker_id = uuid.uuid4().hex
+            _export_active.clear()
+            threading.Thread(target=_export_job_heartbeat_loop, args=(_export_worker_id,),
+                             name='export-job-heartbeat', daemon=True).start()
+        return _export_executor, _export_worker_id
+
+
+def _export_job_update(job_id, **fields):
+    if not fields:
+        return
+    cols = ', '.join(f"{k} = ?" for k in fields)
+    conn = connect_ledger()
+    try:
+        conn.execute(f"UPDATE export_jobs SET {cols} WHERE id = ?", list(fields.values()) + [job_id])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _export_job_progress(scanned=None, written=None, force=False):
+    """내보내기 작업 안에서 호출되면 진행률(조회 행 수/기록 행 수)을 기록. 일반 요청에서는 아무 것도 안 함."""
+    if not has_request_context():
+        return
+    job = g.get('_export_job')
+    if job is None:
+        return
+    if scanned is not None:
+        job['rows_scanned'] = scanned
+    if written is not None:
+        job['rows_written'] = written
+    now = time.monotonic()
+    if not force and now - job['flushed'] < EXPORT_JOB_PROGRESS_SEC:
+        return
+    job['flushed'] = now
+    try:
+        _export_job_update(job['id'], rows_scanned=job['rows_scanned'], rows_written=job['rows_written'])
+    except Exception as e:
+        print(f"[export_job progress error] {e}")
+
+
+def _export_df_excel(writer, df, **kwargs):
+    """DataFrame을 엑셀 시트로 저장 — 내보내기 작업 안이면 저장한 행 수를 기록 행 수에 더함"""
+    df.to_excel(writer, **kwargs)
+    job = g.get('_export_job') if has_request_context() else None
+    if job is not None:
+        _export_job_progress(written=(job['rows_written'] or 0) + len(df), force=True)
+
+
+def _export_job_filename(content_disposition):
+    """Content-Disposition에서 파일명 추출 (filename* 우선)"""
+    cd = content_disposition or ''
+    m = re.search(r"filename\*\s*=\s*UTF-8''([^;]+)", cd, re.I)
+    if m:
+        return unquote(m.group(1).strip())
+    m = re.search(r'filename\s*=\s*"([^"]*)"', cd) or re.search(r'filename\s*=\s*([^;]+)', cd)
+    return m.group(1).strip() if m else None
+
+
+def _export_job_error_text(resp):
+    """내보내기 URL이 파일 대신 돌려준 응답(오류 JSON·안내 HTML·리다이렉트) → 사용자용 메시지"""
+    if resp.status_code in (301, 302, 303):
+        return '로그인이 필요합니다.'
+    body = resp.get_data(as_text=True) or ''
+    if resp.is_json:
+        try:
+            msg = (resp.get_json() or {}).get('message')
+        except Exception:
+            msg = None
+        if msg:
+            return str(msg)
+    text = re.sub(r'<script.*?</script>|<style.*?</style>', ' ', body, flags=re.S | re.I)
+    text = re.sub(r'\s+', ' ', html.unescape(re.sub(r'<[^>]+>', ' ', text))).strip()
+    return (text[:300] or f'내보내기 실패 (HTTP {resp.status_code})')
+
+
+def _export_job_run(job_id, path, query_string, saved_session):
+    """스레드풀에서 실행: 내보내기 URL을 요청 컨텍스트로 재현해 응답 본문을 파일로 저장."""
+    out_path = os.path.join(EXPORT_JOB_DIR, f'{job_id}.bin')
+    job = {'id': job_id, 'rows_scanned': 0, 'rows_written': None, 'flushed': 0.0}  # 기록 행 수는 보고될 때까지 NULL(모름)
+    try:
+        with app.test_request_context(path, query_string=query_string):
+            session.update(saved_session)
+            g._export_job = job
+            _export_job_update(job_id, state='running')
+            resp = app.full_dispatch_request()
+            try:
+                mimetype = resp.mimetype or ''
+                if resp.status_code != 200 or mimetype.startswith('text/') or resp.is_json:
+                    raise RuntimeError(_export_job_error_text(resp))
+                size = 0
+                with open(out_path, 'wb') as f:
+                    for chunk in resp.iter_encoded():
+                        f.write(chunk)
+                        size += len(chunk)
+                filename = _export_job_filename(resp.headers.get('Content-Disposition')) or f'export_{job_id[:8]}.xlsx'
+            finally:
+                resp.close()
+            _export_job_progress(force=True)
+            _export_job_update(job_id, state='done', bytes_written=size, filename=filename,
+                               mimetype=mimetype, file_path=out_path, finished_at=time.time())
+    except Exception as e:
+        print(f"[export_job error] {e}")
+        try:
+            if os.path.exists(out_path):
+                os.remove(out_path)
+        except OSError:
+            pass
+        try:
+            _export_job_update(job_id, state='error', error=str(e)[:500], finished_at=time.time())
+        except Exception as e2:
+            print(f"[export_job error] {e2}")
+    finally:
+        with _export_executor_lock:
+            _export_active.discard(job_id)
+
+
+def _export_jobs_cleanup():
+    """작업 정리: 생존 신호가 끊긴 queued/running 작업(워커 중단)은 실패로 바꾸고 중간 파일 삭제,
+    완료·실패 후 보관 시간이 지난 작업은 기록과 결과 파일 삭제. 오래 걸리거나 대기 중인 작업은 건드리지 않음."""
+    now = time.time()
+    try:
+        conn = connect_ledger()
+        try:
+            orphaned = [r[0] for r in conn.execute(
+                "SELECT id FROM export_jobs WHERE state IN ('queued', 'running') AND COALESCE(heartbeat_at, created_at) < ?",
+                (now - EXPORT_JOB_STALE_SEC,)).fetchall()]
+            if orphaned:
+                conn.executemany("UPDATE export_jobs SET state = 'error', error = ?, finished_at = ? "
+                                 "WHERE id = ? AND state IN ('queued', 'running')",
+                                 [('작업을 실행하던 서버 프로세스가 중단되었습니다. 다시 시도해 주세요.', now, i) for i in orphaned])
+            old = conn.execute("SELECT id, file_path FROM export_jobs WHERE state IN ('done', 'error') "
+                               "AND COALESCE(finished_at, created_at) < ?", (now - EXPORT_JOB_TTL_SEC,)).fetchall()
+            conn.executemany("DELETE FROM export_jobs WHERE id = ?", [(r[0],) for r in old])
+            conn.commit()
+        finally:
+            conn.close()
+        paths = [fp for _id, fp in old if fp] + [os.path.join(EXPORT_JOB_DIR, f'{i}.bin') for i in orphaned]
+        for fp in paths:
+            if os.path.exists(fp):
+                try:
+                    os.remove(fp)
+                except OSError:
+                    pass
+    except Exception as e:
+        print(f"[export_job cleanup error] {e}")
+
+
+def _export_job_row(job_id):
+    conn = connect_ledger()
+    try:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM export_jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None or (row['user_id'] or '') != (session.get('user_id') or ''):
+        return None
+    return row
+
+
+@app.route('/api/export_jobs', methods=['POST'])
+@login_required
+def export_job_create():
+    """내보내기 작업 등록 — body: {url: "/export_stats?start=...&end=..."} → {job_id}"""
+    data = request.get_json(silent=True) or request.form
+    url = (data.get('url') or '').strip()
+    parts = urlsplit(url)
+    if parts.netloc and parts.netloc != request.host:
+        return jsonify({"status": "error", "message": "다른 서버 주소는 사용할 수 없습니다."}), 400
+    if parts.path not in EXPORT_JOB_PATHS:
+        return jsonify({"status": "error", "message": "백그라운드로 실행할 수 없는 내보내기입니다."}), 400
+    _export_jobs_cleanup()
+    job_id = uuid.uuid4().hex
+    try:
+        os.makedirs(EXPORT_JOB_DIR, exist_ok=True)
+        executor, worker_id = _export_job_executor()
+        now = time.time()
+        conn = connect_ledger()
+        try:
+            conn.execute("INSERT INTO export_jobs (id, user_id, url, state, rows_written, created_at, worker, heartbeat_at) "
+                         "VALUES (?, ?, ?, 'queued', NULL, ?, ?, ?)",
+                         (job_id, session.get('user_id') or '', parts.path + ('?' + parts.query if parts.query else ''),
+                          now, worker_id, now))
+            conn.commit()
+        finally:
+            conn.close()
+        with _export_executor_lock:
+            _export_active.add(job_id)
+        executor.submit(_export_job_run, job_id, parts.path, parts.query, dict(session))
+    except Exception as e:
+        print(f"[export_job error] {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({"status": "success", "job_id": job_id})
+
+
+@app.route('/api/export_jobs/<job_id>')
+@login_required
+def export_job_status(job_id):
+    """작업 상태 조회 — state: queued / running / done / error"""
+    row = _export_job_row(job_id)
+    if row is None:
+        return jsonify({"status": "error", "message": "작업을 찾을 수 없습니다. (만료되었을 수 있습니다)"}), 404
+    res = {
+        "status": "success",
+        "job_id": job_id,
+        "state": row['state'],
+        "rows_scanned": row['rows_scanned'] or 0,
+        "bytes_written": row['bytes_written'] or 0,
+        "filename": row['filename'],
+        "error": row['error'],
+        "download_url": url_for('export_job_download', job_id=job_id) if row['state'] == 'done' else None,
+    }
+    if row['rows_written'] is not None:  # 기록 행 수를 보고하지 않는 내보내기는 생략
+        res['rows_written'] = row['rows_written']
+    return jsonify(res)
+
+
+@app.route('/api/export_jobs/<job_id>/download')
+@login_required
+def export_job_download(job_id):
+    row = _export_job_row(job_id)
+    if row is None or row['state'] != 'done' or not row['file_path'] or not os.path.isfile(row['file_path']):
+        return jsonify({"status": "error", "message": "내려받을 파일이 없습니다. (만료되었을 수 있습니다)"}), 404
+    return send_file(row['file_path'], as_attachment=True, download_name=row['filename'],
+                     mimetype=row['mimetype'] or 'application/octet-stream')
+
+
+DB_DOWNLOAD_DIR = os.path.join(tempfile.gettempdir(), 'logi_db_download')
+DB_DOWNLOAD_TTL_SEC = 3600
+
+
 @app.route("/download-db")
 @app.route("/api/download-db")  # 두 경로 모두 지원 (서버에 따라 다를 수 있음)
 @login_required
@@ -8389,7 +10708,25 @@ def download_db():
     db_path = get_ledger_db_path()
     if not os.path.isfile(db_path):
         return jsonify({"status": "error", "message": "DB 파일이 없습니다."}), 404
-    return send_file(db_path, as_attachment=True, download_name="ledger_backup.db")
+    # 사용 중인 파일 대신 한 시점 스냅샷을 내려받음. 지난 스냅샷은 다음 다운로드 때 정리 (전송 중인 파일은 남김)
+    os.makedirs(DB_DOWNLOAD_DIR, exist_ok=True)
+    cutoff = time.time() - DB_DOWNLOAD_TTL_SEC
+    for name in os.listdir(DB_DOWNLOAD_DIR):
+        path = os.path.join(DB_DOWNLOAD_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+    fd, snapshot = tempfile.mkstemp(dir=DB_DOWNLOAD_DIR, prefix='ledger_', suffix='.db')
+    os.close(fd)
+    try:
+        _ledger_snapshot(snapshot)
+    except Exception as e:
+        os.remove(snapshot)
+        print(f"[download_db error] {e}")
+        return jsonify({"status": "error", "message": "DB 스냅샷을 만들지 못했습니다."}), 500
+    return send_file(snapshot, as_attachment=True, download_name="ledger_backup.db")
 
 
 # 내 서버 실행: 기본은 모든 네트워크(0.0.0.0)에서 접속되게
@@ -1,7 +1,23 @@
 #!/usr/bin/env python3
-"""백업 실행 스크립트 - Windows 작업 스케줄러에서 오전 4시에 실행하도록 설정"""
+"""백업 실행 스크립트 - Windows 작업 스케줄러에서 오전 4시에 실행하도록 설정
+- 백업: python backup_run.py
+  ledger.db 스냅샷·설정 파일·증빙 목록(manifest)을 BACKUP_DIR/logi_backup_YYYYMMDD.zip 으로 저장.
+  증빙 사진은 내용 해시(sha256)별로 BACKUP_DIR/evidence_store 에 한 번만 저장(이미 있는 파일은 다시 복사하지 않음).
+  크기·수정시각이 그대로인 파일은 이전 해시를 재사용하므로 매일 읽는 양은 그날 바뀐 파일만큼.
+- 보존: 백업 후 logi_backup_*.zip 중 최근 BACKUP_KEEP_DAILY(7)일·BACKUP_KEEP_WEEKLY(4)주·BACKUP_KEEP_MONTHLY(12)개월마다
+  가장 최신 1개씩만 남기고, 남은 zip의 목록(manifest) 어디에도 없는 evidence_store blob은 삭제.
+- 복원: python backup_run.py restore YYYYMMDD [대상폴더]
+  해당 날짜 zip의 목록대로 증빙 폴더(evidences/)를 다시 만들고 ledger.db·설정 파일을 꺼냄 (기본 대상: BACKUP_DIR/restore_YYYYMMDD)
+"""
+import hashlib
+import json
 import os
+import re
+import shutil
+import sqlite3
 import sys
+import zipfile
+from datetime import datetime, timezone, timedelta
 
 # 프로젝트 루트를 path에 추가
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -9,49 +25,281 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 # app 모듈에서 run_backup 가져오기 (DB 초기화 없이)
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
+KST = timezone(timedelta(hours=9))
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+BACKUP_DIR = os.environ.get('BACKUP_DIR', r'c:\logi\backup')
+EVIDENCE_STORE = os.path.join(BACKUP_DIR, 'evidence_store')
+EVIDENCE_INDEX = os.path.join(EVIDENCE_STORE, 'index.json')   # 상대경로 → [크기, 수정시각(ns), sha256]
+MANIFEST_NAME = 'evidences_manifest.json'
+CONFIG_FILES = ['.env.example', 'requirements.txt']
+HASH_CHUNK = 1024 * 1024
+# 일별 zip 보존 (앱 백업 폴더 보존 규칙과 같은 환경변수) — 백업이 있는 기간만 셈
+BACKUP_KEEP_DAILY = int(os.environ.get('BACKUP_KEEP_DAILY', '7') or 7)
+BACKUP_KEEP_WEEKLY = int(os.environ.get('BACKUP_KEEP_WEEKLY', '4') or 4)
+BACKUP_KEEP_MONTHLY = int(os.environ.get('BACKUP_KEEP_MONTHLY', '12') or 12)
+ZIP_RE = re.compile(r'^logi_backup_(\d{8})\.zip$')
+
+
+def _evidences_src():
+    """증빙 폴더 (앱과 동일: 환경변수 EVIDENCE_DIR, 없으면 static/evidences)"""
+    p = (os.environ.get('EVIDENCE_DIR') or '').strip()
+    return os.path.abspath(p) if p else os.path.join(PROJECT_ROOT, 'static', 'evidences')
+
+
+def _blob_path(digest):
+    return os.path.join(EVIDENCE_STORE, digest[:2], digest)
+
+
+def _blob_size(digest):
+    try:
+        return os.path.getsize(_blob_path(digest))
+    except OSError:
+        return None
+
+
+def _load_index():
+    try:
+        with open(EVIDENCE_INDEX, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index):
+    tmp = EVIDENCE_INDEX + '.part'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp, EVIDENCE_INDEX)
+
+
+def _store_file(path):
+    """파일을 읽으며 sha256 계산과 동시에 임시 파일로 복사 → 같은 내용이 저장소에 없을(또는 크기가 다를) 때만 blob으로 등록.
+    반환: (sha256, 새 blob 여부)"""
+    tmp = os.path.join(EVIDENCE_STORE, f'.incoming_{os.getpid()}')
+    h = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+        while True:
+            chunk = src.read(HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+            dst.write(chunk)
+            size += len(chunk)
+    digest = h.hexdigest()
+    blob = _blob_path(digest)
+    if _blob_size(digest) == size:
+        os.remove(tmp)
+        return digest, False
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    os.replace(tmp, blob)
+    return digest, True
+
+
+def backup_evidences(src_dir):
+    """증빙 폴더를 내용 해시 저장소에 반영하고 manifest(dict) 반환.
+    크기·수정시각이 index와 같고 같은 크기의 blob이 있으면 읽지 않음. 반환: (manifest, 새로 읽은 파일 수, 새 blob 수)"""
+    os.makedirs(EVIDENCE_STORE, exist_ok=True)
+    index = _load_index()
+    files, new_index = {}, {}
+    scanned = stored = 0
+    for root, _, names in os.walk(src_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, src_dir).replace(os.sep, '/')
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            cached = index.get(rel)
+            if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns and _blob_size(cached[2]) == st.st_size:
+                digest = cached[2]
+            else:
+                try:
+                    digest, created = _store_file(path)
+                except OSError as e:
+                    print(f"[evidence backup error] {rel}: {e}")
+                    continue
+                scanned += 1
+                stored += created
+            new_index[rel] = [st.st_size, st.st_mtime_ns, digest]
+            files[rel] = [digest, st.st_size]
+    _save_index(new_index)
+    manifest = {'version': 1, 'created': datetime.now(KST).isoformat(timespec='seconds'), 'source': src_dir, 'files': files}
+    return manifest, scanned, stored
+
+
+def _snapshot_ledger(src, dst):
+    """사용 중인(WAL) ledger.db를 한 시점 기준으로 복사 (SQLite backup API, -wal 없이 열리는 파일)"""
+    tmp = dst + '.part'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    s = sqlite3.connect(src, timeout=60)
+    try:
+        d = sqlite3.connect(tmp)
+        try:
+            s.backup(d)
+            d.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            d.close()
+    finally:
+        s.close()
+    os.replace(tmp, dst)
+
+
 def run_backup_standalone():
-    import shutil
-    import zipfile
-    from datetime import datetime, timezone, timedelta
-    KST = timezone(timedelta(hours=9))
     now = datetime.now(KST)
-    BACKUP_DIR = os.environ.get('BACKUP_DIR', r'c:\logi\backup')
-    PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
     try:
         os.makedirs(BACKUP_DIR, exist_ok=True)
         today = now.strftime('%Y%m%d')
         ledger_src = os.path.join(PROJECT_ROOT, 'ledger.db')
-        evidences_src = os.path.join(PROJECT_ROOT, 'static', 'evidences')
-        evidences_dst = os.path.join(BACKUP_DIR, 'evidences')
+        ledger_dst = os.path.join(BACKUP_DIR, 'ledger.db')
+        evidences_src = _evidences_src()
         if os.path.exists(ledger_src):
-            shutil.copy2(ledger_src, os.path.join(BACKUP_DIR, 'ledger.db'))
-        if os.path.exists(evidences_src):
-            if os.path.exists(evidences_dst):
-                shutil.rmtree(evidences_dst)
-            shutil.copytree(evidences_src, evidences_dst)
-        for fname in ['.env.example', 'requirements.txt']:
+            _snapshot_ledger(ledger_src, ledger_dst)
+        manifest = None
+        if os.path.isdir(evidences_src):
+            manifest, scanned, stored = backup_evidences(evidences_src)
+            print(f"증빙 {len(manifest['files'])}개 (새로 읽음 {scanned}, 새 파일 {stored})")
+        for fname in CONFIG_FILES:
             src = os.path.join(PROJECT_ROOT, fname)
             if os.path.exists(src):
                 shutil.copy2(src, os.path.join(BACKUP_DIR, fname))
         zip_path = os.path.join(BACKUP_DIR, f'logi_backup_{today}.zip')
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            lb = os.path.join(BACKUP_DIR, 'ledger.db')
-            if os.path.exists(lb):
-                zf.write(lb, 'ledger.db')
-            if os.path.exists(evidences_dst):
-                for root, _, files in os.walk(evidences_dst):
-                    for f in files:
-                        fp = os.path.join(root, f)
-                        zf.write(fp, os.path.join('evidences', os.path.relpath(fp, evidences_dst)))
-            for fname in ['.env.example', 'requirements.txt']:
+        with zipfile.ZipFile(zip_path + '.part', 'w', zipfile.ZIP_DEFLATED) as zf:
+            if os.path.exists(ledger_dst):
+                zf.write(ledger_dst, 'ledger.db')
+            if manifest is not None:
+                zf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False))
+            for fname in CONFIG_FILES:
                 bf = os.path.join(BACKUP_DIR, fname)
                 if os.path.exists(bf):
                     zf.write(bf, fname)
+        os.replace(zip_path + '.part', zip_path)
         print(f"백업 완료: {zip_path}")
+        removed_zips, removed_blobs = prune_backups()
+        print(f"보존 정리: zip {removed_zips}개, 증빙 blob {removed_blobs}개 삭제")
         return 0
     except Exception as e:
         print(f"백업 실패: {e}")
         return 1
 
+
+def prune_backups():
+    """일별 zip 보존 규칙 적용 후 남은 zip의 manifest가 참조하지 않는 blob 삭제(mark-and-sweep).
+    manifest를 읽지 못한 zip이 있으면 blob은 지우지 않음. 반환: (삭제한 zip 수, 삭제한 blob 수)"""
+    entries = []
+    for name in os.listdir(BACKUP_DIR):
+        m = ZIP_RE.match(name)
+        if not m:
+            continue
+        try:
+            entries.append((datetime.strptime(m.group(1), '%Y%m%d').date(), name))
+        except ValueError:
+            continue
+    entries.sort(reverse=True)
+    keep = set()
+    for count, bucket in ((BACKUP_KEEP_DAILY, lambda d: d),
+                          (BACKUP_KEEP_WEEKLY, lambda d: tuple(d.isocalendar())[:2]),
+                          (BACKUP_KEEP_MONTHLY, lambda d: (d.year, d.month))):
+        seen = set()
+        for d, name in entries:
+            b = bucket(d)
+            if b in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.add(b)
+            keep.add(name)
+    removed_zips = 0
+    for _d, name in entries:
+        if name in keep:
+            continue
+        try:
+            os.remove(os.path.join(BACKUP_DIR, name))
+            removed_zips += 1
+        except OSError as e:
+            print(f"[backup prune error] {name}: {e}")
+
+    # mark: 남은 zip의 manifest + 현재 index(다음 백업에서 재사용할 해시)
+    live = {entry[2] for entry in _load_index().values()}
+    for name in keep:
+        try:
+            with zipfile.ZipFile(os.path.join(BACKUP_DIR, name)) as zf:
+                if MANIFEST_NAME in zf.namelist():
+                    live.update(digest for digest, _size in json.loads(zf.read(MANIFEST_NAME))['files'].values())
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"[backup prune] {name} 목록을 읽지 못해 증빙 정리를 건너뜀: {e}")
+            return removed_zips, 0
+    # sweep: evidence_store/xx/<sha256> 중 참조 없는 blob
+    removed_blobs = 0
+    if os.path.isdir(EVIDENCE_STORE):
+        for sub in os.listdir(EVIDENCE_STORE):
+            sub_dir = os.path.join(EVIDENCE_STORE, sub)
+            if len(sub) != 2 or not os.path.isdir(sub_dir):
+                continue
+            for digest in os.listdir(sub_dir):
+                if digest in live:
+                    continue
+                try:
+                    os.remove(os.path.join(sub_dir, digest))
+                    removed_blobs += 1
+                except OSError as e:
+                    print(f"[backup prune error] {digest}: {e}")
+    return removed_zips, removed_blobs
+
+
+def restore_backup(day, target_dir=None):
+    """logi_backup_{day}.zip 기준으로 target_dir에 ledger.db·설정 파일·evidences/ 복원 (blob은 sha256 확인 후 복사)"""
+    zip_path = os.path.join(BACKUP_DIR, f'logi_backup_{day}.zip')
+    if not os.path.exists(zip_path):
+        print(f"복원 실패: 백업 파일 없음 {zip_path}")
+        return 1
+    target_dir = target_dir or os.path.join(BACKUP_DIR, f'restore_{day}')
+    evidences_dst = os.path.join(target_dir, 'evidences')
+    try:
+        os.makedirs(target_dir, exist_ok=True)
+        with zipfile.ZipFile(zip_path) as zf:
+            names = zf.namelist()
+            for name in names:
+                if name != MANIFEST_NAME:
+                    zf.extract(name, target_dir)
+            manifest = json.loads(zf.read(MANIFEST_NAME)) if MANIFEST_NAME in names else {'files': {}}
+        restored, missing = 0, []
+        for rel, (digest, _size) in manifest['files'].items():
+            blob = _blob_path(digest)
+            dst = os.path.normpath(os.path.join(evidences_dst, rel))
+            if not dst.startswith(os.path.normpath(evidences_dst) + os.sep):
+                missing.append(rel)
+                continue
+            h = hashlib.sha256()
+            try:
+                with open(blob, 'rb') as f:
+                    for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                        h.update(chunk)
+            except OSError:
+                missing.append(rel)
+                continue
+            if h.hexdigest() != digest:
+                missing.append(rel)
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copyfile(blob, dst)
+            restored += 1
+        print(f"복원 완료: {target_dir} (증빙 {restored}개)")
+        if missing:
+            print(f"복원 실패 증빙 {len(missing)}개 (저장소에 없거나 손상): {', '.join(missing[:20])}")
+            return 1
+        return 0
+    except Exception as e:
+        print(f"복원 실패: {e}")
+        return 1
+
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'restore':
+        if len(sys.argv) < 3:
+            print(__doc__)
+            sys.exit(1)
+        sys.exit(restore_backup(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None))
     sys.exit(run_backup_standalone())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""벤치마크용 가상 장부 DB 생성 — 같은 행 수·seed면 항상 같은 데이터
+- 사용: python bench_data.py 출력.db 행수 [seed] [--force]
+  예: python bench_data.py C:\\temp\\ledger_100k.db 100000
+- 출력 파일이 이미 있으면 --force 없이는 만들지 않음. 앱이 쓰는 DB(LEDGER_DB_PATH·ledger.db)는 --force로도 덮어쓰지 않음
+- ledger 행 수에 맞춰 drivers·clients·activity_logs·arrival_status도 함께 채움
+  (기사·업체명, 차량번호, 노선, 배차일 분포, 수금·지급·계산서 상태 비율은 실제 장부와 비슷하게)
+- 스키마는 app.py 마이그레이션으로 만들고, 대량 입력 동안은 ledger 트리거(날짜·검색·롤업·세대번호)를 떼었다가
+  입력 후 날짜 컬럼·수금/지급 상태를 채우고 마이그레이션을 다시 실행해 트리거·파생 테이블을 한 번에 만듦
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SURNAMES = "김이박최정강조윤장임한오서신권황안송전홍유고문양손배백허남심노하곽성차주우구민류나진지엄채원천방공현함변염여추도소석선설마길연위표명기반왕금옥육인맹제모남궁탁국어은편용예경봉사부황보"
+GIVEN = "민서지현준우예도하윤수영재성진호경은정연승혜동상희철태원석기용광종혁훈규선미숙순자옥남춘범한보"
+REGIONS = ["서울", "경기", "인천", "부산", "대구", "광주", "대전", "울산", "세종", "강원", "충북", "충남", "전북", "전남", "경북", "경남", "제주"]
+CAR_MIDS = "사아바자"
+CITIES = ["용인", "부산", "양산", "동탄", "창원", "시흥", "이천", "송파", "평택", "김해", "인천", "안산", "화성", "천안",
+          "청주", "대구", "광주", "울산", "포항", "구미", "익산", "군산", "여수", "목포", "원주", "강릉", "파주", "김포",
+          "의왕", "군포", "오산", "아산", "진천", "음성", "칠곡", "경산", "밀양", "거제", "통영", "사천", "진주", "순천"]
+ROUTE_SUFFIX = ["", "", "", "", "(내일착)", "(당착)", "(왕복)", "(혼적)"]
+MEMO2 = ["24시", "24시", "24시", "유선배차", "콜배차/24시/용차", "유선배차/용차/24시", "용차", "콜배차"]
+BANKS = ["KB국민은행", "우체국", "기업은행", "케이뱅크", "신한은행", "농협", "하나은행", "우리은행", "카카오뱅크"]
+PAY_BANKS = ["개인 국민", "법인 국민", "법인 케이뱅크", "미정"]
+TAX_BIZ2 = ["스퀘어", "스퀘어", "스퀘어", "미정", "에스엠", "에스엠로지텍", "흥진"]
+PAY_TO = ["스퀘어", "흥진", "에스엠로지텍", "에스엠"]
+LOG_MOVE = ["고정", "고정", "고정", "협력사", "용차", "개별", ""]
+COMPANY_HEAD = ["이안", "우리", "영남", "원탑", "극동", "오름", "한솔", "대한", "동방", "청솔", "새한", "태평양", "중앙", "삼익", "세진",
+                "미래", "한빛", "우정", "동원", "금강", "백두", "한라", "서해", "남해", "동해", "성원", "제일", "신성", "대성", "유진"]
+COMPANY_TAIL = ["물류", "통운", "로지스", "특송", "운수", "택배", "통상", "익스프레스", "로지텍", "해운"]
+COMPANY_FORM = ["(주)", "", "", "주식회사 ", ""]
+BIZ_TYPES = [("화물운송주선", "운수업"), ("운수업", "화물"), ("화물운송주선업", "운수업"), ("도소매", "서비스"), ("제조업", "포장재")]
+LOG_ACTIONS = ["상태변경"] * 8 + ["수정", "수정", "신규등록", "삭제"]
+LOG_STATUS_COLS = ["수금일", "지급일", "계산서발행일", "매입계산서발행일", "비고"]
+FEES = [250000, 280000, 300000, 330000, 340000, 350000, 380000, 400000, 420000, 450000, 500000, 550000, 600000, 700000]
+
+
+def _name(rng):
+    return rng.choice(SURNAMES) + rng.choice(GIVEN) + rng.choice(GIVEN)
+
+
+def _phone(rng):
+    return f"010-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}"
+
+
+def _car_num(rng):
+    return f"{rng.choice(REGIONS)}{rng.randint(70, 99)}{rng.choice(CAR_MIDS)}{rng.randint(1000, 9999)}"
+
+
+def _biz_num(rng, corp=False):
+    return f"{rng.randint(100, 899)}-{rng.randint(81, 88) if corp else rng.randint(10, 39)}-{rng.randint(10000, 99999)}"
+
+
+def _company(rng):
+    return rng.choice(COMPANY_FORM) + rng.choice(COMPANY_HEAD) + rng.choice(COMPANY_TAIL)
+
+
+def make_drivers(rng, n):
+    """기사관리 행 목록 (기사명·차량번호 조합은 중복 없음)"""
+    drivers, seen = [], set()
+    while len(drivers) < n:
+        d_name, c_num = _name(rng), _car_num(rng)
+        if (d_name, c_num) in seen:
+            continue
+        seen.add((d_name, c_num))
+        has_bank = rng.random() < 0.3
+        drivers.append({
+            '기사명': d_name, '차량번호': c_num, '연락처': _phone(rng),
+            '은행명': rng.choice(BANKS) if has_bank else '', '계좌번호': f"{rng.randint(100000, 999999)}-{rng.randint(10, 99)}-{rng.randint(100000, 999999)}" if has_bank else '',
+            '예금주': d_name if has_bank else '', '사업자번호': _biz_num(rng) if rng.random() < 0.3 else '',
+            '사업자': d_name if rng.random() < 0.3 else '', '개인/고정': rng.choice(LOG_MOVE), '메모': '',
+        })
+    return drivers
+
+
+def make_clients(rng, n):
+    """업체관리 행 목록 (업체명 중복 없음)"""
+    clients, seen = [], set()
+    while len(clients) < n:
+        name = _company(rng)
+        if name in seen:
+            name = f"{name} {rng.choice(CITIES)}지점"
+            if name in seen:
+                continue
+        seen.add(name)
+        biz_type1, biz_type2 = rng.choice(BIZ_TYPES)
+        clients.append({
+            '사업자구분': rng.choice(TAX_BIZ2), '업체명': name, '발행구분': rng.choice(['', '', '계산서', '현금']),
+            '사업자등록번호': _biz_num(rng, corp=True), '대표자명': _name(rng),
+            '사업자주소': f"{rng.choice(CITIES)}시 {rng.choice(CITIES)}로 {rng.randint(1, 300)}",
+            '업태': biz_type1, '종목': biz_type2, '메일주소': f"logi{rng.randint(1000, 99999)}@naver.com",
+            '담당자': _name(rng), '연락처': _phone(rng),
+            '결제특이사항': rng.choice(['', '', '1일~말일정산 후 익월 말일 결제', '전월26일 ~ 당월25일분까지']), '비고': '',
+        })
+    return clients
+
+
+def make_ledger_row(rng, drivers, clients, day0, span_days, today):
+    """장부 1행 — 배차일 기준으로 오래된 건일수록 수금·지급·계산서 처리가 끝난 비율이 높음"""
+    drv = rng.choice(drivers)
+    cli = rng.choice(clients)
+    dispatch = day0 + timedelta(days=rng.randrange(span_days))
+    order = dispatch - timedelta(days=rng.choice([0, 0, 0, 1, 1, 2]))
+    age = (today - dispatch).days
+    done = min(0.95, max(0.05, age / 60))  # 배차 후 두 달이면 대부분 처리 완료
+    fee = rng.choice(FEES)
+    fee_out = fee - rng.choice([30000, 40000, 50000, 50000, 100000])
+    month_end_client = '1' if rng.random() < 0.09 else ''
+    month_end_driver = '1' if rng.random() < 0.7 else ''
+    cash_client = rng.random() < 0.06
+    cash_driver = rng.random() < 0.02
+    pre_post = rng.choice([0, 10000, 20000, 30000]) if rng.random() < 0.13 else None
+
+    def _after(p, max_days):
+        """확률 p로 배차일 이후(오늘 이전) 날짜, 아니면 공백"""
+        if rng.random() >= p:
+            return ''
+        d = dispatch + timedelta(days=rng.randint(1, max_days))
+        return (d if d <= today else today).strftime('%Y-%m-%d')
+
+    row = {
+        'order_dt': order.strftime('%Y-%m-%d'), 'dispatch_dt': dispatch.strftime('%Y-%m-%d'),
+        'route': f"{rng.choice(CITIES)} - {rng.choice(CITIES)}{rng.choice(ROUTE_SUFFIX)}",
+        'd_name': drv['기사명'], 'c_num': drv['차량번호'], 'd_phone': drv['연락처'],
+        'memo1': str(rng.randint(1, 30)) if rng.random() < 0.2 else '', 'memo2': rng.choice(MEMO2),
+        'd_bank_name': drv['은행명'], 'bank_acc': drv['계좌번호'], 'd_bank_owner': drv['예금주'],
+        'tax_biz_num': drv['사업자번호'], 'tax_biz_name': drv['사업자'] or f"(고정){drv['기사명']}",
+        'month_end_driver': month_end_driver, 'fee_out': str(float(fee_out)),
+        'pay_bank': rng.choice(PAY_BANKS) if rng.random() < 0.15 else '',
+        'out_dt': _after(done * 0.7, 45), 'pay_method_driver': '현금' if cash_driver else '',
+        'issue_dt': _after(done * 0.6, 30), 'tax_biz2': rng.choice(TAX_BIZ2), 'log_move': drv['개인/고정'],
+        'c_mgr_name': cli['담당자'] if rng.random() < 0.3 else '', 'c_phone': cli['연락처'] if rng.random() < 0.3 else '',
+        'pre_post': str(float(pre_post)) if pre_post is not None else '', 'fee': str(float(fee)),
+        'pay_to': rng.choice(PAY_TO), 'in_bank': rng.choice(PAY_BANKS) if rng.random() < 0.3 else '',
+        'in_dt': _after(done, 40), 'month_end_client': month_end_client,
+        'pay_method_client': '현금' if cash_client else '', 'client_name': cli['업체명'],
+        'biz_num': cli['사업자등록번호'], 'biz_owner': cli['대표자명'], 'biz_addr': cli['사업자주소'],
+        'biz_type1': cli['업태'], 'biz_type2': cli['종목'], 'mail': cli['메일주소'],
+        'tax_dt': _after(done * 0.55, 30), 'mail_dt': _after(done * 0.55, 20),
+        'req_type': rng.choice(['', '', '', '', '요청사항없음', '인수증 우편발송']),
+        'pre_post_chk': '1' if rng.random() < 0.02 else '',
+    }
+    return row
+
+
+def _app_db_paths():
+    """앱이 실제로 쓰는 장부 DB 후보 (LEDGER_DB_PATH, 현재 폴더·프로젝트 폴더의 ledger.db)"""
+    paths = [os.path.join(PROJECT_ROOT, 'ledger.db'), 'ledger.db']
+    env = (os.environ.get('LEDGER_DB_PATH') or '').strip()
+    if env:
+        paths.append(env)
+    return {os.path.realpath(p) for p in paths}
+
+
+def generate(path, rows, seed=42, force=False):
+    """path에 rows건 장부가 든 벤치마크용 DB 생성. 반환: 테이블별 행 수
+    기존 파일은 force=True일 때만 덮어씀. 앱 DB 경로는 항상 거부 (FileExistsError / ValueError)."""
+    if os.path.realpath(path) in _app_db_paths():
+        raise ValueError(f"앱이 사용하는 장부 DB({path})에는 생성할 수 없습니다. 다른 파일 경로를 지정하세요.")
+    if os.path.exists(path) and not force:
+        raise FileExistsError(f"{path} 파일이 이미 있습니다. 덮어쓰려면 --force를 붙이세요.")
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.environ['LEDGER_DB_PATH'] = os.path.abspath(path)
+    sys.path.insert(0, PROJECT_ROOT)
+    import app as A  # 기동 시 init_db()가 새 파일에 스키마 생성
+
+    rng = random.Random(seed)
+    today = A.now_kst().date()
+    span_days = 730 if rows >= 100000 else 365  # 최근 1~2년에 고르게 분포
+    day0 = today - timedelta(days=span_days - 1)
+    n_drivers = max(200, min(20000, rows // 20))
+    n_clients = max(200, min(20000, rows // 25))
+    drivers = make_drivers(rng, n_drivers)
+    clients = make_clients(rng, n_clients)
+
+    conn = A.connect_ledger()
+    try:
+        ledger_cols = A._ledger_cols(conn)
+        # 대량 입력 동안 ledger 트리거·검색 인덱스를 떼어 두고 입력 후 마이그레이션으로 다시 생성·전체 계산
+        for (trg,) in conn.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND tbl_name='ledger'").fetchall():
+            conn.execute(f"DROP TRIGGER IF EXISTS {trg}")
+        conn.execute("DROP TABLE IF EXISTS ledger_search")
+        conn.execute("DELETE FROM ledger_rollup")
+        A._ledger_fts_detect(conn)
+
+        for table, items in (('drivers', drivers), ('clients', clients)):
+            cols = list(items[0].keys())
+            conn.executemany(f"INSERT INTO {table} ({', '.join(f'[{c}]' for c in cols)}) VALUES ({', '.join(['?'] * len(cols))})",
+                             [tuple(d[c] for c in cols) for d in items])
+
+        keys = [k for k in make_ledger_row(random.Random(0), drivers, clients, day0, span_days, today) if k in ledger_cols]
+        calc_keys = ['sup_val', 'vat1', 'total1', 'vat2', 'total2', 'net_profit', 'vat_final']
+        cols = keys + [k for k in calc_keys if k in ledger_cols and k not in keys]
+        sql = f"INSERT INTO ledger ({', '.join(cols)}) VALUES ({', '.join(['?'] * len(cols))})"
+        batch = []
+        for _ in range(rows):
+            row = A.calc_vat_auto(make_ledger_row(rng, drivers, clients, day0, span_days, today))
+            batch.append(tuple(row.get(k, '') for k in cols))
+            if len(batch) >= 10000:
+                conn.executemany(sql, batch)
+                batch = []
+        if batch:
+            conn.executemany(sql, batch)
+
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM ledger").fetchone()[0]
+        logs = []
+        for _ in range(rows // 5):
+            action = rng.choice(LOG_ACTIONS)
+            ts = day0 + timedelta(days=rng.randrange(span_days))
+            detail = (f"[{rng.choice(LOG_STATUS_COLS)}] 항목이 '{ts.strftime('%Y-%m-%d')}'(으)로 변경" if action == '상태변경'
+                      else f"업체:{_company(rng)} 기사:{_name(rng)}")
+            logs.append((f"{ts.strftime('%Y-%m-%d')} {rng.randint(8, 20):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+                         action, rng.randint(1, max_id), detail))
+        conn.executemany("INSERT INTO activity_logs (timestamp, action, target_id, details) VALUES (?, ?, ?, ?)", logs)
+        arrivals = []
+        for i in range(min(300, max(20, rows // 1000))):
+            arrivals.append((f"{rng.randint(6, 22):02d}:{rng.choice(['00', '30'])}",
+                             f"{rng.choice(CITIES)} 도착 {_name(rng)} {_car_num(rng)}", '', '', '', '', i, 1 + i // 50, ''))
+        conn.executemany("""INSERT INTO arrival_status (target_time, content, content_important, content_color, content_font,
+            content_font_size, order_idx, page_idx, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", arrivals)
+
+        conn.execute(f"UPDATE ledger SET {A._ledger_day_set_sql()}")
+        A._refresh_ledger_status_cols(conn)
+        for _version, _desc, step in A.SCHEMA_MIGRATIONS:
+            step(conn)
+        A._ledger_fts_detect(conn)
+        conn.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'dir_gen'")
+        conn.commit()
+        counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                  for t in ('ledger', 'drivers', 'clients', 'activity_logs', 'arrival_status')}
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return counts
+
+
+if __name__ == '__main__':
+    force_arg = '--force' in sys.argv[1:]
+    args = [a for a in sys.argv[1:] if a != '--force']
+    if len(args) < 2:
+        print(__doc__)
+        sys.exit(1)
+    out_path = args[0]
+    try:
+        n_rows = int(args[1])
+        seed_arg = int(args[2]) if len(args) > 2 else 42
+    except ValueError:
+        print("오류: 행수·seed는 숫자로 입력")
+        sys.exit(1)
+    started = time.time()
+    try:
+        result = generate(out_path, n_rows, seed_arg, force=force_arg)
+    except (FileExistsError, ValueError) as e:
+        print(f"오류: {e}")
+        sys.exit(1)
+    print(f"생성 완료: {out_path} {result} ({time.time() - started:.1f}s)")
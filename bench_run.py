@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""장부 성능 벤치마크 — 행 수별 가상 DB(bench_data.py)로 주요 화면·API 응답시간과 최대 메모리 측정
+- 사용: python bench_run.py [--sizes 10000,100000,1000000] [--repeat 5] [--seed 42] [--out 결과.json]
+  비교: python bench_run.py --compare 이전.json 이후.json
+- 측정: /api/get_ledger(1쪽·뒤쪽 페이지·기간·검색·커서), /settlement(캐시 비움·재조회), /statistics,
+  /api/ledger_excel, /api/ledger_upload(dry_run·반영), /api/update_status
+- 행 수마다 별도 프로세스에서 실행(최대 RSS 분리). 생성한 DB는 임시폴더 logi_bench에 두고 재사용, 측정은 복사본으로 함
+- 결과: 경로별 n·평균·p50·p90·p99·최대(ms), 응답코드 수, 경로 실행 후 최대 RSS(MB) — JSON으로 stdout·--out 파일에 출력
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [10000, 100000, 1000000]
+DATA_DIR = os.path.join(tempfile.gettempdir(), 'logi_bench')
+
+
+def _peak_rss_mb():
+    """현재 프로세스 최대 RSS(MB). resource 없는 환경(Windows)은 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 byte 단위
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def _percentile(values, p):
+    """정렬된 값 목록의 p 백분위(선형 보간)"""
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def _summary(times_ms, statuses):
+    vals = sorted(times_ms)
+    out = {'n': len(vals), 'mean_ms': round(sum(vals) / len(vals), 2) if vals else None}
+    for p in (50, 90, 99):
+        v = _percentile(vals, p)
+        out[f'p{p}_ms'] = round(v, 2) if v is not None else None
+    out['max_ms'] = round(vals[-1], 2) if vals else None
+    out['status'] = {str(code): statuses.count(code) for code in sorted(set(statuses))}
+    return out
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_child(db_path, repeat, result_path):
+    """벤치마크 본체(자식 프로세스) — db_path 장부로 앱을 띄워 test client로 경로별 측정 후 result_path에 JSON 저장"""
+    os.environ['LEDGER_DB_PATH'] = os.path.abspath(db_path)
+    os.environ['LEDGER_SCHEDULER'] = '0'  # 측정 중 예약 작업(백업·체크포인트·optimize)이 돌지 않도록
+    sys.path.insert(0, PROJECT_ROOT)
+    started = time.perf_counter()
+    import app as A
+    import pandas as pd
+    result = {'import_s': round(time.perf_counter() - started, 2), 'rss_start_mb': _peak_rss_mb(), 'routes': {}}
+
+    conn = A.connect_ledger()
+    try:
+        result['rows'] = conn.execute("SELECT COUNT(*) FROM ledger").fetchone()[0]
+        last_day = conn.execute("SELECT MAX(dispatch_day) FROM ledger").fetchone()[0] or A.now_kst().strftime('%Y-%m-%d')
+        sample_name = (conn.execute("SELECT d_name FROM ledger WHERE d_name != '' ORDER BY id LIMIT 1").fetchone() or [''])[0]
+        ids = [r[0] for r in conn.execute("SELECT id FROM ledger ORDER BY id DESC LIMIT ?", (max(repeat, 1) + 1,)).fetchall()]
+    finally:
+        conn.close()
+    month_start = (datetime.strptime(last_day, '%Y-%m-%d') - timedelta(days=30)).strftime('%Y-%m-%d')
+    month = f"start={month_start}&end={last_day}"
+
+    client = A.app.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['user_id'] = 'admin'
+        sess['username'] = 'bench'
+        sess['role'] = 'edit'
+        sess['is_admin'] = True
+
+    first = client.get('/api/get_ledger?page=1').get_json() or {}
+    deep_page = max(1, int(first.get('total_pages') or 1) - 1)
+    next_cursor = first.get('next_cursor') or ''
+
+    # 업로드용 엑셀: 최근 한 달 다운로드 파일. 반영 측정은 회차마다 비고 값을 바꿔 실제 UPDATE가 일어나게 함
+    upload_src = client.get(f'/api/ledger_excel?{month}').get_data()
+    upload_df = pd.read_excel(io.BytesIO(upload_src), sheet_name=0, engine='openpyxl')
+    upload_files = []
+    for i in range(repeat + 1):
+        df = upload_df.copy()
+        if '비고' in df.columns:
+            df['비고'] = f"bench{i}"
+        buf = io.BytesIO()
+        with pd.ExcelWriter(buf, engine='openpyxl') as writer:
+            df.to_excel(writer, sheet_name='통합장부', index=False)
+        upload_files.append(buf.getvalue())
+    state = {'upload': 0, 'status': 0}
+
+    def _upload(dry_run):
+        def _call():
+            if dry_run:
+                body = upload_files[0]
+            else:
+                body = upload_files[state['upload'] % len(upload_files)]
+                state['upload'] += 1
+            data = {'file': (io.BytesIO(body), 'bench.xlsx')}
+            if dry_run:
+                data['dry_run'] = '1'
+            return client.post('/api/ledger_upload', data=data, content_type='multipart/form-data')
+        return _call
+
+    def _update_status():
+        i = state['status']
+        state['status'] += 1
+        return client.post('/api/update_status', json={'id': ids[i % len(ids)], 'key': 'memo1', 'value': f"bench{i}"})
+
+    def _settlement_cold():
+        A.ledger_result_cache.clear()
+        return client.get(f'/settlement?{month}')
+
+    scenarios = [
+        ('get_ledger.page1', lambda: client.get('/api/get_ledger?page=1')),
+        ('get_ledger.deep_page', lambda: client.get(f'/api/get_ledger?page={deep_page}')),
+        ('get_ledger.cursor_next', lambda: client.get(f'/api/get_ledger?page=2&cursor={next_cursor}&dir=next')),
+        ('get_ledger.month', lambda: client.get(f'/api/get_ledger?page=1&{month}')),
+        ('get_ledger.search', lambda: client.get(f'/api/get_ledger?page=1&q={sample_name}')),
+        ('settlement.cold', _settlement_cold),
+        ('settlement.warm', lambda: client.get(f'/settlement?{month}')),
+        ('statistics.month', lambda: client.get(f'/statistics?{month}')),
+        ('ledger_excel.month', lambda: client.get(f'/api/ledger_excel?{month}')),
+        ('ledger_upload.dry_run', _upload(True)),
+        ('ledger_upload.apply', _upload(False)),
+        ('update_status', _update_status),
+    ]
+    for name, call in scenarios:
+        call().get_data()  # 워밍업 1회 (측정 제외)
+        times, statuses = [], []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            resp = call()
+            resp.get_data()
+            times.append((time.perf_counter() - t0) * 1000)
+            statuses.append(resp.status_code)
+        result['routes'][name] = dict(_summary(times, statuses), rss_mb=_peak_rss_mb())
+    result['rss_peak_mb'] = _peak_rss_mb()
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False)
+
+
+def _dataset(rows, seed):
+    """행 수·seed별 생성 DB 경로 (없으면 bench_data.py로 생성)"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"ledger_{rows}_s{seed}.db")
+    if not os.path.exists(path):
+        print(f"[bench] 데이터 생성: {rows}건 → {path}", file=sys.stderr)
+        subprocess.run([sys.executable, os.path.join(PROJECT_ROOT, 'bench_data.py'), path, str(rows), str(seed)],
+                       check=True, stdout=subprocess.DEVNULL)
+    return path
+
+
+def run(sizes, repeat, seed):
+    report = {
+        'meta': {
+            'started': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'platform': platform.platform(), 'commit': _git_commit(), 'seed': seed, 'repeat': repeat,
+        },
+        'sizes': {},
+    }
+    for rows in sizes:
+        src = _dataset(rows, seed)
+        work = os.path.join(DATA_DIR, f"work_{rows}_{os.getpid()}.db")
+        result_path = work + '.json'
+        shutil.copyfile(src, work)  # 업로드·상태변경이 원본을 바꾸지 않도록 복사본으로 측정
+        try:
+            print(f"[bench] {rows}건 측정 중 (repeat={repeat})", file=sys.stderr)
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--child', work, '--repeat', str(repeat),
+                            '--result', result_path], check=True, stdout=subprocess.DEVNULL)
+            with open(result_path, encoding='utf-8') as f:
+                report['sizes'][str(rows)] = json.load(f)
+        except subprocess.CalledProcessError as e:
+            print(f"[bench error] {rows}건: {e}", file=sys.stderr)
+            report['sizes'][str(rows)] = {'error': str(e)}
+        finally:
+            for suffix in ('', '-wal', '-shm', '.json'):
+                if os.path.exists(work + suffix):
+                    os.remove(work + suffix)
+    return report
+
+
+def compare(path_a, path_b):
+    """두 결과 파일의 경로별 p50·p90 비교 (b/a 배율, 1보다 작으면 빨라짐)"""
+    with open(path_a, encoding='utf-8') as f:
+        a = json.load(f)
+    with open(path_b, encoding='utf-8') as f:
+        b = json.load(f)
+    print(f"{'rows':>8} {'route':26} {'p50 a':>10} {'p50 b':>10} {'x':>6} {'p90 a':>10} {'p90 b':>10} {'x':>6}")
+    for size, res_a in a.get('sizes', {}).items():
+        res_b = b.get('sizes', {}).get(size) or {}
+        for route, ra in (res_a.get('routes') or {}).items():
+            rb = (res_b.get('routes') or {}).get(route)
+            if not rb:
+                continue
+            cells = []
+            for key in ('p50_ms', 'p90_ms'):
+                va, vb = ra.get(key), rb.get(key)
+                ratio = f"{vb / va:.2f}" if va and vb is not None else '-'
+                cells.extend([f"{va:10.1f}", f"{vb:10.1f}", f"{ratio:>6}"])
+            print(f"{size:>8} {route:26} {' '.join(cells)}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='장부 성능 벤치마크')
+    parser.add_argument('--sizes', default=','.join(str(n) for n in DEFAULT_SIZES), help='장부 행 수 목록(쉼표 구분)')
+    parser.add_argument('--repeat', type=int, default=5, help='경로별 측정 횟수(워밍업 1회 별도)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='결과 JSON 저장 경로')
+    parser.add_argument('--compare', nargs=2, metavar=('A.json', 'B.json'), help='두 결과 비교')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.compare:
+        return compare(*args.compare)
+    if args.child:
+        run_child(args.child, max(1, args.repeat), args.result)
+        return 0
+    try:
+        sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    except ValueError:
+        print("오류: --sizes는 숫자 목록으로 입력 (예: 10000,100000)", file=sys.stderr)
+        return 1
+    report = run(sizes, max(1, args.repeat), args.seed)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,4 +4,7 @@ set -e
 PORT="${PORT:-5000}"
 echo "Binding to 0.0.0.0:$PORT"
 # --timeout: 앱 로딩(init_db, load_db_to_mem 등)이 느릴 수 있어 120초로 설정
-exec gunicorn -w 1 --bind "0.0.0.0:$PORT" --timeout 120 --log-level info app:app
+# 워커 수: WEB_CONCURRENCY (기본 2). 기사·업체 메모리는 요청마다 DB 세대번호로 워커 간 동기화됨.
+# --preload: init_db(스키마 점검)를 마스터에서 한 번만 실행한 뒤 워커 fork
+WORKERS="${WEB_CONCURRENCY:-2}"
+exec gunicorn -w "$WORKERS" --preload --bind "0.0.0.0:$PORT" --timeout 120 --log-level info app:app